@@ -1,71 +1,226 @@
-"""Library Assistant main logic powered by Google Gemini API."""
+"""Library Assistant main logic powered by Google Gemini API.
+
+The Gemini SDK, python-dotenv, asyncio and the thread pool are imported on
+first use rather than at import time, so short-lived processes that only
+hit the guardrail or the rule-based path never pay for them. Run
+``python import_time.py`` to check the cost of importing this module.
+"""
 
 import os
-from dotenv import load_dotenv
-import google.generativeai as genai
+import re
+import threading
+import time
+import weakref
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
 from models import UserContext
-from database import BOOK_DATABASE, LIBRARY_TIMINGS
+from database import BOOK_DATABASE, MEMBER_REGISTRY
+from live_catalog import CatalogChange
+from matcher import AhoCorasick, QueryMatcher
+from metrics import InstrumentedModel, MetricsRegistry
+from circuit_breaker import CircuitBreaker, CircuitOpen
+from response_cache import ResponseCache, normalize_query
+from sessions import SessionStore
+from tools import RECOMMENDER, not_registered
+
+
+@lru_cache(maxsize=None)
+def gemini_api_key() -> Optional[str]:
+    """
+    The Gemini API key, read once on first use.
+    
+    The environment wins; otherwise the key is loaded from the .env file.
+    """
+    if not os.getenv("GEMINI_API_KEY"):
+        # Load API key from .env file
+        from dotenv import load_dotenv
+        load_dotenv()
+    return os.getenv("GEMINI_API_KEY")
+
+
+def __getattr__(name: str):
+    # GEMINI_API_KEY used to be a module constant read at import time
+    if name == "GEMINI_API_KEY":
+        return gemini_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+LIBRARY_KEYWORDS = [
+    "book", "library", "borrow", "return", "member", "membership",
+    "available", "timings", "hours", "reading", "author", "novel",
+    "search", "recommend", "loan", "fine", "policy", "catalog"
+]
+
+NON_LIBRARY_KEYWORDS = [
+    "weather", "sports", "politics", "cooking", "recipe", "travel",
+    "movies", "music", "gaming", "technology", "news", "science"
+]
+
+# Catalog entries retrieved into each prompt; the catalog may hold millions
+PROMPT_TOP_K = int(os.getenv("PROMPT_TOP_K", "5"))
+
+# Concurrent Gemini calls per event loop, and the async deadline in seconds
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "32"))
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "10"))
+_LLM_SEMAPHORES = weakref.WeakKeyDictionary()
+
+# Gemini worker threads used by generate_responses
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", "8"))
+
+# Stops calling Gemini after repeated failures or slow calls, until a probe succeeds
+LLM_BREAKER = CircuitBreaker(
+    failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+    slow_call_seconds=float(os.getenv("LLM_SLOW_CALL_SECONDS", "5")),
+    reset_timeout=float(os.getenv("LLM_BREAKER_RESET_SECONDS", "30")),
+)
+
+# Latency budget after which the rule-based answer is returned (unset: wait for Gemini)
+LLM_HEDGE_SECONDS = float(os.environ["LLM_HEDGE_MS"]) / 1000 if os.getenv("LLM_HEDGE_MS") else None
+
+# Hedged Gemini calls allowed in flight; past this, callers wait for Gemini unhedged
+LLM_MAX_HEDGES = int(os.getenv("LLM_MAX_HEDGES", str(BATCH_WORKERS)))
+_HEDGE_SLOTS = threading.BoundedSemaphore(LLM_MAX_HEDGES)
+
+# Classifier probability above which a query counts as library-related
+TOPIC_THRESHOLD = float(os.getenv("TOPIC_THRESHOLD", "0.5"))
+
+# Lower bar for queries that contain a library keyword ("tax return" still
+# scores well below it)
+TOPIC_KEYWORD_THRESHOLD = float(os.getenv("TOPIC_KEYWORD_THRESHOLD", "0.2"))
+
+# Keywords rule_based_response routes on
+ROUTING_KEYWORDS = ["timing", "hours", "when", "open", "member", "register", "similar", "books like", "more by"]
+
+# Keywords asking for recommendations rather than a particular book
+RECOMMEND_KEYWORDS = ["recommend", "similar", "books like", "more by"]
+
+# Books listed in a rule-based recommendation
+RECOMMEND_TOP_K = int(os.getenv("RECOMMEND_TOP_K", "5"))
+
+# One automaton over every title and keyword, rebuilt when the catalog changes
+QUERY_MATCHER = QueryMatcher(
+    BOOK_DATABASE, LIBRARY_KEYWORDS + NON_LIBRARY_KEYWORDS + ROUTING_KEYWORDS
+)
+BOOK_DATABASE.subscribe_prepare(QUERY_MATCHER.prepare)
+
+
+def available_copies(title: str):
+    """Current available copies of a book, or None if it is not in the catalog."""
+    match = BOOK_DATABASE.lookup(title)
+    return match[1]["available"] if match else None
+
+
+# Cache of Gemini responses keyed on (normalized query, is member)
+RESPONSE_CACHE = ResponseCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "1024")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "300")),
+    availability=available_copies,
+)
+
+
+def forget_stale_responses(change: CatalogChange) -> None:
+    """
+    Drop the cached responses a catalog change made stale.
+    
+    Changed copy counts are caught on lookup already; added or removed
+    titles and new authors are not, so entries whose query or books mention
+    one are dropped. New timings drop every entry.
+    """
+    if change.timings is not None:
+        RESPONSE_CACHE.clear()
+        return
+    changed = set(change.titles)
+    if not changed:
+        return
+    mentions = AhoCorasick(title.lower() for title in changed)
+    RESPONSE_CACHE.invalidate(
+        lambda key, entry: any(title in changed for title in entry.availability)
+        or next(mentions.iter_matches(key[0]), None) is not None
+    )
 
-# Load API key from .env file
-load_dotenv()
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+BOOK_DATABASE.subscribe(forget_stale_responses)
+
+# Conversation history per session ID, compacted as it grows
+SESSIONS = SessionStore(
+    max_sessions=int(os.getenv("SESSION_LIMIT", "10000")),
+    ttl=float(os.getenv("SESSION_TTL", "1800")),
+    max_turns=int(os.getenv("SESSION_MAX_TURNS", "6")),
+    max_chars=int(os.getenv("SESSION_MAX_CHARS", "4000")),
+    extract_books=lambda text: QUERY_MATCHER.match(text).titles,
+)
+
+
+@lru_cache(maxsize=None)
+def topic_classifier():
+    """
+    The guardrail's topic classifier, loaded on first use.
+    
+    Returns None, so the keyword lists are used instead, when NumPy is not
+    installed or LIBRARY_TOPIC_CLASSIFIER=0.
+    """
+    if os.getenv("LIBRARY_TOPIC_CLASSIFIER", "1") == "0":
+        return None
+    try:
+        from topic_classifier import default_classifier
+    except ImportError:
+        return None
+    return default_classifier()
 
 
 def is_library_related(query: str) -> tuple[bool, str]:
     """
     Check if a query is library-related.
     
+    Queries naming a catalog title always are; otherwise the topic
+    classifier decides, with a lower threshold for queries containing a
+    library keyword (the keyword lists alone without NumPy). A rejected
+    query is accepted after all if it names a title of several words with
+    a few typos; one misspelled word is too little to override the verdict.
+    
     Returns:
         tuple: (is_library_related, reason)
     """
-    query_lower = query.lower()
+    match = QUERY_MATCHER.match(query)
     
     # Check for book names in database
-    book_names_lower = [book.lower() for book in BOOK_DATABASE.keys()]
-    for book_name in book_names_lower:
-        if book_name in query_lower:
-            return True, f"Query mentions book '{book_name}'"
-    
-    library_keywords = [
-        "book", "library", "borrow", "return", "member", "membership",
-        "available", "timings", "hours", "reading", "author", "novel",
-        "search", "recommend", "loan", "fine", "policy", "catalog"
-    ]
+    if match.titles:
+        return True, f"Query mentions book '{match.titles[0].lower()}'"
     
     # Check for library-related keywords
-    keyword_count = sum(1 for keyword in library_keywords if keyword in query_lower)
+    keyword = any(keyword in match.keywords for keyword in LIBRARY_KEYWORDS)
+    classifier = topic_classifier()
+    if classifier is not None:
+        related = classifier.score(query) >= (TOPIC_KEYWORD_THRESHOLD if keyword else TOPIC_THRESHOLD)
+    else:
+        related = keyword
     
-    non_library_keywords = [
-        "weather", "sports", "politics", "cooking", "recipe", "travel",
-        "movies", "music", "gaming", "technology", "news", "science"
-    ]
+    if related:
+        return True, f"Query contains library-related content"
     
-    # Check for non-library topics (only if no library keywords found)
-    if keyword_count == 0:
-        for keyword in non_library_keywords:
-            if keyword in query_lower:
-                return False, f"Query about '{keyword}' is not library-related"
+    # Check for misspelled book names
+    for title in BOOK_DATABASE.fuzzy_titles(query):
+        if len(title.split()) > 1:
+            return True, f"Query mentions book '{title.lower()}'"
     
-    if keyword_count >= 1 or "book" in query_lower or "author" in query_lower:
-        return True, f"Query contains library-related content"
+    # Name the non-library topic when the query mentions one
+    for keyword in NON_LIBRARY_KEYWORDS:
+        if keyword in match.keywords:
+            return False, f"Query about '{keyword}' is not library-related"
     
     return False, "Query does not appear to be library-related"
 
 
-def generate_response(user_input: str, user_context: UserContext) -> str:
+def local_response(user_input: str, user_context: UserContext) -> Optional[str]:
     """
-    Generate a response using Gemini API.
+    Answer a query without calling Gemini when possible.
     
-    Args:
-        user_input: The user's question
-        user_context: The user's context information
+    Covers guardrail rejections, the rule-based path when Gemini is not
+    configured, and response cache hits.
     
     Returns:
-        str: The assistant's response
+        Optional[str]: The response, or None if the query needs the model
     """
     # Check if the query is library-related
     is_related, reason = is_library_related(user_input)
@@ -73,29 +228,38 @@ def generate_response(user_input: str, user_context: UserContext) -> str:
     if not is_related:
         return f"❌ I'm a Library Assistant and can only help with library-related queries.\nReason: {reason}\n\nPlease ask about books, library membership, timings, or borrowing policies."
     
-    # Build context information
-    context_info = f"""
-User: {user_context.name}
-Member ID: {user_context.member_id if user_context.member_id else 'Not registered'}
-"""
+    # Check if Gemini is configured
+    if not gemini_api_key():
+        # Fallback to rule-based response without AI
+        return rule_based_response(user_input, user_context)
     
-    # Build tools description
-    tools_info = f"""
-Available Tools:
-1. search_book - Search for a book by name
-2. check_availability - Check availability (members only)
-3. get_library_timings - Get library hours
+    # Follow-ups depend on the conversation, so only fresh questions are cached
+    if SESSIONS.has_history(session_key(user_context)):
+        return None
+    
+    # Serve repeated questions from the response cache
+    return RESPONSE_CACHE.get(response_cache_key(user_input, user_context))
 
-Books in database: {', '.join(BOOK_DATABASE.keys())}
 
-Library Timings: {LIBRARY_TIMINGS}
-"""
-    
-    system_prompt = f"""You are a helpful Library Assistant. Be friendly and professional.
+PROMPT_TEMPLATE = """You are a helpful Library Assistant. Be friendly and professional.
+
+User: {name}
+Member ID: {member_id}
+
+Available Tools:
+1. search_book - Search for a book by name
+2. search_by_author - List the books by an author (full name or surname)
+3. check_availability - Check availability (members only)
+4. get_library_timings - Get library hours
+5. recommend_books - Recommend books similar to a title, or more by an author
+6. list_loans - List the books a member has on loan (members only)
+7. checkout_book - Borrow a copy of a book (members only)
+8. return_book - Return a borrowed book (members only)
 
-{context_info}
+Relevant books in database:
+{books}
 
-{tools_info}
+Library Timings: {timings}
 
 Rules:
 - Always use the available tools when appropriate
@@ -103,46 +267,682 @@ Rules:
 - If asked about non-library topics, politely redirect to library services
 - Keep responses concise but informative
 - If asked about book availability, provide full details including author
-"""
 
-    # Check if Gemini is configured
-    if not GEMINI_API_KEY:
-        # Fallback to rule-based response without AI
+{history}User: {user_input}"""
+
+# Query words too common to say anything about which book is meant
+STOP_WORDS = {
+    "about", "available", "book", "books", "could", "does", "have", "library",
+    "like", "please", "tell", "that", "there", "what", "when", "where", "which",
+    "with", "would", "your",
+}
+
+
+@lru_cache(maxsize=8)
+def _prompt_template(timings: str) -> str:
+    """PROMPT_TEMPLATE with its static parts filled in, built once per timings text."""
+    return PROMPT_TEMPLATE.replace("{timings}", timings.replace("{", "{{").replace("}", "}}"))
+
+
+def retrieve_books(user_input: str, k: int = PROMPT_TOP_K) -> List[Tuple[str, dict]]:
+    """
+    Find the catalog entries most relevant to a query.
+    
+    Titles mentioned in the query come first, then recommendations when
+    the query asks for them, then titles containing the query's longer
+    words, each found through the catalog indexes.
+    
+    Returns:
+        List[Tuple[str, dict]]: Up to k (title, info) pairs
+    """
+    match = QUERY_MATCHER.match(user_input)
+    titles = dict.fromkeys(match.titles[:k])
+    if wants_recommendations(match.keywords):
+        catalog = BOOK_DATABASE.snapshot()
+        _, picks = recommendations(user_input, [title for title in titles if title in catalog], catalog, k)
+        titles.update(dict.fromkeys(picks))
+    for word in re.findall(r"\w{4,}", user_input.lower()):
+        if len(titles) >= k:
+            break
+        if word not in STOP_WORDS and word not in QUERY_MATCHER.keywords:
+            titles.update(dict.fromkeys(BOOK_DATABASE.search_titles(word, limit=k - len(titles))))
+    
+    books = []
+    for title in islice(titles, k):
+        match = BOOK_DATABASE.lookup(title)
+        if match:
+            books.append(match)
+    return books
+
+
+def wants_recommendations(keywords) -> bool:
+    """Whether a query's keywords ask for recommendations."""
+    return any(keyword in keywords for keyword in RECOMMEND_KEYWORDS)
+
+
+def recommendations(user_input: str, titles: List[str], catalog, k: int) -> Tuple[str, List[str]]:
+    """
+    Books to recommend for a query, and a heading saying why.
+    
+    A mentioned title gets the books most like it (the most borrowed books
+    when nothing is), or its author's other books when the query asks for
+    "more by" them; otherwise an author the query names gets their most
+    borrowed books, and any other query the most borrowed books overall.
+    
+    Args:
+        user_input: The user's question
+        titles: Catalog titles the query mentions
+        catalog: The catalog snapshot the titles come from
+        k: How many books to recommend
+    
+    Returns:
+        tuple: (heading, titles)
+    """
+    if titles:
+        book = titles[0]
+        if "more by" in user_input.lower():
+            author = catalog[book]["author"]
+            return f"✍️ More by {author}:", RECOMMENDER.by_author(author, k, exclude=[book])
+        similar = RECOMMENDER.similar(book, k)
+        if similar:
+            return f"📚 If you enjoyed '{book}', you might also like:", similar
+        return "📚 Popular picks from our catalog:", [title for title in RECOMMENDER.popular(k + 1) if title != book][:k]
+    
+    author = RECOMMENDER.find_author(user_input)
+    if author is not None:
+        return f"✍️ More by {author}:", RECOMMENDER.by_author(author, k)
+    return "📚 Popular picks from our catalog:", RECOMMENDER.popular(k)
+
+
+def build_prompt(user_input: str, user_context: UserContext) -> str:
+    """
+    Build the Gemini prompt for a query.
+    
+    Only the PROMPT_TOP_K books most relevant to the query are listed, so
+    the prompt stays the same size however large the catalog grows. In a
+    conversation the compacted history is included, and books discussed
+    earlier (with their authors' other books) fill any remaining slots so
+    follow-ups like "what about his other books?" can be answered.
+    
+    Args:
+        user_input: The user's question
+        user_context: The user's context information
+    
+    Returns:
+        str: The full prompt text
+    """
+    relevant = retrieve_books(user_input)
+    key = session_key(user_context)
+    history = SESSIONS.history(key) if key is not None else ""
+    if history:
+        relevant += conversation_books(key, {title for title, _ in relevant}, PROMPT_TOP_K - len(relevant))
+    
+    books = "\n".join(
+        f"- {title} by {info['author']} ({info['available']} copies available)"
+        for title, info in relevant
+    ) or "- No matching titles; use search_book to look one up"
+    
+    return _prompt_template(BOOK_DATABASE.timings).format(
+        name=user_context.name,
+        member_id=user_context.member_id if is_registered(user_context) else 'Not registered',
+        books=books,
+        history=f"{history}\n\n" if history else "",
+        user_input=user_input,
+    )
+
+
+def conversation_books(key: str, exclude: set, k: int) -> List[Tuple[str, dict]]:
+    """
+    Books discussed in a conversation, then other books by their authors.
+    
+    Returns:
+        List[Tuple[str, dict]]: Up to k (title, info) pairs not in exclude
+    """
+    catalog = BOOK_DATABASE.snapshot()
+    books = []
+    for discussed in SESSIONS.books(key):
+        match = catalog.lookup(discussed)
+        if match is None:
+            continue
+        for title in [match[0]] + catalog.by_author(match[1]["author"]):
+            if len(books) >= k:
+                return books
+            if title not in exclude:
+                exclude.add(title)
+                books.append((title, catalog[title]))
+    return books
+
+
+@lru_cache(maxsize=None)
+def get_model():
+    """The shared Gemini model client, created and configured on first use."""
+    import google.generativeai as genai
+    
+    genai.configure(api_key=gemini_api_key())
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+
+def generate_response(user_input: str, user_context: UserContext) -> str:
+    """
+    Generate a response using Gemini API.
+    
+    Args:
+        user_input: The user's question
+        user_context: The user's context information
+    
+    Returns:
+        str: The assistant's response
+    """
+    response = answer(user_input, user_context)
+    remember_turn(user_input, response, user_context)
+    return response
+
+
+def answer(user_input: str, user_context: UserContext) -> str:
+    """generate_response without recording the turn in SESSIONS."""
+    response = local_response(user_input, user_context)
+    if response is not None:
+        return response
+    return model_response(user_input, user_context)
+
+
+def model_response(user_input: str, user_context: UserContext) -> str:
+    """
+    Ask Gemini, falling back to the rule-based response on any error.
+    
+    Callers are expected to have run local_response first. While
+    LLM_BREAKER is open Gemini is not called at all. With LLM_HEDGE_MS set,
+    the rule-based answer is returned as soon as Gemini misses that budget;
+    the late answer still lands in the response cache. At most
+    LLM_MAX_HEDGES hedged calls run at once; beyond that callers wait for
+    Gemini as if hedging were off.
+    """
+    if LLM_BREAKER.is_open():
+        record_event("breaker_open")
         return rule_based_response(user_input, user_context)
     
+    prompt = build_prompt(user_input, user_context)
+    
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content([
-            {"role": "user", "parts": [f"{system_prompt}\n\nUser: {user_input}"]}
-        ])
-        return response.text
+        if LLM_HEDGE_SECONDS is None:
+            return ask_model(user_input, user_context, prompt)
+        if not _HEDGE_SLOTS.acquire(blocking=False):
+            record_event("hedge_skipped")
+            return ask_model(user_input, user_context, prompt)
+        future = _hedge_pool().submit(ask_model, user_input, user_context, prompt)
+        future.add_done_callback(lambda finished: _HEDGE_SLOTS.release())
+        return future.result(timeout=LLM_HEDGE_SECONDS)
+    except CircuitOpen:
+        record_event("breaker_open")
+        return rule_based_response(user_input, user_context)
+    except TimeoutError:
+        record_event("hedged")
+        return rule_based_response(user_input, user_context)
     except Exception as e:
         # Fallback to rule-based response
         return rule_based_response(user_input, user_context)
 
 
+def ask_model(user_input: str, user_context: UserContext, prompt: str) -> str:
+    """
+    Call Gemini once, reporting the outcome to LLM_BREAKER.
+    
+    Successful answers are cached; errors are re-raised. LLM_BREAKER is
+    asked again right before the call, as a hedged call may have waited
+    while the breaker opened.
+    
+    Raises:
+        CircuitOpen: LLM_BREAKER refused the call
+    """
+    if not LLM_BREAKER.allow():
+        raise CircuitOpen()
+    start = time.perf_counter()
+    try:
+        response = get_model().generate_content([
+            {"role": "user", "parts": [prompt]}
+        ])
+        text = response.text
+    except Exception:
+        LLM_BREAKER.record_failure()
+        raise
+    LLM_BREAKER.record_success(time.perf_counter() - start)
+    cache_response(user_input, text, user_context)
+    return text
+
+
+@lru_cache(maxsize=None)
+def _hedge_pool():
+    """Threads that run hedged Gemini calls, so a late call can finish after we answer."""
+    from concurrent.futures import ThreadPoolExecutor
+    
+    return ThreadPoolExecutor(max_workers=LLM_MAX_HEDGES, thread_name_prefix="gemini-hedge")
+
+
+def record_event(event: str) -> None:
+    """Count an event when metrics are enabled."""
+    if METRICS is not None:
+        METRICS.increment(event)
+
+
+def generate_response_stream(user_input: str, user_context: UserContext) -> Iterator[str]:
+    """
+    Generate a response as a stream of text chunks.
+    
+    Gemini answers are yielded chunk by chunk as they arrive. Guardrail
+    rejections, cache hits and rule-based answers are yielded as a single
+    chunk, so callers handle every response the same way.
+    
+    Args:
+        user_input: The user's question
+        user_context: The user's context information
+    
+    Yields:
+        str: Consecutive pieces of the assistant's response
+    """
+    chunks = []
+    for chunk in _response_chunks(user_input, user_context):
+        chunks.append(chunk)
+        yield chunk
+    remember_turn(user_input, "".join(chunks), user_context)
+
+
+def _response_chunks(user_input: str, user_context: UserContext) -> Iterator[str]:
+    """generate_response_stream without recording the turn in SESSIONS."""
+    response = local_response(user_input, user_context)
+    if response is not None:
+        yield response
+        return
+    yield from model_response_stream(user_input, user_context)
+
+
+def model_response_stream(user_input: str, user_context: UserContext) -> Iterator[str]:
+    """
+    Stream Gemini's answer, falling back to the rule-based response on any error.
+    
+    The streaming counterpart of model_response; callers are expected to
+    have run local_response first.
+    """
+    if not LLM_BREAKER.allow():
+        record_event("breaker_open")
+        yield rule_based_response(user_input, user_context)
+        return
+    
+    prompt = build_prompt(user_input, user_context)
+    chunks = []
+    start = time.perf_counter()
+    try:
+        stream = get_model().generate_content([
+            {"role": "user", "parts": [prompt]}
+        ], stream=True)
+        for chunk in stream:
+            if chunk.text:
+                chunks.append(chunk.text)
+                yield chunk.text
+    except Exception:
+        LLM_BREAKER.record_failure()
+        # Fall back only if nothing was sent yet; a partial answer cannot be retracted
+        if not chunks:
+            yield rule_based_response(user_input, user_context)
+        return
+    
+    LLM_BREAKER.record_success(time.perf_counter() - start)
+    cache_response(user_input, "".join(chunks), user_context)
+
+
+def generate_responses(
+    queries: Sequence[str],
+    contexts: Union[UserContext, Sequence[UserContext]],
+    max_workers: Optional[int] = None,
+) -> List[str]:
+    """
+    Generate responses for a batch of queries.
+    
+    Queries with the same normalized text and membership status are
+    answered once. Guardrail rejections and cache hits are answered inline;
+    only the remaining unique queries go to Gemini, through a pool of
+    max_workers threads (BATCH_WORKERS by default). An answer that mentions
+    the user it was generated for is regenerated for each other user.
+    
+    Args:
+        queries: The users' questions
+        contexts: One UserContext per query, or one shared by all
+        max_workers: Size of the Gemini worker pool
+    
+    Returns:
+        List[str]: The responses, in the same order as queries
+    """
+    if isinstance(contexts, UserContext):
+        contexts = [contexts] * len(queries)
+    if len(contexts) != len(queries):
+        raise ValueError("queries and contexts must have the same length")
+    
+    groups: Dict[tuple, List[int]] = {}
+    for i, (query, context) in enumerate(zip(queries, contexts)):
+        # Follow-ups in a conversation are answered on their own
+        key = ("turn", i) if SESSIONS.has_history(session_key(context)) else response_cache_key(query, context)
+        groups.setdefault(key, []).append(i)
+    
+    from concurrent.futures import Future, ThreadPoolExecutor
+    
+    results: List[Optional[str]] = [None] * len(queries)
+    with ThreadPoolExecutor(max_workers=max_workers or BATCH_WORKERS) as pool:
+        futures = []
+        for indices in groups.values():
+            first = indices[0]
+            response = local_response(queries[first], contexts[first])
+            if response is None:
+                future = pool.submit(model_response, queries[first], contexts[first])
+            else:
+                future = Future()
+                future.set_result(response)
+            futures.append((indices, future))
+        
+        personal = []
+        for indices, future in futures:
+            first = indices[0]
+            results[first] = response = future.result()
+            if len(indices) > 1 and is_personal(response, contexts[first]):
+                personal.extend((i, pool.submit(answer, queries[i], contexts[i])) for i in indices[1:])
+            else:
+                for i in indices[1:]:
+                    results[i] = response
+        
+        for i, future in personal:
+            results[i] = future.result()
+    
+    for query, context, response in zip(queries, contexts, results):
+        remember_turn(query, response, context)
+    return results
+
+
+def _llm_semaphore() -> "asyncio.Semaphore":
+    """The Gemini concurrency limit for the running event loop."""
+    import asyncio
+    
+    loop = asyncio.get_running_loop()
+    semaphore = _LLM_SEMAPHORES.get(loop)
+    if semaphore is None:
+        semaphore = _LLM_SEMAPHORES[loop] = asyncio.Semaphore(LLM_CONCURRENCY)
+    return semaphore
+
+
+async def generate_response_async(
+    user_input: str, user_context: UserContext, timeout: Optional[float] = None
+) -> str:
+    """
+    Generate a response using Gemini API without blocking the event loop.
+    
+    At most LLM_CONCURRENCY Gemini calls run at once per event loop. If no
+    answer arrives within the deadline (waiting for a slot included), the
+    rule-based response is returned instead. LLM_BREAKER and LLM_HEDGE_MS
+    apply as in model_response; a hedged call keeps running until the
+    deadline so its answer can still be cached.
+    
+    Args:
+        user_input: The user's question
+        user_context: The user's context information
+        timeout: Deadline in seconds, defaults to LLM_TIMEOUT
+    
+    Returns:
+        str: The assistant's response
+    """
+    response = await _answer_async(user_input, user_context, timeout)
+    remember_turn(user_input, response, user_context)
+    return response
+
+
+async def _answer_async(user_input: str, user_context: UserContext, timeout: Optional[float]) -> str:
+    """generate_response_async without recording the turn in SESSIONS."""
+    response = local_response(user_input, user_context)
+    if response is not None:
+        return response
+    return await model_response_async(user_input, user_context, timeout)
+
+
+async def model_response_async(user_input: str, user_context: UserContext, timeout: Optional[float]) -> str:
+    """
+    Ask Gemini without blocking the event loop; see generate_response_async.
+    
+    The async counterpart of model_response; callers are expected to have
+    run local_response first.
+    """
+    import asyncio
+    
+    if LLM_BREAKER.is_open():
+        record_event("breaker_open")
+        return rule_based_response(user_input, user_context)
+    
+    contents = [{"role": "user", "parts": [build_prompt(user_input, user_context)]}]
+    deadline = LLM_TIMEOUT if timeout is None else timeout
+    loop = asyncio.get_running_loop()
+    expires = loop.time() + deadline
+    
+    async def call_model():
+        async with _llm_semaphore():
+            # Waiting for a slot can outlast the breaker closing
+            if not LLM_BREAKER.allow():
+                raise CircuitOpen()
+            model = get_model()
+            start = time.perf_counter()
+            try:
+                if hasattr(model, "generate_content_async"):
+                    response = await model.generate_content_async(contents)
+                else:
+                    response = await loop.run_in_executor(None, model.generate_content, contents)
+                text = response.text
+            except asyncio.CancelledError:
+                # Missing the deadline counts against Gemini; being cancelled
+                # by anything else (a shutdown, a dropped client) does not
+                if loop.time() >= expires:
+                    LLM_BREAKER.record_failure()
+                raise
+            except Exception:
+                LLM_BREAKER.record_failure()
+                raise
+        LLM_BREAKER.record_success(time.perf_counter() - start)
+        cache_response(user_input, text, user_context)
+        return text
+    
+    task = asyncio.ensure_future(asyncio.wait_for(call_model(), deadline))
+    try:
+        hedge = LLM_HEDGE_SECONDS is not None and LLM_HEDGE_SECONDS < deadline
+        if hedge and not _HEDGE_SLOTS.acquire(blocking=False):
+            record_event("hedge_skipped")
+            hedge = False
+        if hedge:
+            task.add_done_callback(lambda finished: _HEDGE_SLOTS.release())
+            done, _ = await asyncio.wait({task}, timeout=LLM_HEDGE_SECONDS)
+            if not done:
+                record_event("hedged")
+                # Let the call finish in the background; just retrieve its outcome
+                task.add_done_callback(lambda finished: finished.cancelled() or finished.exception())
+                return rule_based_response(user_input, user_context)
+        return await task
+    except CircuitOpen:
+        record_event("breaker_open")
+        return rule_based_response(user_input, user_context)
+    except Exception:
+        # Deadline expired or Gemini failed
+        return rule_based_response(user_input, user_context)
+
+
+def response_cache_key(user_input: str, user_context: UserContext) -> tuple:
+    """RESPONSE_CACHE key: the normalized query and membership status."""
+    return normalize_query(user_input), is_registered(user_context)
+
+
+def is_registered(user_context: UserContext) -> bool:
+    """Whether the user's member ID is on the roster (not merely given)."""
+    return MEMBER_REGISTRY.is_member(user_context.member_id)
+
+
+def session_key(user_context: UserContext) -> Optional[str]:
+    """
+    SESSIONS key: the session ID, or None without one.
+    
+    Not the member ID: members' one-off questions would otherwise all
+    count as follow-ups and bypass the response cache.
+    """
+    return user_context.session_id
+
+
+def remember_turn(user_input: str, response: str, user_context: UserContext) -> None:
+    """Add a finished turn to the user's conversation, if they have one."""
+    key = session_key(user_context)
+    if key is not None:
+        SESSIONS.record(key, user_input, response)
+
+
+def is_personal(response: str, user_context: UserContext) -> bool:
+    """Whether a response mentions the user's name or member ID."""
+    return user_context.name in response or bool(
+        user_context.member_id and user_context.member_id in response
+    )
+
+
+def cache_response(user_input: str, response: str, user_context: UserContext) -> None:
+    """
+    Store a Gemini response in RESPONSE_CACHE.
+    
+    Responses that mention the user's name or member ID are personal and are
+    not shared with other users of the same cache key; nor are follow-ups,
+    which depend on the conversation.
+    """
+    if is_personal(response, user_context) or SESSIONS.has_history(session_key(user_context)):
+        return
+    
+    # The entry is dropped as soon as any mentioned book's availability changes
+    books = QUERY_MATCHER.match(user_input).titles + QUERY_MATCHER.match(response).titles
+    RESPONSE_CACHE.put(response_cache_key(user_input, user_context), response, books)
+
+
 def rule_based_response(user_input: str, user_context: UserContext) -> str:
     """
     Fallback rule-based response without AI.
     """
-    query_lower = user_input.lower()
+    match = QUERY_MATCHER.match(user_input)
+    keywords = match.keywords
+    
+    # One snapshot for the lookups and timings; the matcher's titles may
+    # predate a reload
+    catalog = BOOK_DATABASE.snapshot()
+    timings = BOOK_DATABASE.timings
+    
+    # Check for book searches, tolerating misspelled titles
+    titles = [title for title in match.titles if title in catalog] or catalog.fuzzy_titles(user_input, limit=1)
     
-    # Check for book searches
-    for book, info in BOOK_DATABASE.items():
-        if book.lower() in query_lower:
-            if "timing" in query_lower or "hours" in query_lower or "when" in query_lower:
-                return f"📚 '{book}' by {info['author']} is available ({info['available']} copies).\n\n{LIBRARY_TIMINGS}"
-            return f"📚 '{book}' by {info['author']}: {info['available']} copies available.\n\nYou can borrow this book if you're a member!"
+    # Check for recommendations of similar books or more by an author
+    if wants_recommendations(keywords):
+        heading, picks = recommendations(user_input, titles, catalog, RECOMMEND_TOP_K)
+        lines = [
+            f"- '{title}' by {catalog[title]['author']} ({catalog[title]['available']} copies available)"
+            for title in picks if title in catalog
+        ]
+        if lines:
+            return heading + "\n" + "\n".join(lines)
+    
+    if titles:
+        book = titles[0]
+        info = catalog[book]
+        if "timing" in keywords or "hours" in keywords or "when" in keywords:
+            return f"📚 '{book}' by {info['author']} is available ({info['available']} copies).\n\n{timings}"
+        return f"📚 '{book}' by {info['author']}: {info['available']} copies available.\n\nYou can borrow this book if you're a member!"
     
     # Check for library timings
-    if "timing" in query_lower or "hours" in query_lower or "open" in query_lower:
-        return f"📅 Library Timings:\n{LIBRARY_TIMINGS}"
+    if "timing" in keywords or "hours" in keywords or "open" in keywords:
+        return f"📅 Library Timings:\n{timings}"
     
     # Check for membership
-    if "member" in query_lower or "register" in query_lower:
-        if user_context.member_id:
+    if "member" in keywords or "register" in keywords:
+        if is_registered(user_context):
             return f"✅ You are a registered member (ID: {user_context.member_id})!"
+        if user_context.member_id:
+            return not_registered(user_context.member_id)
         return "🔒 To become a member, please visit the library. Members can access full book availability features."
     
     # Default response
-    return f"📚 Welcome to the Library Assistant! {user_context.name}.\n\nI can help you:\n- Search for books\n- Check availability\n- Get library timings\n\n{LIBRARY_TIMINGS}"
+    return f"📚 Welcome to the Library Assistant! {user_context.name}.\n\nI can help you:\n- Search for books\n- Check availability\n- Get library timings\n\n{timings}"
+
+
+# =============================================================================
+# Instrumentation
+# =============================================================================
+
+# Functions timed while metrics are enabled, and the stage they record
+INSTRUMENTED_STAGES = {
+    "generate_response": "total",
+    "generate_response_async": "total",
+    "generate_response_stream": "total",
+    "generate_responses": "batch",
+    "is_library_related": "guardrail",
+    "retrieve_books": "retrieval",
+    "build_prompt": "prompt_build",
+    "model_response": "model_response",
+    "model_response_async": "model_response",
+    "model_response_stream": "model_response",
+    "rule_based_response": "rule_based",
+}
+
+# The active MetricsRegistry, or None while metrics are disabled
+METRICS: Optional[MetricsRegistry] = None
+
+
+def enable_metrics(registry: Optional[MetricsRegistry] = None) -> MetricsRegistry:
+    """
+    Start recording per-stage latencies and outcome counters.
+    
+    The functions in INSTRUMENTED_STAGES are replaced by timed wrappers and
+    Gemini calls go through an InstrumentedModel. Counters include
+    guardrail_rejected, rule_based (answers from the local rules, whether
+    Gemini is unconfigured or failed), llm_success and llm_error. While
+    disabled nothing is wrapped, so there is no overhead at all.
+    
+    Code that imported these functions by name before metrics were enabled
+    keeps calling the unwrapped versions; set LIBRARY_METRICS=1 to enable
+    metrics when this module is imported.
+    
+    Returns:
+        MetricsRegistry: The registry now receiving measurements
+    """
+    global METRICS
+    if METRICS is not None:
+        return METRICS
+    metrics = registry or MetricsRegistry()
+    namespace = globals()
+    
+    def count_rejection(result):
+        if not result[0]:
+            metrics.increment("guardrail_rejected")
+    
+    callbacks = {
+        "is_library_related": count_rejection,
+        "rule_based_response": lambda result: metrics.increment("rule_based"),
+    }
+    for name, stage in INSTRUMENTED_STAGES.items():
+        namespace[name] = metrics.timed(stage, namespace[name], callbacks.get(name))
+    
+    model_factory = namespace["get_model"]
+    
+    @lru_cache(maxsize=None)
+    def instrumented_get_model():
+        return InstrumentedModel(model_factory(), metrics)
+    
+    instrumented_get_model.__wrapped__ = model_factory
+    namespace["get_model"] = instrumented_get_model
+    METRICS = metrics
+    return metrics
+
+
+def disable_metrics() -> None:
+    """Restore the unwrapped functions and stop recording."""
+    global METRICS
+    if METRICS is None:
+        return
+    namespace = globals()
+    for name in list(INSTRUMENTED_STAGES) + ["get_model"]:
+        namespace[name] = namespace[name].__wrapped__
+    METRICS = None
+
+
+if os.getenv("LIBRARY_METRICS"):
+    enable_metrics()
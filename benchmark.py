@@ -0,0 +1,385 @@
+"""Benchmark suite for the Library Assistant.
+
+Generates synthetic catalogs and query mixes, times the tools and the
+assistant pipeline (with a stubbed Gemini model) and reports throughput
+and p50/p99 latency per function. Each catalog size runs in its own
+interpreter so build time and memory are measured in isolation.
+
+Usage:
+    python benchmark.py
+    python benchmark.py --sizes 1000 10000 100000 1000000 --backend sqlite
+    python benchmark.py --output results.json --llm-latency-ms 200
+    python benchmark.py --memory --sizes 100000 1000000
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+ADJECTIVES = [
+    "Silent", "Crimson", "Hidden", "Broken", "Golden", "Forgotten", "Endless",
+    "Winter", "Burning", "Lonely", "Secret", "Distant", "Wild", "Quiet", "Last",
+]
+NOUNS = [
+    "River", "Garden", "Empire", "Orchard", "Kingdom", "Lighthouse", "Harbor",
+    "Mountain", "Letter", "Forest", "Voyage", "Promise", "Shadow", "Island",
+]
+PLACES = [
+    "Avalon", "the North", "Tomorrow", "the Sea", "Glass", "Ashes", "Dreams",
+    "the Valley", "Stone", "Midnight", "the Moon", "Iron",
+]
+FIRST_NAMES = ["Ada", "Ben", "Clara", "Dev", "Elena", "Farid", "Grace", "Hiro", "Ines", "Jonah"]
+LAST_NAMES = ["Okafor", "Lindqvist", "Moreau", "Tanaka", "Reyes", "Novak", "Haddad", "Byrne"]
+
+# (weight, template) pairs for patron questions; {title} is a catalog title
+QUERY_MIX = [
+    (30, "Is '{title}' available?"),
+    (15, "Tell me about {title}"),
+    (10, "When can I borrow {title}? What are the hours?"),
+    (10, "What are the library hours?"),
+    (8, "How do I become a member?"),
+    (7, "Do you have a book called '{missing}'?"),
+    (5, "Can you recommend a novel by {author}?"),
+    (10, "What's the weather like today?"),
+    (5, "Who won the sports game last night?"),
+]
+
+
+def synthetic_catalog(size: int, seed: int = 0) -> Dict[str, dict]:
+    """Build a deterministic catalog of ``size`` unique titles."""
+    rng = random.Random(seed)
+    authors = [
+        f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        for i in range(max(1, size // 20))
+    ]
+    catalog = {}
+    for i in range(size):
+        title = f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} of {rng.choice(PLACES)} {i}"
+        catalog[title] = {"author": rng.choice(authors), "available": rng.randint(0, 5)}
+    return catalog
+
+
+def synthetic_queries(catalog: Dict[str, dict], count: int, seed: int = 1) -> List[str]:
+    """Build ``count`` patron questions drawn from QUERY_MIX."""
+    rng = random.Random(seed)
+    titles = list(catalog)
+    weights = [weight for weight, _ in QUERY_MIX]
+    templates = [template for _, template in QUERY_MIX]
+    queries = []
+    for template in rng.choices(templates, weights, k=count):
+        title = rng.choice(titles)
+        queries.append(template.format(
+            title=title,
+            author=catalog[title]["author"],
+            missing=f"The {rng.choice(NOUNS)} Nobody Wrote {rng.randint(0, 10 ** 6)}",
+        ))
+    return queries
+
+
+def synthetic_lookups(catalog: Dict[str, dict], count: int, seed: int = 2) -> List[str]:
+    """Book names for search_book: 80% catalog titles in varied case, 20% misses."""
+    rng = random.Random(seed)
+    titles = list(catalog)
+    names = []
+    for _ in range(count):
+        if rng.random() < 0.8:
+            title = rng.choice(titles)
+            names.append(rng.choice([title, title.lower(), title.upper(), f"  {title} "]))
+        else:
+            names.append(f"Unknown Title {rng.randint(0, 10 ** 6)}")
+    return names
+
+
+class StubResponse:
+    """Stands in for a Gemini response object."""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+class StubModel:
+    """
+    Offline stand-in for ``genai.GenerativeModel`` with a fixed latency.
+
+    Supports the sync, async and streaming calls the assistant makes.
+    """
+
+    def __init__(self, latency: float = 0.0, reply: str = "Here is what I found in the catalog."):
+        self.latency = latency
+        self.reply = reply
+
+    def generate_content(self, contents, stream: bool = False, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        if stream:
+            return iter([StubResponse(word + " ") for word in self.reply.split()])
+        return StubResponse(self.reply)
+
+    async def generate_content_async(self, contents, **kwargs):
+        import asyncio
+
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return StubResponse(self.reply)
+
+
+def install_stub_model(assistant, latency: float = 0.0) -> StubModel:
+    """Route the assistant's Gemini calls to a StubModel."""
+    model = StubModel(latency)
+    assistant.gemini_api_key = lambda: "stub"
+    assistant.get_model = lambda: model
+    return model
+
+
+def time_calls(func: Callable, args: Sequence[tuple]) -> dict:
+    """Call ``func(*a)`` for every ``a`` in ``args`` and summarize latencies."""
+    latencies = []
+    clock = time.perf_counter_ns
+    start = clock()
+    for call_args in args:
+        before = clock()
+        func(*call_args)
+        latencies.append(clock() - before)
+    total = (clock() - start) / 1e9
+
+    latencies.sort()
+    return {
+        "calls": len(latencies),
+        "total_s": total,
+        "throughput_per_s": len(latencies) / total if total else 0.0,
+        "p50_us": percentile(latencies, 50) / 1000,
+        "p99_us": percentile(latencies, 99) / 1000,
+        "mean_us": statistics.fmean(latencies) / 1000,
+    }
+
+
+def percentile(sorted_values: Sequence[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def max_rss_mb() -> float:
+    """Peak resident set size of this process in MiB (0 where unsupported)."""
+    try:
+        import resource
+    except ImportError:
+        return 0.0
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def run_size(size: int, backend: str, queries: int, llm_latency: float, cache: bool) -> dict:
+    """Benchmark one catalog size in the current interpreter."""
+    catalog = synthetic_catalog(size)
+    build_start = time.perf_counter()
+
+    if backend == "sqlite":
+        from storage import SQLiteCatalog
+
+        db_path = os.path.join(tempfile.mkdtemp(prefix="library-bench-"), "catalog.db")
+        SQLiteCatalog(db_path).bulk_upsert(
+            (title, info["author"], info["available"]) for title, info in catalog.items()
+        )
+        os.environ["LIBRARY_CATALOG_DB"] = db_path
+        import database
+    else:
+        os.environ.pop("LIBRARY_CATALOG_DB", None)
+        import database
+        database.BOOK_DATABASE.clear()
+        database.BOOK_DATABASE.update(catalog)
+
+    import assistant
+    import tools
+    from models import UserContext
+
+    # Compile the query matcher as part of the build, not the first query
+    assistant.QUERY_MATCHER.match("")
+    build_s = time.perf_counter() - build_start
+
+    install_stub_model(assistant, llm_latency)
+    if not cache:
+        assistant.RESPONSE_CACHE.max_size = 0
+
+    member = UserContext(name="Alice", member_id="M001")
+    guest = UserContext(name="Bob")
+    questions = synthetic_queries(catalog, queries)
+    lookups = synthetic_lookups(catalog, queries)
+    contexts = [member if i % 2 else guest for i in range(len(questions))]
+    del catalog
+
+    results = {
+        "search_book": time_calls(tools.search_book, [(name,) for name in lookups]),
+        "check_availability": time_calls(
+            tools.check_availability, [(name, "M001") for name in lookups]
+        ),
+        "is_library_related": time_calls(
+            assistant.is_library_related, [(query,) for query in questions]
+        ),
+        "rule_based_response": time_calls(
+            assistant.rule_based_response, list(zip(questions, contexts))
+        ),
+        "generate_response": time_calls(
+            assistant.generate_response, list(zip(questions, contexts))
+        ),
+    }
+    return {
+        "size": size,
+        "backend": backend,
+        "build_s": build_s,
+        "max_rss_mb": max_rss_mb(),
+        "response_cache": assistant.RESPONSE_CACHE.stats(),
+        "functions": results,
+    }
+
+
+def memory_usage(size: int) -> dict:
+    """
+    Compare the memory held by catalog records in the plain dict layout and
+    in the columnar ``Catalog``, measured with tracemalloc.
+
+    The records are decoded from JSON first so that, as with a real catalog
+    file, every row carries its own author string.
+    """
+    import gc
+    import tracemalloc
+
+    from catalog_index import Catalog, CatalogIndex
+
+    data = json.dumps(synthetic_catalog(size))
+
+    def allocated(build: Callable) -> int:
+        gc.collect()
+        tracemalloc.start()
+        try:
+            kept = build()
+            gc.collect()
+            current, _ = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        del kept
+        return current
+
+    dict_layout = allocated(lambda: json.loads(data))
+    catalog = allocated(lambda: Catalog(json.loads(data)))
+    index = allocated(lambda: CatalogIndex(
+        (title, info["author"]) for title, info in json.loads(data).items()
+    ))
+    # The index shares the title strings with the records, so add them back
+    titles = allocated(lambda: list(json.loads(data)))
+    compact = catalog - index + titles
+    return {
+        "size": size,
+        "dict_records_bytes": dict_layout,
+        "compact_records_bytes": compact,
+        "index_bytes": index - titles,
+        "saving": 1 - compact / dict_layout if dict_layout else 0.0,
+    }
+
+
+def print_memory_report(runs: List[dict]) -> None:
+    """Print bytes per book for each record layout."""
+    print(f"{'size':>9} {'dict B/book':>12} {'compact B/book':>15} {'index B/book':>13} {'saving':>7}")
+    for run in runs:
+        size = run["size"]
+        print(f"{size:>9} {run['dict_records_bytes'] / size:>12.0f} "
+              f"{run['compact_records_bytes'] / size:>15.0f} "
+              f"{run['index_bytes'] / size:>13.0f} {run['saving']:>7.0%}")
+
+
+def git_revision() -> Optional[str]:
+    """The current git commit, if the tree is a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(runs: List[dict]) -> None:
+    """Print a table of throughput and latency per size and function."""
+    print(f"{'size':>9} {'function':<20} {'ops/s':>12} {'p50 us':>10} {'p99 us':>10}")
+    for run in runs:
+        for name, stats in run["functions"].items():
+            print(f"{run['size']:>9} {name:<20} {stats['throughput_per_s']:>12.0f} "
+                  f"{stats['p50_us']:>10.1f} {stats['p99_us']:>10.1f}")
+        print(f"{run['size']:>9} {'(build / peak RSS)':<20} "
+              f"{run['build_s']:>11.2f}s {run['max_rss_mb']:>9.0f}MB")
+
+
+def main():
+    """Run the benchmark suite and save the results as JSON."""
+    parser = argparse.ArgumentParser(description="Benchmark the Library Assistant.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000],
+                        help="catalog sizes to benchmark (up to 1000000)")
+    parser.add_argument("--backend", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--queries", type=int, default=5000, help="calls per function")
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0,
+                        help="latency of the stubbed Gemini model")
+    parser.add_argument("--no-cache", action="store_true", help="disable the response cache")
+    parser.add_argument("--memory", action="store_true",
+                        help="compare catalog record memory instead of timing calls")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--worker-size", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker_size is not None:
+        result = run_size(args.worker_size, args.backend, args.queries,
+                          args.llm_latency_ms / 1000, not args.no_cache)
+        print(json.dumps(result))
+        return
+
+    if args.memory:
+        runs = [memory_usage(size) for size in args.sizes]
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump({"revision": git_revision(), "memory": runs}, handle, indent=2)
+        print_memory_report(runs)
+        print(f"\nResults saved to {args.output}")
+        return
+
+    runs = []
+    for size in args.sizes:
+        command = [sys.executable, os.path.abspath(__file__), "--worker-size", str(size),
+                   "--backend", args.backend, "--queries", str(args.queries),
+                   "--llm-latency-ms", str(args.llm_latency_ms)]
+        if args.no_cache:
+            command.append("--no-cache")
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "settings": {
+            "backend": args.backend,
+            "queries": args.queries,
+            "llm_latency_ms": args.llm_latency_ms,
+            "response_cache": not args.no_cache,
+        },
+        "runs": runs,
+    }
+    with open(args.output, "w", encoding="utf-8") as handle:
+        json.dump(report, handle, indent=2)
+
+    print_report(runs)
+    print(f"\nResults saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
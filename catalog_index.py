@@ -0,0 +1,517 @@
+"""Lookup indexes over the book catalog for the Library Assistant."""
+
+import bisect
+import sys
+from array import array
+from collections.abc import MutableMapping
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from fuzzy_index import FuzzyIndex
+
+
+def normalize_title(text: str) -> str:
+    """Normalize a title or author name for lookups (case and spacing)."""
+    return " ".join(text.lower().split())
+
+
+class CatalogIndex:
+    """
+    Hash, author and prefix indexes over catalog titles.
+
+    - Exact title lookup is a single dict probe.
+    - Author lookup is a single dict probe returning the author's titles.
+    - Prefix lookup bisects a sorted list of normalized titles.
+    - Substring lookup bisects a sorted word vocabulary and checks only the
+      titles that contain a matching word, so it finds any substring that
+      starts at a word boundary (e.g. "gats" or "great gatsby").
+    - Fuzzy lookup corrects misspelled words through SymSpell indexes over
+      the title and author vocabularies (built on first use, then kept in
+      sync), so "the great gatsbi" still finds "The Great Gatsby".
+
+    copy() is copy-on-write: the tables are copied but the postings in them
+    are shared until either index changes one, so copying a large index and
+    applying a few changes to the copy leaves the original untouched.
+    """
+
+    def __init__(self, entries: Iterable[Tuple[str, str]] = ()):
+        self._titles: Dict[str, str] = {}
+        self._authors: Dict[str, Dict[str, None]] = {}
+        self._author_of: Dict[str, str] = {}
+        self._sorted: List[str] = []
+        self._words: Dict[str, Dict[str, None]] = {}
+        self._vocabulary: List[str] = []
+        # Built on the first fuzzy lookup
+        self._fuzzy_titles: Optional[FuzzyIndex] = None
+        self._fuzzy_authors: Optional[FuzzyIndex] = None
+        self._author_words: Dict[str, Dict[str, None]] = {}
+        # (table id, key) of the postings this index may change in place;
+        # None while no postings are shared with a copy
+        self._owned: Optional[Set[Tuple[int, str]]] = None
+        self.add_many(entries)
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def __contains__(self, title: str) -> bool:
+        return normalize_title(title) in self._titles
+
+    def copy(self) -> "CatalogIndex":
+        clone = CatalogIndex()
+        clone._titles = dict(self._titles)
+        clone._authors = dict(self._authors)
+        clone._author_of = dict(self._author_of)
+        clone._sorted = list(self._sorted)
+        clone._words = dict(self._words)
+        clone._vocabulary = list(self._vocabulary)
+        clone._author_words = dict(self._author_words)
+        if self._fuzzy_titles is not None:
+            clone._fuzzy_titles = self._fuzzy_titles.copy(lambda word: clone._words.get(word, ()))
+        if self._fuzzy_authors is not None:
+            clone._fuzzy_authors = self._fuzzy_authors.copy(lambda word: clone._author_words.get(word, ()))
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def _writable(self, table: Dict[str, Dict[str, None]], key: str) -> Dict[str, None]:
+        """``table[key]`` ready to change, copied first if a copy may share it."""
+        postings = table[key]
+        if self._owned is not None and (id(table), key) not in self._owned:
+            postings = table[key] = dict(postings)
+            self._owned.add((id(table), key))
+        return postings
+
+    def _new_postings(self, table: Dict[str, Dict[str, None]], key: str) -> Dict[str, None]:
+        postings = table[key] = {}
+        if self._owned is not None:
+            self._owned.add((id(table), key))
+        return postings
+
+    def add(self, title: str, author: str) -> None:
+        """Index a title; re-adding an existing title replaces its author."""
+        key = normalize_title(title)
+        if key in self._titles:
+            self.remove(self._titles[key])
+        bisect.insort(self._sorted, key)
+        for word in self._index(key, title, author):
+            bisect.insort(self._vocabulary, word)
+
+    def add_many(self, entries: Iterable[Tuple[str, str]]) -> None:
+        """
+        Index many titles at once.
+
+        Equivalent to calling add() for each entry, but the sorted prefix and
+        vocabulary lists are re-sorted once instead of updated per title.
+        """
+        batch: Dict[str, Tuple[str, str]] = {}
+        for title, author in entries:
+            batch[normalize_title(title)] = (title, author)
+        for key in batch:
+            if key in self._titles:
+                self.remove(self._titles[key])
+
+        new_words: List[str] = []
+        for key, (title, author) in batch.items():
+            new_words.extend(self._index(key, title, author))
+        if batch:
+            self._sorted = sorted(self._sorted + list(batch))
+        if new_words:
+            self._vocabulary = sorted(self._vocabulary + new_words)
+
+    def _index(self, key: str, title: str, author: str) -> List[str]:
+        """Fill the hash maps for a new title; return words new to the vocabulary."""
+        # Interned so every title by an author shares one key string
+        author_key = sys.intern(normalize_title(author))
+        self._titles[key] = title
+        self._author_of[key] = author_key
+        if author_key not in self._authors:
+            self._new_postings(self._authors, author_key)
+            if self._fuzzy_authors is not None:
+                self._add_author_words(author_key)
+        self._writable(self._authors, author_key)[key] = None
+        new_words = []
+        for word in set(key.split()):
+            if word in self._words:
+                postings = self._writable(self._words, word)
+            else:
+                postings = self._new_postings(self._words, word)
+                new_words.append(word)
+            postings[key] = None
+        if self._fuzzy_titles is not None:
+            self._fuzzy_titles.add_words(new_words)
+        return new_words
+
+    def remove(self, title: str) -> None:
+        """Drop a title from every index. Unknown titles are ignored."""
+        key = normalize_title(title)
+        if self._titles.pop(key, None) is None:
+            return
+        author_key = self._author_of.pop(key)
+        titles = self._writable(self._authors, author_key)
+        del titles[key]
+        if not titles:
+            del self._authors[author_key]
+            if self._fuzzy_authors is not None:
+                self._remove_author_words(author_key)
+        del self._sorted[bisect.bisect_left(self._sorted, key)]
+        for word in set(key.split()):
+            postings = self._writable(self._words, word)
+            del postings[key]
+            if not postings:
+                del self._words[word]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, word)]
+                if self._fuzzy_titles is not None:
+                    self._fuzzy_titles.remove_words([word])
+
+    def get(self, title: str) -> Optional[str]:
+        """Return the catalog spelling of ``title``, or None if not indexed."""
+        return self._titles.get(normalize_title(title))
+
+    def by_author(self, author: str) -> List[str]:
+        """Return every title written by ``author``."""
+        titles = self._authors.get(normalize_title(author), {})
+        return [self._titles[key] for key in titles]
+
+    def prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Return titles starting with ``prefix`` in alphabetical order."""
+        key = normalize_title(prefix)
+        keys = self._range(self._sorted, key, limit)
+        return [self._titles[k] for k in keys]
+
+    def search(self, text: str, limit: Optional[int] = None) -> List[str]:
+        """Return titles containing ``text`` starting at a word boundary."""
+        key = normalize_title(text)
+        if not key:
+            return []
+        words = key.split()
+        if len(words) == 1:
+            # A lone word may be cut short: "gats" must match "gatsby".
+            # Every title holding a word with that prefix matches.
+            vocabulary = self._vocabulary
+            position = bisect.bisect_left(vocabulary, key)
+            matches: Dict[str, None] = {}
+            while position < len(vocabulary) and vocabulary[position].startswith(key):
+                if limit is None:
+                    matches.update(self._words[vocabulary[position]])
+                else:
+                    for title_key in self._words[vocabulary[position]]:
+                        matches[title_key] = None
+                        if len(matches) >= limit:
+                            break
+                    if len(matches) >= limit:
+                        break
+                position += 1
+            results = [self._titles[k] for k in sorted(matches)]
+            return results if limit is None else results[:limit]
+
+        # Every word but the last is complete; its postings bound the result.
+        complete = [self._words.get(word, {}) for word in words[:-1]]
+        candidates = min(complete, key=len)
+
+        results = []
+        for candidate in sorted(candidates):
+            position = candidate.find(key)
+            while position != -1:
+                if position == 0 or candidate[position - 1] == " ":
+                    results.append(self._titles[candidate])
+                    break
+                position = candidate.find(key, position + 1)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def fuzzy_search(self, text: str, max_distance: int = 2, limit: int = 5) -> List[str]:
+        """Return titles mentioned in ``text`` despite up to ``max_distance`` typos, closest first."""
+        if self._fuzzy_titles is None:
+            fuzzy = FuzzyIndex(lambda word: self._words.get(word, ()))
+            fuzzy.add_words(self._words)
+            self._fuzzy_titles = fuzzy
+        return [self._titles[key] for key, _ in self._fuzzy_titles.search(text, max_distance, limit)]
+
+    def fuzzy_authors(self, author: str, max_distance: int = 2) -> List[str]:
+        """
+        Normalized names of the authors ``author`` names despite typos.
+
+        The closest full name, or every author with a one-word ``author``
+        among their names (see FuzzyIndex.find).
+        """
+        if self._fuzzy_authors is None:
+            self._fuzzy_authors = FuzzyIndex(lambda word: self._author_words.get(word, ()))
+            for author_key in self._authors:
+                self._add_author_words(author_key)
+        return self._fuzzy_authors.find(author, max_distance)
+
+    def _add_author_words(self, author_key: str) -> None:
+        for word in set(author_key.split()):
+            if word in self._author_words:
+                postings = self._writable(self._author_words, word)
+            else:
+                postings = self._new_postings(self._author_words, word)
+                self._fuzzy_authors.add_words([word])
+            postings[author_key] = None
+
+    def _remove_author_words(self, author_key: str) -> None:
+        for word in set(author_key.split()):
+            postings = self._writable(self._author_words, word)
+            del postings[author_key]
+            if not postings:
+                del self._author_words[word]
+                self._fuzzy_authors.remove_words([word])
+
+    @staticmethod
+    def _range(sorted_keys: List[str], prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Slice the keys of a sorted list that start with ``prefix``."""
+        start = bisect.bisect_left(sorted_keys, prefix)
+        end = bisect.bisect_left(sorted_keys, prefix + "\U0010ffff", start)
+        if limit is not None:
+            end = min(end, start + limit)
+        return sorted_keys[start:end]
+
+
+class BookRecord(MutableMapping):
+    """
+    Live view of one catalog row, used like ``{"author": ..., "available": ...}``.
+
+    Reads and writes go straight to the catalog's columns, so
+    ``record["available"] -= 1`` updates the catalog itself.
+    """
+
+    __slots__ = ("_catalog", "_row")
+
+    FIELDS = ("author", "available")
+
+    def __init__(self, catalog: "Catalog", row: int):
+        self._catalog = catalog
+        self._row = row
+
+    def __getitem__(self, field: str):
+        if field == "available":
+            return self._catalog._available[self._row]
+        if field == "author":
+            return self._catalog._author_names[self._catalog._author_codes[self._row]]
+        raise KeyError(field)
+
+    def __setitem__(self, field: str, value) -> None:
+        if field == "available":
+            self._catalog._available[self._row] = value
+        elif field == "author":
+            self._catalog._set_author(self._row, value)
+        else:
+            raise KeyError(field)
+
+    def __delitem__(self, field: str) -> None:
+        raise TypeError("Catalog records have a fixed set of fields")
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.FIELDS)
+
+    def __len__(self) -> int:
+        return len(self.FIELDS)
+
+    def __repr__(self) -> str:
+        return repr(dict(self))
+
+
+class Catalog(MutableMapping):
+    """
+    Book catalog mapping ``title -> {"author": ..., "available": ...}``.
+
+    Records are stored column-wise rather than as one dict per book: each
+    row has a title, an author code into a table of distinct author names
+    and an available count, the last two in compact ``array`` columns.
+    ``catalog[title]`` returns a BookRecord view of the row, so existing
+    ``info["author"]`` / ``info["available"]`` code keeps working.
+
+    A CatalogIndex is kept in sync with the entries, and ``version``
+    increases on every change so derived structures can tell when they
+    need to be rebuilt.
+
+    fork() starts the next version of a catalog without touching this one,
+    except that both keep sharing the ``available`` column: copy counts are
+    live stock, not catalog data.
+    """
+
+    def __init__(self, *args, **kwargs):
+        self.index = CatalogIndex()
+        self.version = 0
+        self._rows: Dict[str, int] = {}
+        # Row columns; rows of removed titles are left as unused gaps
+        self._row_titles: List[Optional[str]] = []
+        self._author_codes = array("I")
+        self._available = array("i")
+        # Dictionary encoding of author names
+        self._author_names: List[str] = []
+        self._author_lookup: Dict[str, int] = {}
+        self.update(*args, **kwargs)
+
+    def __getitem__(self, title: str) -> BookRecord:
+        return BookRecord(self, self._rows[title])
+
+    def __setitem__(self, title: str, info) -> None:
+        title = self._store(title, info)
+        self.index.add(title, info["author"])
+        self.version += 1
+
+    def __delitem__(self, title: str) -> None:
+        row = self._rows.pop(title)
+        self._row_titles[row] = None
+        self.index.remove(title)
+        self.version += 1
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rows)
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __contains__(self, title) -> bool:
+        return title in self._rows
+
+    def __repr__(self) -> str:
+        return f"Catalog({dict(self.items())!r})"
+
+    def pop(self, title: str, *default):
+        if title not in self._rows:
+            if default:
+                return default[0]
+            raise KeyError(title)
+        info = dict(self[title])
+        del self[title]
+        return info
+
+    def popitem(self) -> Tuple[str, dict]:
+        if not self._rows:
+            raise KeyError("popitem(): catalog is empty")
+        title = next(reversed(self._rows))
+        return title, self.pop(title)
+
+    def update(self, *args, **kwargs) -> None:
+        entries = dict(*args, **kwargs)
+        if not entries:
+            return
+        # Titles equal but for case and spacing are one book: first spelling, last record
+        batch: Dict[str, list] = {}
+        for title, info in entries.items():
+            batch.setdefault(normalize_title(title), [title, info])[1] = info
+        authors = {}
+        for title, info in batch.values():
+            authors[self._store(title, info)] = info["author"]
+        self.index.add_many(authors.items())
+        self.version += 1
+
+    def clear(self) -> None:
+        self._rows = {}
+        self._row_titles = []
+        self._author_codes = array("I")
+        self._available = array("i")
+        self._author_names = []
+        self._author_lookup = {}
+        self.index = CatalogIndex()
+        self.version += 1
+
+    def fork(self) -> "Catalog":
+        """
+        Copy-on-write copy sharing this catalog's available counts.
+
+        Changing the fork's titles or authors leaves this catalog as it was,
+        so readers still holding it see a consistent catalog, while checkouts
+        through either catalog update the same counts. Rows of titles added
+        to the fork are appended to the shared column unseen by this catalog;
+        since every catalog sharing the column numbers new rows by its
+        length, forks never hand out the same row twice.
+        """
+        fork = Catalog()
+        fork.index = self.index.copy()
+        fork.version = self.version
+        fork._rows = dict(self._rows)
+        fork._row_titles = list(self._row_titles)
+        fork._author_codes = array("I", self._author_codes)
+        fork._available = self._available
+        fork._author_names = list(self._author_names)
+        fork._author_lookup = dict(self._author_lookup)
+        return fork
+
+    def _store(self, title: str, info) -> str:
+        """
+        Write a record into its existing row, or append a new row.
+
+        A title differing from a catalog title only in case and spacing is
+        that title, so its row is updated under the catalog spelling.
+
+        Returns:
+            str: The catalog title of the row
+        """
+        title = self.index.get(title) or title
+        code = self._author_code(info["author"])
+        available = info["available"]
+        row = self._rows.get(title)
+        if row is None:
+            # Rows appended by other catalogs sharing the column are gaps here
+            row = len(self._available)
+            gap = row - len(self._row_titles)
+            if gap:
+                self._row_titles.extend([None] * gap)
+                self._author_codes.extend([0] * gap)
+            self._rows[title] = row
+            self._row_titles.append(title)
+            self._author_codes.append(code)
+            self._available.append(available)
+        else:
+            self._author_codes[row] = code
+            self._available[row] = available
+        return title
+
+    def _author_code(self, author: str) -> int:
+        code = self._author_lookup.get(author)
+        if code is None:
+            code = len(self._author_names)
+            self._author_names.append(author)
+            self._author_lookup[author] = code
+        return code
+
+    def _set_author(self, row: int, author: str) -> None:
+        self._author_codes[row] = self._author_code(author)
+        self.index.add(self._row_titles[row], author)
+        self.version += 1
+
+    def lookup(self, title: str) -> Optional[Tuple[str, BookRecord]]:
+        """Return ``(title, info)`` for a case-insensitive title, or None."""
+        book = self.index.get(title)
+        if book is None:
+            return None
+        return book, self[book]
+
+    def by_author(self, author: str) -> List[str]:
+        """Return every title written by ``author``."""
+        return self.index.by_author(author)
+
+    def titles_with_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Return titles starting with ``prefix``."""
+        return self.index.prefix(prefix, limit)
+
+    def search_titles(self, text: str, limit: Optional[int] = None) -> List[str]:
+        """Return titles containing ``text`` at a word boundary."""
+        return self.index.search(text, limit)
+
+    def fuzzy_titles(self, text: str, max_distance: int = 2, limit: int = 5) -> List[str]:
+        """Return titles mentioned in ``text`` despite up to ``max_distance`` typos, closest first."""
+        return self.index.fuzzy_search(text, max_distance, limit)
+
+    def fuzzy_lookup(self, title: str, max_distance: int = 2) -> Optional[Tuple[str, BookRecord]]:
+        """Like lookup(), but falls back to the closest title within ``max_distance`` typos."""
+        match = self.lookup(title)
+        if match is None:
+            titles = self.fuzzy_titles(title, max_distance, limit=1)
+            if titles:
+                match = titles[0], self[titles[0]]
+        return match
+
+    def fuzzy_by_author(self, author: str, max_distance: int = 2) -> List[str]:
+        """
+        Like by_author(), but falls back to the closest author within
+        ``max_distance`` typos, or to every author with that surname.
+        """
+        titles = self.by_author(author)
+        if not titles:
+            for author_key in self.index.fuzzy_authors(author, max_distance):
+                titles.extend(self.index.by_author(author_key))
+        return titles
@@ -0,0 +1,95 @@
+"""Circuit breaker for the Library Assistant's Gemini calls."""
+
+import threading
+import time
+from typing import Callable
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpen(Exception):
+    """A call was refused because the breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    Stops calling a failing dependency until it recovers.
+
+    After ``failure_threshold`` consecutive failures (a call slower than
+    ``slow_call_seconds`` counts as a failure) the breaker opens and
+    ``allow()`` returns False. Once ``reset_timeout`` seconds have passed it
+    goes half-open and lets a single probe call through: success closes the
+    breaker, failure opens it again. A probe that never reports back is
+    replaced by a new one after another ``reset_timeout``.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        slow_call_seconds: float = 5.0,
+        reset_timeout: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead now."""
+        if self.state == CLOSED:
+            return True
+        with self._lock:
+            now = self.clock()
+            if self.state == OPEN:
+                if now - self.opened_at < self.reset_timeout:
+                    return False
+                self.state = HALF_OPEN
+                self.probe_started_at = now
+                return True
+            if self.state == HALF_OPEN and now - self.probe_started_at >= self.reset_timeout:
+                self.probe_started_at = now
+                return True
+            return self.state == CLOSED
+
+    def is_open(self) -> bool:
+        """Whether ``allow()`` would refuse a call now; unlike it, never admits a probe."""
+        if self.state == CLOSED:
+            return False
+        with self._lock:
+            now = self.clock()
+            if self.state == OPEN:
+                return now - self.opened_at < self.reset_timeout
+            if self.state == HALF_OPEN:
+                return now - self.probe_started_at < self.reset_timeout
+            return False
+
+    def record_success(self, duration: float = 0.0) -> None:
+        """Report a finished call and how long it took."""
+        if duration > self.slow_call_seconds:
+            self.record_failure()
+            return
+        if self.state == CLOSED and not self.failures:
+            return
+        with self._lock:
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        """Report a failed call."""
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = OPEN
+                self.opened_at = self.clock()
+
+    def stats(self) -> dict:
+        """Current state and consecutive failure count."""
+        return {"state": self.state, "failures": self.failures}
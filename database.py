@@ -1,7 +1,30 @@
 """Book database and library data for the Library Assistant."""
 
-# Book Database
-BOOK_DATABASE = {
+import os
+
+from catalog_index import Catalog
+from live_catalog import CatalogReloader, LiveCatalog
+from members import MemberRegistry
+
+# Memory-mapped catalog written once for many worker processes, see shared_catalog.py
+SHARED_CATALOG = os.getenv("LIBRARY_SHARED_CATALOG")
+
+# Path to a SQLite catalog built with `python storage.py <file> --db <path>`
+CATALOG_DB = os.getenv("LIBRARY_CATALOG_DB")
+
+# JSON library file (books and timings) reloaded on change, see live_catalog.py
+CATALOG_FILE = os.getenv("LIBRARY_CATALOG_FILE")
+CATALOG_POLL_SECONDS = float(os.getenv("LIBRARY_CATALOG_POLL", "2"))
+
+# SQLite file of loan records shared between processes (storage.SQLiteLoans);
+# defaults to beside LIBRARY_SHARED_CATALOG, or to LIBRARY_CATALOG_DB itself
+LOANS_DB = os.getenv("LIBRARY_LOANS_DB")
+
+# CSV or JSONL roster of member_id and name, see members.py
+MEMBER_ROSTER = os.getenv("LIBRARY_MEMBER_ROSTER")
+
+# Book Database (indexed by title and author, see catalog_index.py)
+SAMPLE_BOOKS = {
     "The Great Gatsby": {"author": "F. Scott Fitzgerald", "available": 3},
     "To Kill a Mockingbird": {"author": "Harper Lee", "available": 2},
     "1984": {"author": "George Orwell", "available": 5},
@@ -12,5 +35,45 @@ BOOK_DATABASE = {
     "Fahrenheit 451": {"author": "Ray Bradbury", "available": 4},
 }
 
-# Library Timings
+# Registered members, used when no roster file is configured
+SAMPLE_MEMBERS = {
+    "M001": "Alice",
+    "M002": "Bob",
+    "M003": "Carol",
+}
+
+# Library Timings (readers use BOOK_DATABASE.timings, which follows reloads)
 LIBRARY_TIMINGS = "Monday to Friday: 9 AM to 8 PM, Saturday: 10 AM to 6 PM, Sunday: Closed"
+
+# Applies edits of CATALOG_FILE; polling starts with CATALOG_RELOADER.start()
+CATALOG_RELOADER = None
+
+if SHARED_CATALOG:
+    # Workers map the parent's catalog file instead of each building a copy
+    from shared_catalog import SharedCatalog, loans_path
+    BOOK_DATABASE = LiveCatalog(SharedCatalog(SHARED_CATALOG), LIBRARY_TIMINGS)
+    LOANS_DB = LOANS_DB or loans_path(SHARED_CATALOG)
+elif CATALOG_DB:
+    # Large catalogs stay on disk and are queried through SQLite indexes
+    from storage import SQLiteCatalog
+    BOOK_DATABASE = LiveCatalog(SQLiteCatalog(CATALOG_DB), LIBRARY_TIMINGS)
+    LOANS_DB = LOANS_DB or CATALOG_DB
+elif CATALOG_FILE:
+    BOOK_DATABASE = LiveCatalog(Catalog(), LIBRARY_TIMINGS)
+    CATALOG_RELOADER = CatalogReloader(BOOK_DATABASE, CATALOG_FILE, CATALOG_POLL_SECONDS)
+    CATALOG_RELOADER.load()
+else:
+    BOOK_DATABASE = LiveCatalog(Catalog(SAMPLE_BOOKS), LIBRARY_TIMINGS)
+
+# Loans are shared by every process sharing the copy counts; else kept in memory
+LOAN_STORE = None
+if LOANS_DB:
+    from storage import SQLiteLoans
+    LOAN_STORE = SQLiteLoans(LOANS_DB)
+
+# Member IDs are validated against the roster (Bloom filter and hash index)
+if MEMBER_ROSTER:
+    MEMBER_REGISTRY = MemberRegistry()
+    MEMBER_REGISTRY.load_roster(MEMBER_ROSTER)
+else:
+    MEMBER_REGISTRY = MemberRegistry(SAMPLE_MEMBERS.items())
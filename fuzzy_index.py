@@ -0,0 +1,319 @@
+"""Typo-tolerant matching of titles and author names for the Library Assistant."""
+
+from typing import Callable, Dict, Iterable, List, Optional, Set, Sized, Tuple, Union
+
+# Entries a word may belong to and still narrow a fuzzy search
+CANDIDATE_LIMIT = 100
+
+# Punctuation stripped from the ends of query words
+QUERY_PUNCTUATION = ".,;:!?\"'()[]{}"
+
+
+def query_words(text: str) -> List[str]:
+    """Lower-case words of a query with surrounding punctuation removed."""
+    words = (word.strip(QUERY_PUNCTUATION) for word in text.lower().split())
+    return [word for word in words if word]
+
+
+def word_budget(word: str, max_distance: int) -> int:
+    """
+    Edits tolerated in one word: none under 3 letters, one under 8, else two.
+
+    Numbers tolerate none: 1981 is a different year from 1984, not a typo.
+    """
+    if word.isdigit():
+        return 0
+    return min(max_distance, 0 if len(word) < 3 else 1 if len(word) < 8 else 2)
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    """
+    Damerau-Levenshtein distance (adjacent swaps count as one edit).
+
+    Stops early once the distance must exceed ``max_distance``, returning
+    ``max_distance + 1``.
+    """
+    if a == b:
+        return 0
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    before: List[int] = []
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            value = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a[i - 1] != b[j - 1]),
+            )
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, before[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        before, previous = previous, current
+    return min(previous[-1], max_distance + 1)
+
+
+def align(query: List[str], target: List[str], max_distance: int) -> Optional[int]:
+    """
+    Fewest edits with which ``target``'s words occur consecutively in ``query``.
+
+    Each word may differ by at most its word_budget and the whole target by
+    at most ``max_distance``.
+
+    Returns:
+        Optional[int]: The edit count, or None if the target does not occur
+    """
+    best = None
+    for start in range(len(query) - len(target) + 1):
+        total = 0
+        for word, expected in zip(query[start:start + len(target)], target):
+            if word == expected:
+                continue
+            budget = min(word_budget(expected, max_distance), max_distance - total)
+            distance = edit_distance(word, expected, budget) if budget > 0 else 1
+            if distance > budget:
+                break
+            total += distance
+        else:
+            if best is None or total < best:
+                best = total
+    return best
+
+
+class SymSpell:
+    """
+    Symmetric-delete spelling index over a vocabulary of words.
+
+    Each word is stored under every string obtained by deleting up to
+    ``max_distance`` characters from its first ``prefix_length`` characters.
+    A lookup generates the same deletions of the query word and probes
+    them, so finding every word within the edit distance costs a few dozen
+    dict probes however large the vocabulary is. Words are reference
+    counted, so the same word may be added by several owners.
+
+    copy() is copy-on-write: the copy shares the word lists of the
+    deletion table until either index changes one of them.
+    """
+
+    def __init__(self, max_distance: int = 2, prefix_length: int = 7, min_length: int = 3):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.min_length = min_length
+        self._counts: Dict[str, int] = {}
+        # deletion -> word, or list of words when several share it
+        self._deletes: Dict[str, Union[str, List[str]]] = {}
+        # Deletions whose word list this index may change in place; None
+        # while no list is shared with a copy
+        self._owned: Optional[Set[str]] = None
+
+    def __contains__(self, word: str) -> bool:
+        return word in self._counts
+
+    def __len__(self) -> int:
+        return len(self._counts)
+
+    def copy(self) -> "SymSpell":
+        clone = SymSpell(self.max_distance, self.prefix_length, self.min_length)
+        clone._counts = dict(self._counts)
+        clone._deletes = dict(self._deletes)
+        clone._owned = set()
+        self._owned = set()
+        return clone
+
+    def _writable(self, variant: str) -> List[str]:
+        """The word list of ``variant``, copied first if a copy may share it."""
+        entry = self._deletes[variant]
+        if self._owned is not None and variant not in self._owned:
+            entry = self._deletes[variant] = list(entry)
+            self._owned.add(variant)
+        return entry
+
+    def _variants(self, word: str, distance: int) -> Set[str]:
+        """``word``'s prefix and every deletion of up to ``distance`` characters from it."""
+        variants = {word[:self.prefix_length]}
+        frontier = variants
+        for _ in range(distance):
+            frontier = {
+                variant[:i] + variant[i + 1:]
+                for variant in frontier if len(variant) > self.min_length
+                for i in range(len(variant))
+            }
+            variants |= frontier
+        return variants
+
+    def add(self, word: str) -> None:
+        count = self._counts.get(word, 0)
+        self._counts[word] = count + 1
+        if count or len(word) < self.min_length:
+            return
+        for variant in self._variants(word, self.max_distance):
+            entry = self._deletes.get(variant)
+            if entry is None:
+                self._deletes[variant] = word
+            elif isinstance(entry, str):
+                self._deletes[variant] = [entry, word]
+                if self._owned is not None:
+                    self._owned.add(variant)
+            else:
+                self._writable(variant).append(word)
+
+    def remove(self, word: str) -> None:
+        """Drop one reference to ``word``; unknown words are ignored."""
+        count = self._counts.get(word)
+        if count is None:
+            return
+        if count > 1:
+            self._counts[word] = count - 1
+            return
+        del self._counts[word]
+        if len(word) < self.min_length:
+            return
+        for variant in self._variants(word, self.max_distance):
+            entry = self._deletes.get(variant)
+            if entry == word:
+                del self._deletes[variant]
+            elif isinstance(entry, list):
+                entry = self._writable(variant)
+                entry.remove(word)
+                if len(entry) == 1:
+                    self._deletes[variant] = entry[0]
+
+    def lookup(self, word: str, max_distance: int) -> List[Tuple[str, int]]:
+        """Vocabulary words within ``max_distance`` edits of ``word``, closest first."""
+        max_distance = min(max_distance, self.max_distance)
+        if word in self._counts:
+            found = [(word, 0)]
+            if not max_distance:
+                return found
+        elif not max_distance or len(word) < self.min_length:
+            return []
+        else:
+            found = []
+
+        seen = {word}
+        for variant in self._variants(word, max_distance):
+            entry = self._deletes.get(variant)
+            if entry is None:
+                continue
+            for candidate in (entry,) if isinstance(entry, str) else entry:
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = edit_distance(word, candidate, max_distance)
+                if distance <= max_distance:
+                    found.append((candidate, distance))
+        found.sort(key=lambda item: (item[1], item[0]))
+        return found
+
+
+class FuzzyIndex:
+    """
+    Finds entries (titles or author names) mentioned in text despite typos.
+
+    The index owns only the SymSpell vocabulary; ``postings(word)`` supplies
+    the keys of the entries containing a word, so the catalog's existing
+    word index is reused rather than copied. Entry keys are normalized
+    names; their words are compared without surrounding punctuation.
+
+    A query is only searched when one of its words is missing from the
+    vocabulary, i.e. probably misspelled. Candidates are the entries holding
+    one of the query's rarer words (known words, or corrections of the
+    misspelled ones) - words held by more than ``candidate_limit`` entries
+    are too common to narrow the search. Each candidate is then aligned
+    against the query word by word.
+    """
+
+    def __init__(
+        self,
+        postings: Callable[[str], Sized],
+        max_distance: int = 2,
+        candidate_limit: int = CANDIDATE_LIMIT,
+    ):
+        self.postings = postings
+        self.max_distance = max_distance
+        self.candidate_limit = candidate_limit
+        self.spell = SymSpell(max_distance)
+
+    @staticmethod
+    def spellable(word: str) -> bool:
+        """Numbers (years, volume numbers, ISBNs) are never spell-corrected."""
+        return not word.isdigit()
+
+    def copy(self, postings: Callable[[str], Sized]) -> "FuzzyIndex":
+        """Copy-on-write copy of the index drawing on another ``postings``."""
+        clone = FuzzyIndex(postings, self.max_distance, self.candidate_limit)
+        clone.spell = self.spell.copy()
+        return clone
+
+    def add_words(self, words: Iterable[str]) -> None:
+        for word in words:
+            if self.spellable(word):
+                self.spell.add(word)
+
+    def remove_words(self, words: Iterable[str]) -> None:
+        for word in words:
+            if self.spellable(word):
+                self.spell.remove(word)
+
+    def search(self, text: str, max_distance: Optional[int] = None, limit: int = 5) -> List[Tuple[str, int]]:
+        """
+        Keys of entries whose words occur in ``text`` with a few typos.
+
+        Returns:
+            List[Tuple[str, int]]: Up to ``limit`` (key, edits) pairs, fewest
+            edits first, then longest entry
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        query = query_words(text)
+        words = dict.fromkeys(query)
+        if all(word in self.spell or not self.spellable(word) for word in words):
+            return []
+
+        candidates: Dict[str, None] = {}
+        for word in words:
+            if word in self.spell or not self.spellable(word):
+                corrections = [word]
+            else:
+                corrections = [correction for correction, _ in self.spell.lookup(word, word_budget(word, max_distance))]
+            for correction in corrections:
+                postings = self.postings(correction)
+                if len(postings) <= self.candidate_limit:
+                    candidates.update(dict.fromkeys(postings))
+
+        scored = []
+        for key in candidates:
+            target = query_words(key)
+            distance = align(query, target, max_distance)
+            if distance is not None:
+                scored.append((distance, -len(target), key))
+        scored.sort()
+        return [(key, distance) for distance, _, key in scored[:limit]]
+
+    def find(self, text: str, max_distance: Optional[int] = None) -> List[str]:
+        """
+        Keys of the entries ``text`` names, despite a few typos.
+
+        That is the closest entry whose words all occur in ``text``; failing
+        that, a single word (a surname, say) names every entry holding it,
+        or holding the closest spelling of it.
+        """
+        max_distance = self.max_distance if max_distance is None else max_distance
+        matches = self.search(text, max_distance, limit=1)
+        if matches:
+            return [matches[0][0]]
+        words = query_words(text)
+        if len(words) != 1 or not self.spellable(words[0]):
+            return []
+        word = words[0]
+        corrections = self.spell.lookup(word, word_budget(word, max_distance))
+        keys: Dict[str, None] = {}
+        for correction, distance in corrections:
+            if distance > corrections[0][1]:
+                break
+            keys.update(dict.fromkeys(self.postings(correction)))
+        return list(keys)
@@ -0,0 +1,81 @@
+"""Measure how long importing the Library Assistant takes.
+
+Each run imports the module in a fresh interpreter, times the import and
+records which of the deferred heavy dependencies were loaded anyway.
+
+Usage:
+    python import_time.py
+    python import_time.py --statement "from library_assistant import generate_response"
+    python import_time.py --runs 10 --budget-ms 50
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+
+# Dependencies that must only be imported when a model call needs them
+DEFERRED_MODULES = ["google.generativeai", "dotenv", "asyncio", "concurrent.futures", "numpy"]
+
+PROBE = """
+import sys, time
+start = time.perf_counter()
+exec({statement!r})
+elapsed = time.perf_counter() - start
+import json
+print(json.dumps({{
+    "ms": elapsed * 1000,
+    "loaded": [name for name in {deferred!r} if name in sys.modules],
+}}))
+"""
+
+
+def measure(statement: str) -> dict:
+    """Import in a fresh interpreter and return its timing and -X importtime breakdown."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c",
+         PROBE.format(statement=statement, deferred=DEFERRED_MODULES)],
+        capture_output=True, text=True, check=True,
+    )
+    probe = json.loads(result.stdout.strip().splitlines()[-1])
+
+    # Lines look like "import time:   self [us] | cumulative | module"
+    modules = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            modules.append((int(parts[1]), parts[2].rstrip()))
+    probe["modules"] = modules
+    return probe
+
+
+def main():
+    """Run the measurement and print a short report."""
+    parser = argparse.ArgumentParser(description="Measure Library Assistant import time.")
+    parser.add_argument("--statement", default="from assistant import generate_response")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10, help="slowest imports to list")
+    parser.add_argument("--budget-ms", type=float, default=None,
+                        help="exit with status 1 if the median import is slower")
+    args = parser.parse_args()
+
+    runs = [measure(args.statement) for _ in range(args.runs)]
+    times = [run["ms"] for run in runs]
+    median = statistics.median(times)
+    loaded = sorted({name for run in runs for name in run["loaded"]})
+
+    print(f"Statement: {args.statement}")
+    print(f"Import time over {args.runs} runs: median {median:.1f} ms, "
+          f"min {min(times):.1f} ms, max {max(times):.1f} ms")
+    print(f"Deferred modules loaded at import: {', '.join(loaded) if loaded else 'none'}")
+    print("\nSlowest imports (cumulative, last run):")
+    for cumulative, module in sorted(runs[-1]["modules"], reverse=True)[:args.top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {module.strip()}")
+
+    if loaded or (args.budget_ms is not None and median > args.budget_ms):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+"""Thread-safe book checkouts and returns for the Library Assistant."""
+
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+from catalog_index import normalize_title
+
+
+class InventoryError(Exception):
+    """A checkout or return that cannot be carried out."""
+
+
+class BookNotFound(InventoryError):
+    """The title is not in the catalog."""
+
+
+class NoCopiesAvailable(InventoryError):
+    """Every copy of the title is already on loan."""
+
+
+class NotOnLoan(InventoryError):
+    """The member has no copy of the title to return."""
+
+
+class Inventory:
+    """
+    Atomic checkout and return of catalog copies.
+
+    Updates take one of ``stripes`` locks chosen by title, so checkouts of
+    different books proceed in parallel and two threads can never both take
+    the last copy. Readers such as ``check_availability`` read the
+    ``available`` count straight from the catalog without locking; they see
+    either the old or the new count, never a partial update.
+
+    Catalogs that can update counts atomically themselves (such as
+    ``storage.SQLiteCatalog.adjust_available``) are used as-is; the stripe
+    locks then only guard the in-process loan records. Loans are kept in
+    process memory unless a shared ``loans`` store is given
+    (``storage.SQLiteLoans``), as processes sharing one catalog's counts
+    must also share its loans.
+
+    Listeners registered with subscribe() are told of every checkout, and
+    those registered with subscribe_returns() of every return, after the
+    locks are released.
+    """
+
+    def __init__(self, catalog, stripes: int = 64, loans=None):
+        self.catalog = catalog
+        self.loan_store = loans
+        self._title_locks = [threading.Lock() for _ in range(stripes)]
+        self._member_locks = [threading.Lock() for _ in range(stripes)]
+        # member_id -> {title: copies on loan}
+        self._loans: Dict[str, Dict[str, int]] = {}
+        self._listeners: List[Callable[[str, str], None]] = []
+        self._return_listeners: List[Callable[[str, str], None]] = []
+
+    def _title_lock(self, title: str) -> threading.Lock:
+        return self._title_locks[hash(normalize_title(title)) % len(self._title_locks)]
+
+    def _member_lock(self, member_id: str) -> threading.Lock:
+        return self._member_locks[hash(member_id) % len(self._member_locks)]
+
+    def subscribe(self, listener: Callable[[str, str], None]) -> None:
+        """Call ``listener(member_id, title)`` after every checkout."""
+        self._listeners.append(listener)
+
+    def subscribe_returns(self, listener: Callable[[str, str], None]) -> None:
+        """Call ``listener(member_id, title)`` after every return."""
+        self._return_listeners.append(listener)
+
+    def available(self, title: str) -> Optional[int]:
+        """Available copies of a title without taking any lock, or None if unknown."""
+        match = self.catalog.lookup(title)
+        return match[1]["available"] if match else None
+
+    def loans(self, member_id: str) -> Dict[str, int]:
+        """The titles a member currently has on loan, with copy counts."""
+        if self.loan_store is not None:
+            return self.loan_store.loans(member_id)
+        return dict(self._loans.get(member_id, {}))
+
+    def checkout(self, title: str, member_id: str) -> Tuple[str, int]:
+        """
+        Lend one copy of a title to a member.
+
+        Returns:
+            tuple: (catalog title, copies still available afterwards)
+
+        Raises:
+            BookNotFound: The title is not in the catalog
+            NoCopiesAvailable: No copies are left
+        """
+        book = self._resolve(title)
+        # Lock order is always title stripe, then member stripe
+        with self._title_lock(book):
+            remaining = self._adjust(book, -1)
+            if remaining is None:
+                raise NoCopiesAvailable(book)
+            try:
+                self._record_loan(member_id, book, 1)
+            except Exception:
+                # The loan could not be recorded, so the copy goes back
+                self._adjust(book, 1)
+                raise
+        for listener in self._listeners:
+            listener(member_id, book)
+        return book, remaining
+
+    def return_book(self, title: str, member_id: str) -> Tuple[str, Optional[int]]:
+        """
+        Take back one copy of a title from a member.
+
+        A title the member has on loan can be returned even after it was
+        withdrawn from the catalog; the loan is then released without a
+        count to put the copy back on.
+
+        Returns:
+            tuple: (title, copies available afterwards or None if the title
+            is no longer in the catalog)
+
+        Raises:
+            BookNotFound: The title is neither on loan to the member nor in the catalog
+            NotOnLoan: The member has not borrowed this title
+        """
+        book = self._resolve_loan(title, member_id)
+        with self._title_lock(book):
+            if not self._record_loan(member_id, book, -1):
+                raise NotOnLoan(book)
+            try:
+                available = self._adjust(book, 1)
+            except BookNotFound:
+                available = None
+        for listener in self._return_listeners:
+            listener(member_id, book)
+        return book, available
+
+    def restock(self, title: str, delta: int) -> Optional[int]:
+        """
+        Put copies of a title on the shelf, or withdraw them if ``delta`` < 0.
+
+        Copies on loan are unaffected and the available count never drops
+        below zero.
+
+        Returns:
+            Optional[int]: Copies available afterwards, or None if the title
+            is not in the catalog
+        """
+        match = self.catalog.lookup(title)
+        if match is None:
+            return None
+        book = match[0]
+        with self._title_lock(book):
+            try:
+                available = self.catalog[book]["available"]
+            except KeyError:
+                return None
+            return self._adjust(book, max(delta, -available))
+
+    def _record_loan(self, member_id: str, book: str, delta: int) -> bool:
+        """Add ``delta`` to a member's copies of a book on loan unless it would go negative."""
+        if self.loan_store is not None:
+            return self.loan_store.adjust(member_id, book, delta) is not None
+        with self._member_lock(member_id):
+            loans = self._loans.get(member_id, {})
+            copies = loans.get(book, 0) + delta
+            if copies < 0:
+                return False
+            if copies:
+                self._loans.setdefault(member_id, loans)[book] = copies
+            else:
+                loans.pop(book, None)
+                if not loans:
+                    self._loans.pop(member_id, None)
+            return True
+
+    def _resolve(self, title: str) -> str:
+        match = self.catalog.lookup(title)
+        if match is None:
+            raise BookNotFound(title)
+        return match[0]
+
+    def _resolve_loan(self, title: str, member_id: str) -> str:
+        """The title as the member borrowed it, else as the catalog resolves it."""
+        key = normalize_title(title)
+        for book in self.loans(member_id):
+            if normalize_title(book) == key:
+                return book
+        return self._resolve(title)
+
+    def _adjust(self, book: str, delta: int) -> Optional[int]:
+        """Add ``delta`` to the available count unless it would go negative."""
+        adjust = getattr(self.catalog, "adjust_available", None)
+        if adjust is not None:
+            return adjust(book, delta)
+        try:
+            info = self.catalog[book]
+        except KeyError:
+            # Removed from the catalog since it was resolved
+            raise BookNotFound(book)
+        if info["available"] + delta < 0:
+            return None
+        # A single store: lock-free readers see the old or the new count
+        info["available"] += delta
+        return info["available"]
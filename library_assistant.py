@@ -3,18 +3,40 @@ Library Assistant using Google Gemini API
 """
 
 import os
+from functools import lru_cache
 from typing import Optional
 from pydantic import BaseModel
-from dotenv import load_dotenv
-import google.generativeai as genai
+from catalog_index import Catalog
 
-# Load API key from .env file
-load_dotenv()
 
-# Configure Gemini
-GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-if GEMINI_API_KEY:
-    genai.configure(api_key=GEMINI_API_KEY)
+# =============================================================================
+# Gemini Setup (deferred until the first model call)
+# =============================================================================
+
+@lru_cache(maxsize=None)
+def gemini_api_key() -> Optional[str]:
+    """The Gemini API key, from the environment or the .env file."""
+    if not os.getenv("GEMINI_API_KEY"):
+        # Load API key from .env file
+        from dotenv import load_dotenv
+        load_dotenv()
+    return os.getenv("GEMINI_API_KEY")
+
+
+def __getattr__(name: str):
+    # GEMINI_API_KEY used to be a module constant read at import time
+    if name == "GEMINI_API_KEY":
+        return gemini_api_key()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@lru_cache(maxsize=None)
+def get_model():
+    """The shared Gemini model client, created and configured on first use."""
+    import google.generativeai as genai
+    
+    genai.configure(api_key=gemini_api_key())
+    return genai.GenerativeModel('gemini-1.5-flash')
 
 
 # =============================================================================
@@ -31,7 +53,7 @@ class UserContext(BaseModel):
 # Book Database
 # =============================================================================
 
-BOOK_DATABASE = {
+BOOK_DATABASE = Catalog({
     "The Great Gatsby": {"author": "F. Scott Fitzgerald", "available": 3},
     "To Kill a Mockingbird": {"author": "Harper Lee", "available": 2},
     "1984": {"author": "George Orwell", "available": 5},
@@ -40,7 +62,7 @@ BOOK_DATABASE = {
     "One Hundred Years of Solitude": {"author": "Gabriel García Márquez", "available": 2},
     "The Hobbit": {"author": "J.R.R. Tolkien", "available": 3},
     "Fahrenheit 451": {"author": "Ray Bradbury", "available": 4},
-}
+})
 
 LIBRARY_TIMINGS = "Monday to Friday: 9 AM to 8 PM, Saturday: 10 AM to 6 PM, Sunday: Closed"
 
@@ -59,12 +81,12 @@ def search_book(book_name: str) -> str:
     Returns:
         str: Information about the book if found, or message if not found
     """
-    # Normalize book name for search
-    search_name = book_name.strip().lower()
+    # Case-insensitive lookup through the catalog index
+    match = BOOK_DATABASE.lookup(book_name)
     
-    for book, info in BOOK_DATABASE.items():
-        if search_name == book.lower():
-            return f"✅ Book found: '{book}' by {info['author']}. Available copies: {info['available']}"
+    if match:
+        book, info = match
+        return f"✅ Book found: '{book}' by {info['author']}. Available copies: {info['available']}"
     
     return f"❌ Book '{book_name}' not found in our database."
 
@@ -84,12 +106,12 @@ def check_availability(book_name: str, member_id: str) -> str:
     if not member_id:
         return "🔒 This tool is only available for registered library members. Please provide your member_id."
     
-    # Normalize book name for search
-    search_name = book_name.strip().lower()
+    # Case-insensitive lookup through the catalog index
+    match = BOOK_DATABASE.lookup(book_name)
     
-    for book, info in BOOK_DATABASE.items():
-        if search_name == book.lower():
-            return f"📚 '{book}' by {info['author']}: {info['available']} copies available"
+    if match:
+        book, info = match
+        return f"📚 '{book}' by {info['author']}: {info['available']} copies available"
     
     return f"❌ Book '{book_name}' not found in our database."
 
@@ -199,13 +221,12 @@ Rules:
 """
 
     # Check if Gemini is configured
-    if not GEMINI_API_KEY:
+    if not gemini_api_key():
         # Fallback to rule-based response without AI
         return rule_based_response(user_input, user_context)
     
     try:
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content([
+        response = get_model().generate_content([
             {"role": "user", "parts": [f"{system_prompt}\n\nUser: {user_input}"]}
         ])
         return response.text
@@ -0,0 +1,401 @@
+"""Hot-reloadable library data for the Library Assistant.
+
+The catalog and library timings are published as immutable snapshots.
+Readers go through a LiveCatalog handle that always points at the latest
+snapshot; a writer builds the next snapshot on a copy-on-write fork of the
+catalog and swaps it in with a single assignment, so readers never lock
+and never see a half-applied change. CatalogReloader watches a JSON
+library file and applies each edit as such a change.
+"""
+
+import json
+import os
+import threading
+from collections.abc import MutableMapping
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+# Largest count the catalog's int32 available column can hold
+MAX_AVAILABLE = 2 ** 31 - 1
+
+
+class LibrarySnapshot(NamedTuple):
+    """One consistent version of the library data."""
+    catalog: object
+    timings: str
+
+
+class CatalogChange(NamedTuple):
+    """The edits that turn one version of the library data into the next."""
+    # New titles -> {"author": ..., "available": ...}
+    added: Dict[str, dict]
+    removed: List[str]
+    # Title -> new author
+    authors: Dict[str, str]
+    # Title -> copies added to the shelf (negative when copies are withdrawn)
+    restocked: Dict[str, int]
+    # The new timings, or None if they did not change
+    timings: Optional[str] = None
+
+    @property
+    def titles(self) -> List[str]:
+        """Titles added, removed or re-attributed (restocks excluded)."""
+        return list(self.added) + self.removed + list(self.authors)
+
+    def is_empty(self) -> bool:
+        return not (self.added or self.removed or self.authors or self.restocked or self.timings is not None)
+
+
+def diff_library(
+    old_books: Dict[str, dict], old_timings: Optional[str],
+    new_books: Dict[str, dict], new_timings: Optional[str],
+) -> CatalogChange:
+    """The change from one version of a library file to the next."""
+    added = {title: info for title, info in new_books.items() if title not in old_books}
+    removed = [title for title in old_books if title not in new_books]
+    authors = {}
+    restocked = {}
+    for title, info in new_books.items():
+        old = old_books.get(title)
+        if old is None:
+            continue
+        if info["author"] != old["author"]:
+            authors[title] = info["author"]
+        if info["available"] != old["available"]:
+            restocked[title] = info["available"] - old["available"]
+    timings = new_timings if new_timings is not None and new_timings != old_timings else None
+    return CatalogChange(added, removed, authors, restocked, timings)
+
+
+def load_library(path: str) -> Tuple[Dict[str, dict], Optional[str]]:
+    """
+    Read a library file.
+
+    The file is a JSON object with ``books`` mapping each title to
+    ``{"author": ..., "available": ...}`` and optionally ``timings``.
+
+    Returns:
+        tuple: (books, timings), timings None when the file has none
+
+    Raises:
+        ValueError: The file is not a valid library file
+    """
+    with open(path, encoding="utf-8") as handle:
+        data = json.load(handle)
+    if not isinstance(data, dict) or not isinstance(data.get("books"), dict):
+        raise ValueError(f"{path}: expected an object with a 'books' mapping")
+    books = {}
+    for title, info in data["books"].items():
+        if not isinstance(info, dict) or not isinstance(info.get("author"), str):
+            raise ValueError(f"{path}: book '{title}' needs an author")
+        available = info.get("available", 0)
+        if not isinstance(available, int) or not 0 <= available <= MAX_AVAILABLE:
+            raise ValueError(f"{path}: book '{title}' needs an available count of 0 to {MAX_AVAILABLE}")
+        books[title] = {"author": info["author"], "available": available}
+    timings = data.get("timings")
+    if timings is not None and not isinstance(timings, str):
+        raise ValueError(f"{path}: 'timings' must be a string")
+    return books, timings
+
+
+class LiveCatalog(MutableMapping):
+    """
+    Stable handle to the current snapshot of the library data.
+
+    Modules keep a reference to the handle rather than to a catalog, so a
+    reload is visible everywhere at once. Each call reads the current
+    snapshot once; code making several lookups that must agree takes
+    ``snapshot()`` first and works on that catalog.
+
+    Every change goes through apply() (the mapping methods build a
+    CatalogChange for it), serialized by a writer lock. Catalogs that can
+    fork (``catalog_index.Catalog``) are changed on a fork that is then
+    published; others (``storage.SQLiteCatalog``) are changed in place,
+    each statement being atomic in SQLite. Available counts are live stock
+    shared by every snapshot, so checkouts are never lost to a swap.
+    Restocks go through ``restock(title, delta)`` when set, so they take the
+    same locks as checkouts.
+    """
+
+    def __init__(self, catalog, timings: str):
+        self._current = LibrarySnapshot(catalog, timings)
+        self._write_lock = threading.Lock()
+        self._listeners: List[Callable[[CatalogChange], None]] = []
+        self._preparers: List[Callable[[object], None]] = []
+        self.restock: Optional[Callable[[str, int], Optional[int]]] = None
+
+    def snapshot(self):
+        """The current catalog; it is never changed after publication (except counts)."""
+        return self._current.catalog
+
+    @property
+    def timings(self) -> str:
+        return self._current.timings
+
+    @property
+    def version(self) -> int:
+        return self._current.catalog.version
+
+    def __getattr__(self, name: str):
+        # Backend-specific methods such as find_titles or adjust_available
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return getattr(self._current.catalog, name)
+
+    def __getitem__(self, title: str):
+        return self._current.catalog[title]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._current.catalog)
+
+    def __len__(self) -> int:
+        return len(self._current.catalog)
+
+    def __contains__(self, title) -> bool:
+        return title in self._current.catalog
+
+    def __repr__(self) -> str:
+        return f"LiveCatalog({self._current.catalog!r})"
+
+    def lookup(self, title: str):
+        return self._current.catalog.lookup(title)
+
+    def by_author(self, author: str) -> List[str]:
+        return self._current.catalog.by_author(author)
+
+    def titles_with_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        return self._current.catalog.titles_with_prefix(prefix, limit)
+
+    def search_titles(self, text: str, limit: Optional[int] = None) -> List[str]:
+        return self._current.catalog.search_titles(text, limit)
+
+    def fuzzy_titles(self, text: str, max_distance: int = 2, limit: int = 5) -> List[str]:
+        return self._current.catalog.fuzzy_titles(text, max_distance, limit)
+
+    def fuzzy_lookup(self, title: str, max_distance: int = 2):
+        return self._current.catalog.fuzzy_lookup(title, max_distance)
+
+    def fuzzy_by_author(self, author: str, max_distance: int = 2) -> List[str]:
+        return self._current.catalog.fuzzy_by_author(author, max_distance)
+
+    def __setitem__(self, title: str, info) -> None:
+        self.update({title: info})
+
+    def __delitem__(self, title: str) -> None:
+        if title not in self._current.catalog:
+            raise KeyError(title)
+        self.apply(CatalogChange({}, [title], {}, {}))
+
+    def update(self, *args, **kwargs) -> None:
+        """Add titles, or overwrite the author and available count of existing ones."""
+        catalog = self._current.catalog
+        added, authors, restocked = {}, {}, {}
+        for title, info in dict(*args, **kwargs).items():
+            current = catalog.get(title)
+            if current is None:
+                added[title] = {"author": info["author"], "available": info["available"]}
+                continue
+            if current["author"] != info["author"]:
+                authors[title] = info["author"]
+            if current["available"] != info["available"]:
+                restocked[title] = info["available"] - current["available"]
+        change = CatalogChange(added, [], authors, restocked)
+        if not change.is_empty():
+            self.apply(change)
+
+    def clear(self) -> None:
+        self.apply(CatalogChange({}, list(self._current.catalog), {}, {}))
+
+    def set_timings(self, timings: str) -> None:
+        self.apply(CatalogChange({}, [], {}, {}, timings))
+
+    def subscribe(self, listener: Callable[[CatalogChange], None]) -> None:
+        """Call ``listener(change)`` after every published change, e.g. to drop stale caches."""
+        self._listeners.append(listener)
+
+    def subscribe_prepare(self, hook: Callable[[object], None]) -> None:
+        """
+        Call ``hook(catalog)`` with every changed catalog before it is published.
+
+        Hooks run on the writer's thread, so indexes derived from the catalog
+        (such as ``matcher.QueryMatcher``'s automaton) are rebuilt there rather
+        than by the first reader after a reload.
+        """
+        self._preparers.append(hook)
+
+    def apply(self, change: CatalogChange) -> LibrarySnapshot:
+        """
+        Apply a change and publish the result as the current snapshot.
+
+        Returns:
+            LibrarySnapshot: The snapshot now current
+        """
+        with self._write_lock:
+            current = self._current
+            catalog = current.catalog
+            if change.added or change.removed or change.authors:
+                if hasattr(catalog, "fork"):
+                    catalog = catalog.fork()
+                self._edit(catalog, change)
+                for hook in self._preparers:
+                    hook(catalog)
+            timings = current.timings if change.timings is None else change.timings
+            self._current = LibrarySnapshot(catalog, timings)
+            for title, delta in change.restocked.items():
+                self._restock(title, delta)
+            published = self._current
+        for listener in self._listeners:
+            listener(change)
+        return published
+
+    @staticmethod
+    def _edit(catalog, change: CatalogChange) -> None:
+        removed = [title for title in change.removed if title in catalog]
+        if len(removed) == len(catalog) and hasattr(catalog, "fork"):
+            catalog.clear()
+        else:
+            for title in removed:
+                del catalog[title]
+        for title, author in change.authors.items():
+            if title not in catalog:
+                continue
+            record = catalog[title]
+            if isinstance(record, dict):
+                # Backends returning plain dicts need the record written back
+                catalog[title] = dict(record, author=author)
+            else:
+                record["author"] = author
+        if change.added:
+            catalog.update(change.added)
+
+    def _restock(self, title: str, delta: int) -> None:
+        if self.restock is not None:
+            self.restock(title, delta)
+            return
+        match = self._current.catalog.lookup(title)
+        if match is None:
+            return
+        book, info = match
+        adjust = getattr(self._current.catalog, "adjust_available", None)
+        delta = max(delta, -info["available"])
+        if adjust is not None:
+            adjust(book, delta)
+        else:
+            info["available"] += delta
+
+
+class CatalogReloader:
+    """
+    Applies edits of a library file (see load_library) to a LiveCatalog.
+
+    check() compares the file's modification time and size with the last
+    load and, when they changed, diffs the new contents against the
+    previous ones and applies only the difference, so indexes are updated
+    incrementally rather than rebuilt. start() runs check() every
+    ``interval`` seconds on a daemon thread. A file that fails to load (for
+    instance while it is half written) leaves the catalog as it is; it is
+    read again once it changes.
+
+    Available counts in the file are stock, not shelf counts: raising a
+    count from 3 to 5 adds two copies to those on the shelf now, so copies
+    on loan are not forgotten.
+    """
+
+    def __init__(self, live: LiveCatalog, path: str, interval: float = 2.0):
+        self.live = live
+        self.path = path
+        self.interval = interval
+        self._books: Dict[str, dict] = {}
+        self._timings: Optional[str] = None
+        # (mtime_ns, size) of the last file read
+        self._stamp: Optional[Tuple[int, int]] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def _file_stamp(self) -> Tuple[int, int]:
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self) -> CatalogChange:
+        """
+        Read the file now and apply what changed since the last load.
+
+        Raises:
+            OSError: The file cannot be read
+            ValueError: The file is not a valid library file
+        """
+        with self._lock:
+            stamp = self._file_stamp()
+            try:
+                books, timings = load_library(self.path)
+            finally:
+                self._stamp = stamp
+            change = diff_library(self._books, self._timings, books, timings)
+            if not change.is_empty():
+                published = self.live._current
+                try:
+                    self.live.apply(change)
+                finally:
+                    # Remember the file only once the change was published
+                    # (a listener may still fail after that), so a change
+                    # that failed is diffed again on the next load
+                    if self.live._current is not published:
+                        self._books, self._timings = books, timings
+                self.reloads += 1
+            else:
+                self._books, self._timings = books, timings
+            return change
+
+    def check(self) -> Optional[CatalogChange]:
+        """
+        Reload the file if it changed since the last load.
+
+        Returns:
+            Optional[CatalogChange]: What changed, or None if the file was
+            unchanged or could not be loaded
+        """
+        try:
+            if self._file_stamp() == self._stamp:
+                return None
+            return self.load()
+        except (OSError, ValueError) as error:
+            self.errors += 1
+            self.last_error = str(error)
+            return None
+
+    def start(self) -> None:
+        """Poll the file on a daemon thread until stop()."""
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="catalog-reloader", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            try:
+                self.check()
+            except Exception as error:
+                # A failing listener must not stop the watcher
+                self.errors += 1
+                self.last_error = str(error)
+
+    def stats(self) -> dict:
+        """Return reload counts as a plain dict."""
+        return {
+            "path": self.path,
+            "books": len(self._books),
+            "version": self.live.version,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "last_error": self.last_error,
+        }
@@ -1,10 +1,20 @@
-"""Main entry point for the Library Assistant."""
+"""Main entry point for the Library Assistant.
+
+Usage:
+    python main.py                                        # example conversation
+    python main.py --replay queries.jsonl --qps 200 --workers 4
+    python main.py --replay queries.jsonl --original-timing --speedup 10
+"""
+
+import argparse
+import json
+import os
 
 from models import UserContext
 from assistant import generate_response
 
 
-def main():
+def run_examples():
     """Main function to run tests with the library assistant."""
     
     print("=" * 60)
@@ -56,5 +66,43 @@ def main():
     print(f"Assistant: {result_6}")
 
 
+def run_replay(args: argparse.Namespace) -> None:
+    """Replay a query log through worker processes and report capacity."""
+    from replay import print_replay_report, read_log, replay
+    
+    queries = read_log(args.replay, args.qps, args.original_timing, args.speedup)
+    report = replay(queries, args.workers, args.threads, args.llm_latency_ms / 1000)
+    print_replay_report(report)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(report, handle, indent=2)
+        print(f"\nResults saved to {args.output}")
+
+
+def main():
+    """Run the example conversation, or replay a query log with --replay."""
+    parser = argparse.ArgumentParser(description="Run the Library Assistant examples or replay a query log.")
+    parser.add_argument("--replay", metavar="LOG",
+                        help="JSONL query log of user_input, name, member_id, timestamp")
+    pacing = parser.add_mutually_exclusive_group()
+    pacing.add_argument("--qps", type=float, help="send at this rate (default: as fast as possible)")
+    pacing.add_argument("--original-timing", action="store_true",
+                        help="keep the gaps between the log's timestamps")
+    parser.add_argument("--speedup", type=float, default=1.0,
+                        help="divide the original gaps by this factor")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="worker processes")
+    parser.add_argument("--threads", type=int, default=16, help="requests in flight per worker")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0,
+                        help="latency of the stubbed Gemini model")
+    parser.add_argument("--output", help="save the replay report as JSON")
+    args = parser.parse_args()
+    
+    if args.replay:
+        run_replay(args)
+    else:
+        run_examples()
+
+
 if __name__ == "__main__":
     main()
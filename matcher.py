@@ -0,0 +1,159 @@
+"""Multi-pattern query matching for the Library Assistant guardrail and router."""
+
+from collections import deque
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Set, Tuple
+
+
+class AhoCorasick:
+    """
+    Aho-Corasick automaton over a fixed set of patterns.
+
+    Finds every occurrence of every pattern (including overlapping ones)
+    in a single left-to-right pass over the text.
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns: List[str] = []
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+        # Nearest node along the fail chain that ends a pattern
+        self._dict_link: List[int] = [0]
+
+        for pattern in patterns:
+            self._insert(pattern)
+        self._link()
+
+    def _insert(self, pattern: str) -> None:
+        if not pattern:
+            return
+        node = 0
+        for char in pattern:
+            nxt = self._goto[node].get(char)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][char] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+                self._dict_link.append(0)
+            node = nxt
+        self._out[node].append(len(self.patterns))
+        self.patterns.append(pattern)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(char, 0)
+                self._fail[child] = target if target != child else 0
+                link = self._fail[child]
+                self._dict_link[child] = link if self._out[link] else self._dict_link[link]
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int]]:
+        """Yield ``(start, pattern_id)`` for every occurrence in ``text``."""
+        goto, fail, out, dict_link = self._goto, self._fail, self._out, self._dict_link
+        patterns = self.patterns
+        node = 0
+        for position, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            hit = node if out[node] else dict_link[node]
+            while hit:
+                for pattern_id in out[hit]:
+                    yield position - len(patterns[pattern_id]) + 1, pattern_id
+                hit = dict_link[hit]
+
+
+class QueryMatch(NamedTuple):
+    """Everything a single pass over a query found."""
+    titles: List[str]
+    keywords: Set[str]
+
+
+class QueryMatcher:
+    """
+    Finds catalog titles and keywords mentioned in a query.
+
+    Matching is case-insensitive substring matching, the same as
+    ``title.lower() in query.lower()``. The automaton is built once and
+    rebuilt only when the catalog's ``version`` changes. Registering
+    prepare() with ``LiveCatalog.subscribe_prepare`` builds the automaton
+    for a new catalog before it is published, so queries never wait for a
+    rebuild after a reload.
+
+    Catalogs too large to hold in an automaton (such as
+    ``storage.SQLiteCatalog``) provide ``find_titles(query)`` instead; the
+    automaton then covers only the keywords and titles come from the catalog.
+    """
+
+    def __init__(self, catalog, keywords: Iterable[str]):
+        self.catalog = catalog
+        self.keywords = [keyword.lower() for keyword in keywords]
+        # (catalog version, automaton, pattern kinds), swapped in as one tuple;
+        # the version is None when titles come from find_titles
+        self._state = None
+        # State built by prepare() for a catalog about to be published
+        self._next = None
+        # Most recent (state, query, match); both assistant functions ask in turn
+        self._last = (None, "", QueryMatch([], set()))
+
+    def prepare(self, catalog) -> None:
+        """Build the automaton for ``catalog``, which is about to replace the current one."""
+        self._next = self._build(catalog)
+
+    def _build(self, catalog) -> tuple:
+        kinds: List[Tuple[bool, str]] = []
+        patterns: List[str] = []
+        for keyword in self.keywords:
+            patterns.append(keyword)
+            kinds.append((False, keyword))
+        version = None
+        if not hasattr(catalog, "find_titles"):
+            version = catalog.version
+            for title in catalog:
+                patterns.append(title.lower())
+                kinds.append((True, title))
+
+        automaton = AhoCorasick(patterns)
+        # Empty patterns are skipped by the automaton, keep ids aligned
+        kinds = [kind for kind, pattern in zip(kinds, patterns) if pattern]
+        return version, automaton, kinds
+
+    def match(self, query: str) -> QueryMatch:
+        """Return every title and keyword found in ``query``."""
+        state = self._state
+        if state is None or (state[0] is not None and state[0] != self.catalog.version):
+            prepared = self._next
+            if prepared is not None and prepared[0] == self.catalog.version:
+                state = prepared
+            else:
+                state = self._build(self.catalog)
+            self._state = state
+        _, automaton, kinds = state
+        last_state, last_query, last_match = self._last
+        if last_state is state and last_query == query:
+            return last_match
+
+        found = []
+        keywords: Set[str] = set()
+        for start, pattern_id in automaton.iter_matches(query.lower()):
+            is_title, value = kinds[pattern_id]
+            if is_title:
+                found.append((start, value))
+            else:
+                keywords.add(value)
+
+        if hasattr(self.catalog, "find_titles"):
+            titles = self.catalog.find_titles(query)
+        else:
+            titles = list(dict.fromkeys(title for _, title in sorted(found, key=lambda hit: hit[0])))
+        result = QueryMatch(titles, keywords)
+        self._last = (state, query, result)
+        return result
@@ -0,0 +1,383 @@
+"""Registry of library members for the Library Assistant.
+
+Member IDs are checked against the roster on every request that names
+one, so the check is built for a roster of millions: a Bloom filter
+rejects almost every unknown ID after a few bit probes, and known IDs are
+confirmed through an open-addressing hash index over compact columns
+rather than millions of Python objects.
+"""
+
+import csv
+import hashlib
+import json
+import math
+import threading
+from array import array
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+# Members whose state (name, loans) is kept ready for the tools
+STATE_CACHE_SIZE = 10_000
+
+# Hash table slots per member are kept at least this many
+TABLE_LOAD = 2
+
+_EMPTY = -1
+_DELETED = -2
+
+
+def member_hashes(member_id: str) -> Tuple[int, int]:
+    """
+    Two independent 64-bit hashes of a member ID.
+
+    BLAKE2b is used rather than ``hash()`` so the values are the same in
+    every process; the second hash is odd so it can serve as a probe step.
+    """
+    digest = hashlib.blake2b(member_id.encode("utf-8"), digest_size=16).digest()
+    return int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+
+
+def normalize_member_id(member_id: str) -> str:
+    """Member IDs are matched exactly, ignoring surrounding whitespace."""
+    return member_id.strip()
+
+
+class BloomFilter:
+    """
+    Set membership with no false negatives and about ``error_rate`` false positives.
+
+    Bits are set for ``hash_count`` positions derived from two base hashes
+    (Kirsch-Mitzenmacher double hashing), so one digest per key suffices.
+    Keys cannot be removed; a removed key merely stays a false positive.
+    """
+
+    def __init__(self, capacity: int, error_rate: float = 0.01):
+        capacity = max(capacity, 1)
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(64, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def add_hashed(self, h1: int, h2: int) -> None:
+        bits, size = self._bits, self.size
+        # Reduced first, so the loop does small-integer arithmetic
+        position, step = h1 % size, h2 % size
+        for _ in range(self.hash_count):
+            bits[position >> 3] |= 1 << (position & 7)
+            position = (position + step) % size
+
+    def contains_hashed(self, h1: int, h2: int) -> bool:
+        bits, size = self._bits, self.size
+        position, step = h1 % size, h2 % size
+        for _ in range(self.hash_count):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+            position = (position + step) % size
+        return True
+
+    def add(self, key: str) -> None:
+        self.add_hashed(*member_hashes(key))
+
+    def __contains__(self, key: str) -> bool:
+        return self.contains_hashed(*member_hashes(key))
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + self._bits.__sizeof__()
+
+
+class StringColumn:
+    """Append-only strings stored as one UTF-8 buffer and an offsets array."""
+
+    def __init__(self):
+        self._data = bytearray()
+        self._offsets = array("q", [0])
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def append(self, value: str) -> None:
+        self._data += value.encode("utf-8")
+        self._offsets.append(len(self._data))
+
+    def raw(self, row: int) -> bytes:
+        return bytes(self._data[self._offsets[row]:self._offsets[row + 1]])
+
+    def __getitem__(self, row: int) -> str:
+        return self.raw(row).decode("utf-8")
+
+    def __sizeof__(self) -> int:
+        return object.__sizeof__(self) + self._data.__sizeof__() + self._offsets.__sizeof__()
+
+
+class MemberState(NamedTuple):
+    """What the tools need to know about a member, cached between requests."""
+    member_id: str
+    name: str
+    # Title -> copies on loan
+    loans: Dict[str, int]
+
+
+def read_roster(path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Stream ``(member_id, name)`` rows from a CSV or JSONL roster file.
+
+    CSV files need a header row with a ``member_id`` column and optionally
+    ``name``; JSONL files hold one object with those keys per line.
+    """
+    with open(path, newline="", encoding="utf-8") as handle:
+        if path.endswith((".jsonl", ".json")):
+            for line in handle:
+                if line.strip():
+                    record = json.loads(line)
+                    yield str(record["member_id"]), record.get("name") or ""
+        else:
+            reader = csv.reader(handle)
+            header = next(reader, [])
+            try:
+                id_column = header.index("member_id")
+            except ValueError:
+                raise ValueError(f"{path}: the header row needs a member_id column")
+            name_column = header.index("name") if "name" in header else None
+            for record in reader:
+                if record:
+                    yield record[id_column], record[name_column] if name_column is not None else ""
+
+
+class MemberRegistry:
+    """
+    Thread-safe roster of library members.
+
+    ``is_member`` asks the Bloom filter first, so unknown IDs are usually
+    rejected without reaching the index; IDs that pass are looked up in a
+    linear-probing hash table of row numbers, keyed by the first of the
+    ID's two hashes, and confirmed by comparing the stored ID bytes. IDs
+    and names are kept in StringColumns, so a roster of two million
+    members takes about 100 MB, well under a dict of Python strings.
+    Lookups take no lock: the table and filter are replaced, never resized
+    in place.
+
+    state() returns a member's MemberState from an LRU cache of
+    ``state_cache_size`` entries. Loans come from ``loans(member_id)`` when
+    it is set (``Inventory.loans``); forget() drops a member's cached state
+    and is subscribed to checkouts and returns. When other processes record
+    loans too, ``cache_loans`` is turned off and loans are read afresh on
+    every call, as forget() only hears of this process's checkouts.
+    """
+
+    def __init__(
+        self,
+        members: Iterable[Tuple[str, str]] = (),
+        error_rate: float = 0.01,
+        state_cache_size: int = STATE_CACHE_SIZE,
+    ):
+        self.error_rate = error_rate
+        self.state_cache_size = state_cache_size
+        self.loans: Optional[Callable[[str], Dict[str, int]]] = None
+        self.cache_loans = True
+        self._ids = StringColumn()
+        self._names = StringColumn()
+        self._count = 0
+        self._removed = 0
+        self._table = array("i", [_EMPTY]) * 16
+        self._bloom = BloomFilter(8, error_rate)
+        self._lock = threading.Lock()
+        self._states: "OrderedDict[str, MemberState]" = OrderedDict()
+        self._state_lock = threading.Lock()
+        # Bumped by every forget, so a state loaded meanwhile is not cached
+        self._state_generation = 0
+        self.lookups = 0
+        self.bloom_rejections = 0
+        self.load(members)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, member_id) -> bool:
+        return isinstance(member_id, str) and self.is_member(member_id)
+
+    def _find(self, key: str, h1: int, table: array) -> Tuple[int, int]:
+        """
+        Probe ``table`` for ``key``.
+
+        Returns:
+            tuple: (slot, row) of the key, or (first free slot, -1) if absent
+        """
+        mask = len(table) - 1
+        raw = key.encode("utf-8")
+        slot = h1 & mask
+        free = -1
+        while True:
+            row = table[slot]
+            if row == _EMPTY:
+                return (slot if free < 0 else free), -1
+            if row == _DELETED:
+                if free < 0:
+                    free = slot
+            elif self._ids.raw(row) == raw:
+                return slot, row
+            slot = (slot + 1) & mask
+
+    def is_member(self, member_id: Optional[str]) -> bool:
+        """Whether ``member_id`` is on the roster."""
+        if not member_id:
+            return False
+        self.lookups += 1
+        key = normalize_member_id(member_id)
+        h1, h2 = member_hashes(key)
+        if not self._bloom.contains_hashed(h1, h2):
+            self.bloom_rejections += 1
+            return False
+        return self._find(key, h1, self._table)[1] >= 0
+
+    def name(self, member_id: str) -> Optional[str]:
+        """The member's name from the roster, or None if they are not a member."""
+        key = normalize_member_id(member_id)
+        h1, h2 = member_hashes(key)
+        if not self._bloom.contains_hashed(h1, h2):
+            return None
+        row = self._find(key, h1, self._table)[1]
+        return self._names[row] if row >= 0 else None
+
+    def add(self, member_id: str, name: str = "") -> None:
+        """Register a member, or rename one already registered."""
+        self.load([(member_id, name)])
+
+    def load(self, members: Iterable[Tuple[str, str]]) -> int:
+        """
+        Bulk load ``(member_id, name)`` pairs, e.g. from read_roster.
+
+        The table and filter are grown once for the whole batch rather than
+        as members arrive. A repeated ID keeps its last name.
+
+        Returns:
+            int: Number of rows read
+        """
+        rows = 0
+        with self._lock:
+            batch: List[Tuple[str, str]] = []
+            for member_id, name in members:
+                key = normalize_member_id(member_id)
+                if key:
+                    batch.append((key, name))
+                rows += 1
+            if not batch:
+                return rows
+            self._reserve(self._count + len(batch))
+            table, bloom = self._table, self._bloom
+            for key, name in batch:
+                h1, h2 = member_hashes(key)
+                slot, row = self._find(key, h1, table)
+                if row >= 0 and self._names[row] == name:
+                    continue
+                # Columns are append-only (a renamed member gets a new row),
+                # and a row is written before readers can reach it
+                self._ids.append(key)
+                self._names.append(name)
+                if row < 0:
+                    if table[slot] == _DELETED:
+                        self._removed -= 1
+                    self._count += 1
+                table[slot] = len(self._ids) - 1
+                bloom.add_hashed(h1, h2)
+            self._forget_states(key for key, _ in batch)
+        return rows
+
+    def load_roster(self, path: str) -> int:
+        """Bulk load a CSV or JSONL roster file (see read_roster)."""
+        return self.load(read_roster(path))
+
+    def remove(self, member_id: str) -> bool:
+        """Take a member off the roster; returns whether they were on it."""
+        key = normalize_member_id(member_id)
+        h1, _ = member_hashes(key)
+        with self._lock:
+            slot, row = self._find(key, h1, self._table)
+            if row < 0:
+                return False
+            self._table[slot] = _DELETED
+            self._count -= 1
+            self._removed += 1
+            self._forget_states([key])
+        return True
+
+    def _reserve(self, count: int) -> None:
+        """Grow the table and filter to hold ``count`` members; call with the lock held."""
+        if len(self._table) < TABLE_LOAD * (count + self._removed):
+            size = 16
+            while size < TABLE_LOAD * count:
+                size *= 2
+            table = array("i", [_EMPTY]) * size
+            mask = size - 1
+            for row in self._table:
+                if row >= 0:
+                    slot = member_hashes(self._ids[row])[0] & mask
+                    while table[slot] != _EMPTY:
+                        slot = (slot + 1) & mask
+                    table[slot] = row
+            self._table = table
+            self._removed = 0
+        if count > self._bloom.capacity:
+            bloom = BloomFilter(max(count, 2 * self._bloom.capacity), self.error_rate)
+            for row in self._table:
+                if row >= 0:
+                    bloom.add_hashed(*member_hashes(self._ids[row]))
+            self._bloom = bloom
+
+    def state(self, member_id: Optional[str]) -> Optional[MemberState]:
+        """
+        A member's cached state, loading it on a miss.
+
+        Returns:
+            Optional[MemberState]: The state, or None if ``member_id`` is not
+            on the roster
+        """
+        if not member_id:
+            return None
+        key = normalize_member_id(member_id)
+        with self._state_lock:
+            state = self._states.get(key)
+            if state is not None:
+                self._states.move_to_end(key)
+            generation = self._state_generation
+        if state is not None:
+            if self.cache_loans or self.loans is None:
+                return state
+            return state._replace(loans=self.loans(key))
+        name = self.name(key)
+        if name is None:
+            return None
+        state = MemberState(key, name, self.loans(key) if self.loans is not None else {})
+        with self._state_lock:
+            if generation != self._state_generation:
+                return state
+            self._states[key] = state
+            while len(self._states) > self.state_cache_size:
+                self._states.popitem(last=False)
+        return state
+
+    def forget(self, member_id: str, title: Optional[str] = None) -> None:
+        """Drop a member's cached state, e.g. after they borrow or return ``title``."""
+        self._forget_states([normalize_member_id(member_id)])
+
+    def _forget_states(self, keys: Iterable[str]) -> None:
+        with self._state_lock:
+            self._state_generation += 1
+            for key in keys:
+                self._states.pop(key, None)
+
+    def stats(self) -> dict:
+        """Return roster size, memory and lookup counts as a plain dict."""
+        return {
+            "members": self._count,
+            "table_slots": len(self._table),
+            "bloom_bits": self._bloom.size,
+            "bloom_hashes": self._bloom.hash_count,
+            "memory_bytes": (
+                self._ids.__sizeof__() + self._names.__sizeof__()
+                + self._table.__sizeof__() + self._bloom.__sizeof__()
+            ),
+            "lookups": self.lookups,
+            "bloom_rejections": self.bloom_rejections,
+            "cached_states": len(self._states),
+        }
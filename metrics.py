@@ -0,0 +1,229 @@
+"""In-memory latency histograms and counters for the Library Assistant."""
+
+import bisect
+import functools
+import inspect
+import json
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence
+
+# Histogram bucket upper bounds in seconds
+DEFAULT_BUCKETS = (
+    0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cumulative in the Prometheus sense on export."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float) -> None:
+        """Record one observation in seconds."""
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket that holds it."""
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return 0.0
+        rank = q * total
+        seen = 0
+        for bound, count in zip(self.bounds + (float("inf"),), counts):
+            seen += count
+            if seen >= rank:
+                return bound if bound != float("inf") else self.bounds[-1]
+        return self.bounds[-1]
+
+    def snapshot(self) -> dict:
+        """Return count, sum, mean, p50/p99 estimates and cumulative buckets."""
+        with self._lock:
+            counts, total, value_sum = list(self.counts), self.count, self.sum
+        cumulative: Dict[str, int] = {}
+        running = 0
+        for bound, count in zip(self.bounds, counts):
+            running += count
+            cumulative[repr(bound)] = running
+        cumulative["+Inf"] = total
+        return {
+            "count": total,
+            "sum": value_sum,
+            "mean": value_sum / total if total else 0.0,
+            "p50": self.quantile(0.5),
+            "p99": self.quantile(0.99),
+            "buckets": cumulative,
+        }
+
+
+class MetricsRegistry:
+    """Per-stage latency histograms plus event counters."""
+
+    def __init__(self, namespace: str = "library_assistant", buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        self.buckets = tuple(buckets)
+        self.stages: Dict[str, Histogram] = {}
+        self.counters: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage: str, seconds: float) -> None:
+        """Record the duration of one stage."""
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            with self._lock:
+                histogram = self.stages.setdefault(stage, Histogram(self.buckets))
+        histogram.observe(seconds)
+
+    def increment(self, event: str, amount: int = 1) -> None:
+        """Add to an event counter."""
+        with self._lock:
+            self.counters[event] = self.counters.get(event, 0) + amount
+
+    def reset(self) -> None:
+        """Drop every recorded value."""
+        with self._lock:
+            self.stages = {}
+            self.counters = {}
+
+    def timed(self, stage: str, func: Callable, on_result: Optional[Callable] = None) -> Callable:
+        """
+        Wrap ``func`` so every call is recorded under ``stage``.
+
+        ``on_result`` is called with the return value, e.g. to count outcomes.
+        Coroutine functions are timed until they finish and generator functions
+        until they are exhausted or closed, so async and streamed answers are
+        recorded like the plain ones. The original function stays available
+        as ``wrapper.__wrapped__``.
+        """
+        clock = time.perf_counter
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    result = await func(*args, **kwargs)
+                finally:
+                    self.observe(stage, clock() - start)
+                if on_result is not None:
+                    on_result(result)
+                return result
+
+            return async_wrapper
+
+        if inspect.isgeneratorfunction(func):
+            @functools.wraps(func)
+            def generator_wrapper(*args, **kwargs):
+                start = clock()
+                try:
+                    return (yield from func(*args, **kwargs))
+                finally:
+                    self.observe(stage, clock() - start)
+
+            return generator_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = clock()
+            try:
+                result = func(*args, **kwargs)
+            finally:
+                self.observe(stage, clock() - start)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        return wrapper
+
+    def snapshot(self) -> dict:
+        """Return every histogram and counter as plain data."""
+        with self._lock:
+            stages, counters = dict(self.stages), dict(self.counters)
+        return {
+            "stages": {stage: histogram.snapshot() for stage, histogram in stages.items()},
+            "counters": counters,
+        }
+
+    def to_json(self) -> str:
+        """The snapshot as a JSON document."""
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self) -> str:
+        """The metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        name = f"{self.namespace}_stage_seconds"
+        lines: List[str] = [
+            f"# HELP {name} Time spent in each stage of answering a query.",
+            f"# TYPE {name} histogram",
+        ]
+        for stage, data in sorted(snapshot["stages"].items()):
+            for bound, count in data["buckets"].items():
+                lines.append(f'{name}_bucket{{stage="{stage}",le="{bound}"}} {count}')
+            lines.append(f'{name}_sum{{stage="{stage}"}} {data["sum"]}')
+            lines.append(f'{name}_count{{stage="{stage}"}} {data["count"]}')
+
+        name = f"{self.namespace}_events_total"
+        lines.append(f"# HELP {name} Outcomes of answering a query.")
+        lines.append(f"# TYPE {name} counter")
+        for event, count in sorted(snapshot["counters"].items()):
+            lines.append(f'{name}{{event="{event}"}} {count}')
+        return "\n".join(lines) + "\n"
+
+
+class InstrumentedModel:
+    """
+    Wraps a Gemini model so its calls are timed under the ``llm`` stage.
+
+    Successful and failed calls are counted as ``llm_success`` and
+    ``llm_error``. For streaming calls only the time to the first response
+    object is recorded.
+    """
+
+    def __init__(self, model, metrics: MetricsRegistry):
+        self._model = model
+        self._metrics = metrics
+
+    def __getattr__(self, name: str):
+        return getattr(self._model, name)
+
+    def generate_content(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            response = self._model.generate_content(*args, **kwargs)
+        except Exception:
+            self._metrics.increment("llm_error")
+            raise
+        finally:
+            self._metrics.observe("llm", time.perf_counter() - start)
+        self._metrics.increment("llm_success")
+        return response
+
+    async def generate_content_async(self, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            method = getattr(self._model, "generate_content_async", None)
+            if method is not None:
+                response = await method(*args, **kwargs)
+            else:
+                import asyncio
+                loop = asyncio.get_running_loop()
+                call = functools.partial(self._model.generate_content, *args, **kwargs)
+                response = await loop.run_in_executor(None, call)
+        except Exception:
+            self._metrics.increment("llm_error")
+            raise
+        finally:
+            self._metrics.observe("llm", time.perf_counter() - start)
+        self._metrics.increment("llm_success")
+        return response
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 
 
 class UserContext(BaseModel):
-    """User context with name and member_id."""
+    """User context with name, member_id and an optional conversation session_id."""
     name: str
     member_id: Optional[str] = None
+    session_id: Optional[str] = None
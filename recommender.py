@@ -0,0 +1,455 @@
+"""Book recommendations for the Library Assistant.
+
+Each title is described by sparse features: its author and the words of
+its title, the only subject information the catalog holds. Features are
+weighted by inverse document frequency. "Books like X" scores the titles
+sharing a rare feature with X, or borrowed by the same members, by the
+cosine similarity of their features plus their co-borrowing similarity;
+"more by this author" ranks an author's titles by how often they are
+borrowed. Scoring a few hundred candidates takes a handful of vectorized
+NumPy operations, so a query costs well under a millisecond whatever the
+catalog size, and answers are memoized until the titles involved change.
+Without NumPy, "books like X" falls back to X's author's other books.
+
+There is deliberately no precomputed title-by-title similarity matrix.
+Over a catalog of millions of titles even its top-k rows would take
+longer to build than the catalog itself, and every added title would
+change rows throughout it. Similarities are instead computed per query
+from the sparse feature matrix, for the candidates only, and the memo
+keeps the per-title answers a precomputed matrix would hold.
+"""
+
+import math
+import threading
+from collections import OrderedDict, deque
+from itertools import islice
+from typing import Deque, Dict, Iterable, List, Optional, Set
+
+from fuzzy_index import query_words
+
+# Titles a feature may describe and still suggest candidates
+CANDIDATE_LIMIT = 500
+
+# How much more a shared author counts than a shared title word of the same rarity
+AUTHOR_WEIGHT = 2.0
+
+# Weight of co-borrowing similarity relative to feature similarity
+CO_BORROW_WEIGHT = 0.5
+
+# Recent checkouts remembered per member, and members remembered
+HISTORY_SIZE = 20
+MEMBER_LIMIT = 100_000
+
+# Suggestions memoized per title; larger requests are computed each time
+MEMO_K = 20
+MEMO_SIZE = 10_000
+
+# Title words that say nothing about a book's subject
+TITLE_STOP_WORDS = {"and", "the", "for", "with", "from", "into", "book", "volume"}
+
+
+def author_key(author: str) -> str:
+    """Normalize an author name the way query words are (case and punctuation)."""
+    return " ".join(query_words(author))
+
+
+def subject_words(title: str) -> List[str]:
+    """The distinct words of a title that may describe its subject."""
+    return list(dict.fromkeys(
+        word for word in query_words(title)
+        if len(word) > 2 and word not in TITLE_STOP_WORDS and not word.isdigit()
+    ))
+
+
+class Recommender:
+    """
+    Top-k recommendations over a catalog, kept up to date incrementally.
+
+    The feature index is built on first use from ``catalog`` and then
+    follows the catalog through apply_change(), which LiveCatalog calls
+    after every published change. Titles are appended as rows of a
+    compressed sparse row matrix (row i's feature ids are
+    ``indices[indptr[i]:indptr[i + 1]]``) whose arrays grow by doubling;
+    removed titles keep their row, marked as removed. Feature weights are computed
+    from live document frequencies at query time, so adding titles never
+    requires rescoring the rest of the catalog.
+
+    Catalogs that store the feature matrix themselves
+    (``shared_catalog.SharedCatalog.features()``) are not indexed again:
+    the recommender reads their arrays in place and keeps only the authors'
+    names in memory. Such catalogs are read-only, so apply_change() has
+    nothing to follow.
+
+    record_checkout() counts, for every pair of titles borrowed by the same
+    member within their last ``history_size`` checkouts, how often they
+    were borrowed together. Checkouts may be recorded before the index is
+    built.
+    """
+
+    def __init__(
+        self,
+        catalog,
+        candidate_limit: int = CANDIDATE_LIMIT,
+        history_size: int = HISTORY_SIZE,
+        member_limit: int = MEMBER_LIMIT,
+    ):
+        self.catalog = catalog
+        self.candidate_limit = candidate_limit
+        self.history_size = history_size
+        self.member_limit = member_limit
+        self._lock = threading.Lock()
+        self._np = None
+        self._built = False
+        # Whether the feature matrix is read from the catalog (see _attach)
+        self._mapped = False
+
+        # Title rows; removed rows keep their slot with title None
+        self._rows: Dict[str, int] = {}
+        self._titles: List[Optional[str]] = []
+        self._row_authors: List[str] = []
+        self._live = 0
+        # Feature key ("a:<author>" or "w:<word>") -> id, and id -> rows
+        self._features: Dict[str, int] = {}
+        self._postings: List[List[int]] = []
+        # Author key -> display name
+        self._authors: Dict[str, str] = {}
+        # Last word of an author key -> author keys, for "more by Orwell"
+        self._surnames: Dict[str, Set[str]] = {}
+        # NumPy columns, allocated by _build: row offsets, feature ids,
+        # live titles per feature and whether a feature is an author
+        self._indptr = None
+        self._indices = None
+        self._df = None
+        self._is_author = None
+        self._nnz = 0
+
+        # Co-borrowing counts, kept by title so they outlive catalog edits
+        self._borrows: Dict[str, int] = {}
+        self._co: Dict[str, Dict[str, int]] = {}
+        self._members: "OrderedDict[str, Deque[str]]" = OrderedDict()
+
+        # Title -> up to MEMO_K suggestions
+        self._memo: Dict[str, List[str]] = {}
+        self.queries = 0
+        self.memo_hits = 0
+
+    def __len__(self) -> int:
+        return self._live
+
+    def _build(self) -> bool:
+        """Index the catalog on first use; call with the lock held. False without NumPy."""
+        if self._built:
+            return self._np is not None
+        self._built = True
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+        else:
+            self._np = np
+            self._indptr = np.zeros(1024, dtype=np.int64)
+            self._indices = np.zeros(4096, dtype=np.int32)
+            self._df = np.zeros(1024, dtype=np.float64)
+            self._is_author = np.zeros(1024, dtype=bool)
+        snapshot = self.catalog.snapshot() if hasattr(self.catalog, "snapshot") else self.catalog
+        if np is not None and hasattr(snapshot, "features"):
+            self._attach(snapshot.features())
+            return True
+        for title in snapshot:
+            info = snapshot.get(title)
+            if info is None:
+                continue
+            if np is not None:
+                self._add(title, info["author"])
+            else:
+                self._add_author(info["author"])
+        return np is not None
+
+    def _attach(self, matrix) -> None:
+        """Use a catalog's stored feature matrix in place of building one."""
+        np = self._np
+        self._mapped = True
+        self._indptr = np.asarray(matrix.indptr)
+        self._indices = np.asarray(matrix.indices)
+        self._df = np.asarray(matrix.df)
+        self._is_author = np.asarray(matrix.is_author).view(bool)
+        self._nnz = len(self._indices)
+        self._postings = matrix.postings
+        self._rows = matrix.rows
+        self._titles = matrix.titles
+        self._live = len(matrix.titles)
+        for author in matrix.authors:
+            self._add_author(author)
+
+    def _grown(self, array, size: int):
+        """``array``, or a copy with at least ``size`` slots, doubling the capacity."""
+        if size <= len(array):
+            return array
+        capacity = len(array)
+        while capacity < size:
+            capacity *= 2
+        grown = self._np.zeros(capacity, dtype=array.dtype)
+        grown[:len(array)] = array
+        return grown
+
+    def _add_author(self, author: str) -> str:
+        """Remember an author's name for find_author; returns its key."""
+        key = author_key(author)
+        if key not in self._authors:
+            self._authors[key] = author
+            if key:
+                self._surnames.setdefault(key.split()[-1], set()).add(key)
+        return key
+
+    def _feature(self, key: str) -> int:
+        feature = self._features.get(key)
+        if feature is None:
+            feature = self._features[key] = len(self._postings)
+            self._postings.append([])
+            self._df = self._grown(self._df, feature + 1)
+            self._is_author = self._grown(self._is_author, feature + 1)
+            self._is_author[feature] = key.startswith("a:")
+        return feature
+
+    def _add(self, title: str, author: str) -> None:
+        """Append a row for ``title``; call with the lock held."""
+        key = self._add_author(author)
+        row = self._rows.get(title)
+        if row is not None:
+            if self._row_authors[row] == key:
+                return
+            self._remove(title)
+        features = [self._feature("a:" + key)] + [self._feature("w:" + word) for word in subject_words(title)]
+
+        row = len(self._titles)
+        self._titles.append(title)
+        self._row_authors.append(key)
+        self._rows[title] = row
+        self._live += 1
+        self._indptr = self._grown(self._indptr, row + 2)
+        self._indices = self._grown(self._indices, self._nnz + len(features))
+        self._indices[self._nnz:self._nnz + len(features)] = features
+        self._nnz += len(features)
+        self._indptr[row + 1] = self._nnz
+        for feature in features:
+            self._df[feature] += 1
+            self._postings[feature].append(row)
+
+    def _remove(self, title: str) -> None:
+        """Tombstone the row of ``title``; call with the lock held."""
+        row = self._rows.pop(title, None)
+        if row is None:
+            return
+        self._titles[row] = None
+        self._live -= 1
+        self._df[self._indices[self._indptr[row]:self._indptr[row + 1]]] -= 1
+
+    def apply_change(self, change) -> None:
+        """
+        Follow a published ``live_catalog.CatalogChange``.
+
+        Edits are idempotent, so a change already seen by the initial build
+        is harmless.
+        """
+        if not (change.added or change.removed or change.authors):
+            return
+        with self._lock:
+            if not self._built or self._mapped:
+                return
+            if self._np is None:
+                for author in change.authors.values():
+                    self._add_author(author)
+                for info in change.added.values():
+                    self._add_author(info["author"])
+                return
+            for title in change.removed:
+                self._remove(title)
+            for title, author in change.authors.items():
+                if title in self._rows:
+                    self._add(title, author)
+            for title, info in change.added.items():
+                self._add(title, info["author"])
+            # New document frequencies shift every score a little
+            self._memo.clear()
+
+    def record_checkout(self, member_id: str, title: str) -> None:
+        """Count a checkout towards popularity and co-borrowing."""
+        with self._lock:
+            history = self._members.pop(member_id, None)
+            if history is None:
+                history = deque(maxlen=self.history_size)
+            self._members[member_id] = history
+            if len(self._members) > self.member_limit:
+                self._members.popitem(last=False)
+
+            self._borrows[title] = self._borrows.get(title, 0) + 1
+            self._memo.pop(title, None)
+            if title in history:
+                return
+            counts = self._co.setdefault(title, {})
+            for other in history:
+                counts[other] = counts.get(other, 0) + 1
+                others = self._co.setdefault(other, {})
+                others[title] = others.get(title, 0) + 1
+                self._memo.pop(other, None)
+            history.append(title)
+
+    def similar(self, title: str, k: int = 5) -> List[str]:
+        """
+        Titles most like ``title``, best first.
+
+        Args:
+            title: A catalog title, in any case
+            k: Suggestions wanted
+
+        Returns:
+            List[str]: Up to k titles, never ``title`` itself; [] if it is
+            not in the catalog
+        """
+        match = self.catalog.lookup(title)
+        if match is None:
+            return []
+        title, info = match
+        with self._lock:
+            self.queries += 1
+            if not self._build():
+                return [other for other in self.by_author(info["author"], k + 1) if other != title][:k]
+            if k <= MEMO_K:
+                memo = self._memo.get(title)
+                if memo is not None:
+                    self.memo_hits += 1
+                    return memo[:k]
+            suggestions = self._rank(title, max(k, MEMO_K))
+            if k <= MEMO_K:
+                if len(self._memo) >= MEMO_SIZE:
+                    self._memo.clear()
+                self._memo[title] = suggestions
+            return suggestions[:k]
+
+    def _rank(self, title: str, k: int) -> List[str]:
+        """Score the candidates for ``title``; call with the lock held."""
+        np = self._np
+        row = self._rows.get(title)
+        if row is None:
+            return []
+        features = self._indices[self._indptr[row]:self._indptr[row + 1]]
+
+        # Candidates: titles sharing one of the rarer features, or co-borrowed
+        candidates: Dict[int, None] = {}
+        counts = self._df[features]
+        for feature, count in zip(features.tolist(), counts.tolist()):
+            if count <= self.candidate_limit:
+                candidates.update(dict.fromkeys(self._postings[feature]))
+        if not candidates and len(features):
+            rarest = int(features[np.argmin(counts)])
+            candidates.update(dict.fromkeys(islice(self._postings[rarest], self.candidate_limit)))
+        co_borrowed = self._co.get(title, {})
+        for other in co_borrowed:
+            other_row = self._rows.get(other)
+            if other_row is not None:
+                candidates[other_row] = None
+        candidates.pop(row, None)
+        rows = np.fromiter(
+            (candidate for candidate in candidates if self._titles[candidate] is not None),
+            dtype=np.int64,
+        )
+        if not len(rows):
+            return []
+
+        # Gather every candidate's features in one pass over the CSR arrays
+        starts = self._indptr[rows]
+        lengths = self._indptr[rows + 1] - starts
+        owner = np.repeat(np.arange(len(rows)), lengths)
+        offsets = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        columns = self._indices[np.repeat(starts, lengths) + offsets]
+
+        squared = self._squared_weights(columns)
+        norms = np.sqrt(np.bincount(owner, squared, minlength=len(rows)))
+        shared = np.bincount(owner, squared * np.isin(columns, features), minlength=len(rows))
+        own_norm = math.sqrt(float(self._squared_weights(features).sum())) or 1.0
+        scores = shared / (np.maximum(norms, 1e-12) * own_norm)
+
+        if co_borrowed:
+            popularity = self._borrows.get(title, 1)
+            co = np.array([
+                co_borrowed.get(self._titles[candidate], 0)
+                / math.sqrt(popularity * self._borrows.get(self._titles[candidate], 1))
+                for candidate in rows.tolist()
+            ])
+            scores = scores + CO_BORROW_WEIGHT * co
+
+        if len(rows) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(rows))
+        # Ties go to the title added first, so answers are stable
+        top = top[np.lexsort((rows[top], -scores[top]))]
+        return [self._titles[rows[i]] for i in top.tolist() if scores[i] > 0]
+
+    def _squared_weights(self, features):
+        """Squared IDF weights of feature ids, authors counting AUTHOR_WEIGHT times more."""
+        np = self._np
+        weights = np.log1p(max(self._live, 1) / np.maximum(self._df[features], 1.0))
+        weights = np.where(self._is_author[features], weights * AUTHOR_WEIGHT, weights)
+        return weights * weights
+
+    def by_author(self, author: str, k: int = 5, exclude: Iterable[str] = ()) -> List[str]:
+        """
+        An author's titles, most borrowed first.
+
+        Args:
+            author: The author's name, tolerating a few typos
+            k: Titles wanted
+            exclude: Titles to leave out, e.g. the one just asked about
+
+        Returns:
+            List[str]: Up to k titles
+        """
+        excluded = set(exclude)
+        titles = [title for title in self.catalog.fuzzy_by_author(author) if title not in excluded]
+        borrows = self._borrows
+        titles.sort(key=lambda title: -borrows.get(title, 0))
+        return titles[:k]
+
+    def popular(self, k: int = 5) -> List[str]:
+        """The most borrowed titles still in the catalog, topped up in catalog order."""
+        with self._lock:
+            ranked = sorted(self._borrows.items(), key=lambda item: -item[1])
+        titles = [title for title, _ in ranked if title in self.catalog][:k]
+        if len(titles) < k:
+            picked = set(titles)
+            titles.extend(islice((title for title in self.catalog if title not in picked), k - len(titles)))
+        return titles
+
+    def find_author(self, text: str) -> Optional[str]:
+        """
+        The author a query names, by full name or unambiguous surname.
+
+        Returns:
+            Optional[str]: The author's name as in the catalog, or None
+        """
+        with self._lock:
+            self._build()
+            words = query_words(text)
+            for n in range(min(4, len(words)), 1, -1):
+                for start in range(len(words) - n + 1):
+                    author = self._authors.get(" ".join(words[start:start + n]))
+                    if author is not None:
+                        return author
+            for word in words:
+                keys = self._surnames.get(word)
+                if keys is not None and len(keys) == 1 and len(word) > 3:
+                    return self._authors[next(iter(keys))]
+        return None
+
+    def stats(self) -> dict:
+        """Return index and query counts as a plain dict."""
+        with self._lock:
+            return {
+                "titles": self._live,
+                "features": len(self._postings),
+                "members": len(self._members),
+                "borrowed_titles": len(self._borrows),
+                "queries": self.queries,
+                "memo_hits": self.memo_hits,
+            }
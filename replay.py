@@ -0,0 +1,275 @@
+"""Replays a query log against the Library Assistant for capacity testing.
+
+Each log line is a JSON object with ``user_input`` and optionally ``name``,
+``member_id``, ``session_id`` and ``timestamp`` (epoch seconds or an ISO
+8601 string). Requests are sent open-loop, at a target rate or at the log's
+original timing, by worker processes that each answer through
+``generate_response`` with a stubbed Gemini model, so runs need no network.
+Paced latencies are measured from each request's scheduled time, so time
+spent queueing behind slow requests is counted rather than hidden.
+
+Run through ``python main.py --replay queries.jsonl``.
+"""
+
+import json
+import multiprocessing
+import queue
+import statistics
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+from benchmark import percentile
+
+# Seconds the workers get to import and warm up the assistant
+STARTUP_TIMEOUT = 120.0
+
+
+class LoggedQuery(NamedTuple):
+    """One request to replay, ``offset`` seconds after the start of the run."""
+    offset: float
+    user_input: str
+    name: str
+    member_id: Optional[str]
+    session_id: Optional[str]
+
+
+def parse_timestamp(value) -> float:
+    """Epoch seconds from a number or an ISO 8601 string."""
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).timestamp()
+
+
+def read_log(
+    path: str, qps: Optional[float] = None, original_timing: bool = False, speedup: float = 1.0,
+) -> List[LoggedQuery]:
+    """
+    Read a query log and schedule its requests.
+
+    Args:
+        path: JSONL query log
+        qps: Send at this rate, evenly spaced
+        original_timing: Keep the gaps between the log's timestamps, divided
+            by ``speedup``
+        speedup: How much faster than recorded to replay original timing
+
+    Returns:
+        List[LoggedQuery]: The requests in sending order; all at offset 0
+        when neither ``qps`` nor ``original_timing`` is given
+
+    Raises:
+        ValueError: A line is malformed, or a timestamp is missing with
+            ``original_timing``
+    """
+    records = []
+    with open(path, encoding="utf-8") as handle:
+        for number, line in enumerate(handle, 1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                user_input = record["user_input"]
+                timestamp = record.get("timestamp")
+                if original_timing:
+                    if timestamp is None:
+                        raise KeyError("timestamp")
+                    timestamp = parse_timestamp(timestamp)
+            except (ValueError, KeyError, TypeError) as error:
+                raise ValueError(f"{path}:{number}: invalid log record ({error})")
+            records.append((timestamp, user_input, record))
+
+    if original_timing:
+        records.sort(key=lambda item: item[0])
+    first = records[0][0] if records and original_timing else 0.0
+
+    queries = []
+    for position, (timestamp, user_input, record) in enumerate(records):
+        if original_timing:
+            offset = (timestamp - first) / speedup
+        elif qps:
+            offset = position / qps
+        else:
+            offset = 0.0
+        queries.append(LoggedQuery(
+            offset, user_input, record.get("name") or "Guest",
+            record.get("member_id"), record.get("session_id"),
+        ))
+    return queries
+
+
+def shard(queries: Sequence[LoggedQuery], workers: int) -> List[List[LoggedQuery]]:
+    """
+    Split requests between workers.
+
+    A conversation (same session ID) stays on one worker, since
+    conversation history is kept per process; other requests go round-robin.
+    """
+    shards: List[List[LoggedQuery]] = [[] for _ in range(workers)]
+    for position, query in enumerate(queries):
+        key = query.session_id
+        worker = zlib.crc32(key.encode("utf-8")) % workers if key else position % workers
+        shards[worker].append(query)
+    return shards
+
+
+def replay_worker(queries: List[LoggedQuery], llm_latency: float, threads: int, barrier, results) -> None:
+    """
+    Replay one shard in this process and put its measurements on ``results``.
+
+    The assistant is imported and warmed up before ``barrier`` is passed,
+    so start-up costs are not part of the measurements.
+    """
+    import assistant
+    from benchmark import install_stub_model
+    from models import UserContext
+
+    install_stub_model(assistant, llm_latency)
+    metrics = assistant.enable_metrics()
+    assistant.is_library_related("Is the library open today?")
+    assistant.QUERY_MATCHER.match("")
+    metrics.reset()
+
+    # Appended to from the pool threads; list.append is atomic
+    latencies: List[float] = []
+    errors: List[str] = []
+
+    # Unpaced runs send everything at once; only time in service counts there
+    paced = any(query.offset for query in queries)
+
+    def send(query: LoggedQuery, scheduled: float) -> None:
+        begin = scheduled if paced else time.perf_counter()
+        context = UserContext(name=query.name, member_id=query.member_id, session_id=query.session_id)
+        try:
+            assistant.generate_response(query.user_input, context)
+        except Exception as error:
+            errors.append(repr(error))
+        latencies.append(time.perf_counter() - begin)
+
+    barrier.wait()
+    started = time.time()
+    start = time.perf_counter()
+    max_lag = 0.0
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for query in queries:
+            scheduled = start + query.offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            elif paced:
+                max_lag = max(max_lag, -delay)
+            pool.submit(send, query, scheduled)
+
+    results.put({
+        "requests": len(queries),
+        "errors": len(errors),
+        "started": started,
+        "finished": time.time(),
+        "max_dispatch_lag_s": max_lag,
+        "latencies_s": latencies,
+        "counters": metrics.snapshot()["counters"],
+        "cache_hits": assistant.RESPONSE_CACHE.stats()["hits"],
+    })
+
+
+def replay(
+    queries: Sequence[LoggedQuery], workers: int = 1, threads: int = 16, llm_latency: float = 0.2,
+) -> dict:
+    """
+    Replay requests across ``workers`` processes and summarize the run.
+
+    Args:
+        queries: Requests from read_log
+        workers: Worker processes
+        threads: Requests each worker may have in flight at once
+        llm_latency: Latency of the stubbed Gemini model, in seconds
+
+    Returns:
+        dict: Throughput, latency percentiles and outcome rates
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(workers + 1)
+    results = context.Queue()
+    processes = [
+        context.Process(target=replay_worker, args=(part, llm_latency, threads, barrier, results))
+        for part in shard(queries, workers)
+    ]
+    for process in processes:
+        process.start()
+    runs: List[dict] = []
+    try:
+        barrier.wait(timeout=STARTUP_TIMEOUT)
+        while len(runs) < len(processes):
+            try:
+                runs.append(results.get(timeout=1.0))
+            except queue.Empty:
+                if not any(process.is_alive() for process in processes):
+                    raise RuntimeError("A replay worker exited without reporting its results")
+    except threading.BrokenBarrierError:
+        raise RuntimeError(f"Replay workers did not start within {STARTUP_TIMEOUT:.0f}s")
+    finally:
+        if len(runs) < len(processes):
+            for process in processes:
+                process.terminate()
+        for process in processes:
+            process.join()
+    return summarize(runs, workers, threads, llm_latency)
+
+
+def summarize(runs: List[dict], workers: int, threads: int, llm_latency: float) -> dict:
+    """Combine the measurements of every worker into one report."""
+    latencies = sorted(latency for run in runs for latency in run["latencies_s"])
+    requests = sum(run["requests"] for run in runs)
+    counters: Dict[str, int] = {}
+    for run in runs:
+        for event, count in run["counters"].items():
+            counters[event] = counters.get(event, 0) + count
+    elapsed = max(run["finished"] for run in runs) - min(run["started"] for run in runs) if runs else 0.0
+
+    latency_ms = {f"p{pct}": percentile(latencies, pct) * 1000 for pct in (50, 90, 95, 99)}
+    latency_ms["max"] = latencies[-1] * 1000 if latencies else 0.0
+    latency_ms["mean"] = statistics.fmean(latencies) * 1000 if latencies else 0.0
+
+    errors = sum(run["errors"] for run in runs)
+    cache_hits = sum(run["cache_hits"] for run in runs)
+    rejected = counters.get("guardrail_rejected", 0)
+    fallback = counters.get("rule_based", 0)
+    # llm_success also counts hedged calls that finished after the fallback
+    # was sent, so Gemini's answers are what the other outcomes leave
+    llm = max(0, requests - errors - rejected - fallback - cache_hits)
+    return {
+        "settings": {"workers": workers, "threads": threads, "llm_latency_ms": llm_latency * 1000},
+        "requests": requests,
+        "errors": errors,
+        "elapsed_s": elapsed,
+        "throughput_per_s": requests / elapsed if elapsed else 0.0,
+        "latency_ms": latency_ms,
+        "max_dispatch_lag_ms": max((run["max_dispatch_lag_s"] for run in runs), default=0.0) * 1000,
+        "guardrail_rejection_rate": rejected / requests if requests else 0.0,
+        "llm_answers": llm,
+        "fallback_answers": fallback,
+        "cache_hits": cache_hits,
+        "llm_share": llm / (llm + fallback) if llm + fallback else 0.0,
+        "counters": counters,
+    }
+
+
+def print_replay_report(report: dict) -> None:
+    """Print a replay summary."""
+    latency = report["latency_ms"]
+    print(f"Replayed {report['requests']} requests in {report['elapsed_s']:.2f}s "
+          f"(workers: {report['settings']['workers']}, threads: {report['settings']['threads']}, "
+          f"stub LLM: {report['settings']['llm_latency_ms']:.0f} ms)")
+    print(f"Throughput:           {report['throughput_per_s']:.1f} req/s")
+    print(f"Latency (ms):         p50 {latency['p50']:.1f}  p90 {latency['p90']:.1f}  "
+          f"p99 {latency['p99']:.1f}  max {latency['max']:.1f}")
+    print(f"Guardrail rejections: {report['guardrail_rejection_rate']:.1%}")
+    print(f"LLM vs fallback:      {report['llm_answers']} LLM / {report['fallback_answers']} rule-based "
+          f"({report['llm_share']:.1%} LLM), {report['cache_hits']} cache hits")
+    if report["errors"]:
+        print(f"Errors:               {report['errors']}")
+    if report["max_dispatch_lag_ms"] > 10:
+        print(f"Warning: the driver fell up to {report['max_dispatch_lag_ms']:.0f} ms behind schedule")
@@ -0,0 +1,136 @@
+"""Bounded LRU + TTL cache for Library Assistant responses."""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Hashable, NamedTuple, Optional
+
+
+def normalize_query(query: str) -> str:
+    """Normalize a user query for cache keys (case, spacing, end punctuation)."""
+    return " ".join(query.lower().split()).rstrip("?!. ")
+
+
+class CacheEntry(NamedTuple):
+    """A cached response and what it was computed from."""
+    response: str
+    expires_at: float
+    # Available copies of every book the response mentions, at store time
+    availability: Dict[str, int]
+
+
+class ResponseCache:
+    """
+    Thread-safe response cache with LRU eviction and a time-to-live.
+
+    Entries remember the ``available`` count of every book they mention.
+    A lookup re-reads those counts through ``availability(title)`` and drops
+    the entry if any of them changed, so a cached answer never reports stale
+    copy counts.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 1024,
+        ttl: float = 300.0,
+        availability: Optional[Callable[[str], Optional[int]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.availability = availability
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, CacheEntry]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable) -> Optional[str]:
+        """Return the cached response for ``key``, or None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry.expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        # Read inventory outside the lock; it may hit the catalog backend
+        if self.availability is not None:
+            for title, copies in entry.availability.items():
+                if self.availability(title) != copies:
+                    with self._lock:
+                        if self._entries.get(key) is entry:
+                            del self._entries[key]
+                        self.invalidations += 1
+                        self.misses += 1
+                    return None
+
+        with self._lock:
+            self.hits += 1
+        return entry.response
+
+    def put(self, key: Hashable, response: str, books: Optional[list] = None) -> None:
+        """
+        Cache ``response`` under ``key``.
+
+        Args:
+            key: Cache key
+            response: The response text
+            books: Titles whose availability the response depends on
+        """
+        availability = {}
+        if self.availability is not None:
+            availability = {title: self.availability(title) for title in books or ()}
+        entry = CacheEntry(response, self.clock() + self.ttl, availability)
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, stale: Callable[[Hashable, CacheEntry], bool]) -> int:
+        """
+        Drop every entry for which ``stale(key, entry)`` is true.
+
+        Returns:
+            int: Number of entries dropped
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if stale(key, entry)]
+            for key in keys:
+                del self._entries[key]
+            self.invalidations += len(keys)
+        return len(keys)
+
+    def clear(self) -> None:
+        """Drop every entry, keeping the statistics."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        """Return hit/miss statistics as a plain dict."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
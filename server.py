@@ -0,0 +1,448 @@
+"""Asyncio HTTP/JSON front-end for the Library Assistant (standard library only).
+
+Endpoints:
+    POST /chat          {"user_input": ..., "name": ..., "member_id": ..., "session_id": ...}
+                        -> {"response": ...}
+    POST /chat/stream   same body; the answer is streamed as chunked text/plain
+    GET  /health        {"status": "ok"} (503 while shutting down)
+    GET  /metrics       Prometheus text, when metrics are enabled
+
+Connections are kept alive between requests, request bodies may be sent
+with chunked transfer encoding, and Gemini calls never run on the event
+loop. SIGINT/SIGTERM stop accepting connections and let in-flight requests
+finish within the grace period. With LIBRARY_CATALOG_FILE set, edits of the
+library file are picked up while serving.
+
+With --workers N, N server processes share the port (SO_REUSEPORT) and one
+memory-mapped catalog that this process writes once (see shared_catalog.py),
+instead of each building its own copy.
+
+Usage:
+    python server.py --port 8080
+    python server.py --stub-llm-ms 200    # offline, for local load tests
+    python server.py --port 8080 --workers 4
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+from typing import Dict, Optional, Set, Tuple
+
+import assistant
+from database import CATALOG_RELOADER
+from models import UserContext
+
+# Largest request body accepted, in bytes
+MAX_BODY_BYTES = 1024 * 1024
+
+# Seconds an idle keep-alive connection is held open
+KEEP_ALIVE_TIMEOUT = 15.0
+
+REASONS = {
+    200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+    408: "Request Timeout", 411: "Length Required", 413: "Payload Too Large",
+    431: "Request Header Fields Too Large", 500: "Internal Server Error", 503: "Service Unavailable",
+}
+
+
+class HTTPError(Exception):
+    """An error answered with an HTTP status and JSON message."""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+class ResponseAborted(Exception):
+    """A response failed after its headers were sent; the connection must be dropped."""
+
+
+class Request:
+    """A parsed HTTP request."""
+
+    def __init__(self, method: str, path: str, version: str, headers: Dict[str, str], body: bytes):
+        self.method = method
+        self.path = path
+        self.version = version
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    def json(self) -> dict:
+        try:
+            payload = json.loads(self.body or b"{}")
+        except ValueError:
+            raise HTTPError(400, "Request body must be valid JSON")
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "Request body must be a JSON object")
+        return payload
+
+
+async def read_line(reader: asyncio.StreamReader, status: int, message: str) -> bytes:
+    """Read one line, answering lines longer than the reader's limit with ``status``."""
+    try:
+        return await reader.readline()
+    except ValueError:
+        # The rest of the line is unread, so the connection cannot be reused
+        raise HTTPError(status, message)
+
+
+async def read_request(reader: asyncio.StreamReader) -> Optional[Request]:
+    """Read one request; returns None when the client closed the connection."""
+    line = await read_line(reader, 431, "Request line too long")
+    if not line:
+        return None
+    try:
+        method, target, version = line.decode("latin-1").rstrip("\r\n").split(" ", 2)
+    except ValueError:
+        raise HTTPError(400, "Malformed request line")
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await read_line(reader, 431, "Request header too long")
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    return Request(method, target.split("?", 1)[0], version, headers, await read_body(reader, headers))
+
+
+async def read_body(reader: asyncio.StreamReader, headers: Dict[str, str]) -> bytes:
+    """Read a Content-Length or chunked request body, enforcing MAX_BODY_BYTES."""
+    if "chunked" in headers.get("transfer-encoding", "").lower():
+        body = bytearray()
+        while True:
+            size_line = await read_line(reader, 400, "Malformed chunk size")
+            try:
+                size = int(size_line.split(b";", 1)[0].strip() or b"0", 16)
+            except ValueError:
+                raise HTTPError(400, "Malformed chunk size")
+            if size == 0:
+                # Skip trailers up to the terminating blank line
+                while (await read_line(reader, 431, "Request trailer too long")) not in (b"\r\n", b"\n", b""):
+                    pass
+                return bytes(body)
+            if len(body) + size > MAX_BODY_BYTES:
+                raise HTTPError(413, "Request body too large")
+            body += await reader.readexactly(size)
+            await read_line(reader, 400, "Malformed chunk")
+
+    length = headers.get("content-length")
+    if length is None:
+        return b""
+    try:
+        length = int(length)
+    except ValueError:
+        raise HTTPError(400, "Malformed Content-Length")
+    if length > MAX_BODY_BYTES:
+        raise HTTPError(413, "Request body too large")
+    return await reader.readexactly(length)
+
+
+def response_head(status: int, headers: Dict[str, str]) -> bytes:
+    lines = [f"HTTP/1.1 {status} {REASONS.get(status, '')}"]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+
+async def write_response(
+    writer: asyncio.StreamWriter, status: int, body: bytes,
+    content_type: str = "application/json", keep_alive: bool = True,
+) -> None:
+    writer.write(response_head(status, {
+        "Content-Type": content_type,
+        "Content-Length": str(len(body)),
+        "Connection": "keep-alive" if keep_alive else "close",
+    }) + body)
+    await writer.drain()
+
+
+def json_body(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False).encode("utf-8")
+
+
+def chat_arguments(request: Request) -> Tuple[str, UserContext]:
+    """Extract the question and user context from a chat request."""
+    payload = request.json()
+    user_input = payload.get("user_input", payload.get("message"))
+    if not isinstance(user_input, str) or not user_input.strip():
+        raise HTTPError(400, "'user_input' must be a non-empty string")
+    try:
+        context = UserContext(
+            name=payload.get("name") or "Guest",
+            member_id=payload.get("member_id"),
+            session_id=payload.get("session_id"),
+        )
+    except Exception as error:
+        raise HTTPError(400, f"Invalid user context: {error}")
+    return user_input, context
+
+
+class AssistantServer:
+    """Serves the assistant over HTTP with keep-alive and graceful shutdown."""
+
+    def __init__(
+        self, host: str = "127.0.0.1", port: int = 8080, grace_period: float = 10.0, reuse_port: bool = False,
+    ):
+        self.host = host
+        self.port = port
+        self.grace_period = grace_period
+        # Lets several worker processes accept on the same port
+        self.reuse_port = reuse_port
+        self.draining = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        # Connection tasks, and the subset waiting for their next request
+        self._connections: Set[asyncio.Task] = set()
+        self._idle: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port, reuse_port=self.reuse_port or None,
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def serve_forever(self) -> None:
+        """Run until SIGINT/SIGTERM, then shut down gracefully."""
+        await self.start()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stop.set)
+            except (NotImplementedError, RuntimeError):
+                pass  # Not supported on this platform; Ctrl+C raises instead
+        print(f"Library Assistant listening on http://{self.host}:{self.port}")
+        await stop.wait()
+        await self.shutdown()
+
+    async def shutdown(self) -> None:
+        """Stop accepting, close idle connections and let busy ones finish."""
+        self.draining = True
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        for task in list(self._idle):
+            task.cancel()
+        busy = [task for task in self._connections if not task.done()]
+        if busy:
+            _, pending = await asyncio.wait(busy, timeout=self.grace_period)
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while not self.draining:
+                self._idle.add(task)
+                try:
+                    request = await asyncio.wait_for(read_request(reader), KEEP_ALIVE_TIMEOUT)
+                except HTTPError as error:
+                    await write_response(writer, error.status, json_body({"error": error.message}), keep_alive=False)
+                    break
+                finally:
+                    self._idle.discard(task)
+                if request is None:
+                    break
+
+                keep_alive = request.keep_alive and not self.draining
+                try:
+                    await self._dispatch(request, writer, keep_alive)
+                except HTTPError as error:
+                    await write_response(writer, error.status, json_body({"error": error.message}), keep_alive=keep_alive)
+                except ResponseAborted:
+                    break
+                except Exception:
+                    await write_response(writer, 500, json_body({"error": "Internal server error"}), keep_alive=False)
+                    break
+                if not keep_alive:
+                    break
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (ConnectionError, asyncio.CancelledError):
+                pass
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        routes = {
+            "/chat": ("POST", self._chat),
+            "/chat/stream": ("POST", self._chat_stream),
+            "/health": ("GET", self._health),
+            "/metrics": ("GET", self._metrics),
+        }
+        if request.path not in routes:
+            raise HTTPError(404, f"No route for {request.path}")
+        method, handler = routes[request.path]
+        if request.method != method:
+            raise HTTPError(405, f"{request.path} only accepts {method}")
+        await handler(request, writer, keep_alive)
+
+    async def _chat(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        user_input, context = chat_arguments(request)
+        response = await assistant.generate_response_async(user_input, context)
+        await write_response(writer, 200, json_body({"response": response}), keep_alive=keep_alive)
+
+    async def _chat_stream(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        user_input, context = chat_arguments(request)
+        writer.write(response_head(200, {
+            "Content-Type": "text/plain; charset=utf-8",
+            "Transfer-Encoding": "chunked",
+            "Connection": "keep-alive" if keep_alive else "close",
+        }))
+
+        # The generator blocks on Gemini, so each step runs in a worker thread
+        loop = asyncio.get_running_loop()
+        chunks = assistant.generate_response_stream(user_input, context)
+        try:
+            while True:
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+                if chunk is None:
+                    break
+                data = chunk.encode("utf-8")
+                writer.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+                await writer.drain()
+        except Exception as error:
+            # The 200 is already sent: closing without the last chunk tells
+            # the client the body is incomplete
+            raise ResponseAborted() from error
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _health(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        if self.draining:
+            await write_response(writer, 503, json_body({"status": "draining"}), keep_alive=False)
+            return
+        await write_response(writer, 200, json_body({"status": "ok"}), keep_alive=keep_alive)
+
+    async def _metrics(self, request: Request, writer: asyncio.StreamWriter, keep_alive: bool) -> None:
+        if assistant.METRICS is None:
+            raise HTTPError(404, "Metrics are disabled; set LIBRARY_METRICS=1")
+        body = assistant.METRICS.to_prometheus().encode("utf-8")
+        await write_response(writer, 200, body, "text/plain; version=0.0.4", keep_alive)
+
+
+def run_worker(host: str, port: int, grace_period: float, stub_llm_ms: Optional[float]) -> None:
+    """Serve in one of several worker processes sharing the port."""
+    if stub_llm_ms is not None:
+        from benchmark import install_stub_model
+        install_stub_model(assistant, stub_llm_ms / 1000)
+    server = AssistantServer(host, port, grace_period, reuse_port=True)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+def serve_workers(args: argparse.Namespace) -> None:
+    """
+    Run ``args.workers`` server processes over one shared catalog.
+
+    The catalog this process loaded is written once to a memory-mapped file
+    (on /dev/shm where available) unless LIBRARY_SHARED_CATALOG already
+    names one; the workers are spawned with that variable set, so they map
+    the file rather than build the catalog. Loans are recorded in a SQLite
+    file all workers share: this process's loan store if it has one, else
+    one beside the catalog file. SIGTERM is passed on to the workers, which
+    drain their connections before exiting.
+    """
+    from database import BOOK_DATABASE, LOANS_DB, SHARED_CATALOG
+    from shared_catalog import build_shared_catalog, loans_path
+
+    path = SHARED_CATALOG
+    if path is None:
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else None
+        handle, path = tempfile.mkstemp(prefix="library-", suffix=".cat", dir=directory)
+        os.close(handle)
+        count = build_shared_catalog(BOOK_DATABASE.snapshot(), path)
+        print(f"Shared catalog of {count} books written to {path}")
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    os.environ["LIBRARY_SHARED_CATALOG"] = path
+    if LOANS_DB is not None:
+        os.environ["LIBRARY_LOANS_DB"] = LOANS_DB
+    try:
+        for number in range(args.workers):
+            process = context.Process(
+                target=run_worker, name=f"library-worker-{number}",
+                args=(args.host, args.port, args.grace_period, args.stub_llm_ms),
+            )
+            process.start()
+            processes.append(process)
+
+        def stop(signum, frame):
+            for process in processes:
+                process.terminate()
+        signal.signal(signal.SIGTERM, stop)
+
+        for process in processes:
+            try:
+                process.join()
+            except KeyboardInterrupt:
+                # Ctrl+C reached the workers too; wait for them to drain
+                process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        if SHARED_CATALOG is None:
+            os.unlink(path)
+            if LOANS_DB is None:
+                for suffix in ("", "-wal", "-shm"):
+                    try:
+                        os.unlink(loans_path(path) + suffix)
+                    except FileNotFoundError:
+                        pass
+
+
+def main():
+    """Command-line entry point for the HTTP server."""
+    parser = argparse.ArgumentParser(description="Serve the Library Assistant over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--grace-period", type=float, default=10.0,
+                        help="seconds in-flight requests get to finish on shutdown")
+    parser.add_argument("--stub-llm-ms", type=float, default=None,
+                        help="answer with an offline stub model of this latency")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="server processes sharing the port and one memory-mapped catalog")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        serve_workers(args)
+        return
+
+    if args.stub_llm_ms is not None:
+        from benchmark import install_stub_model
+        install_stub_model(assistant, args.stub_llm_ms / 1000)
+
+    if CATALOG_RELOADER is not None:
+        CATALOG_RELOADER.start()
+
+    server = AssistantServer(args.host, args.port, args.grace_period)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""Bounded multi-turn conversation memory for the Library Assistant."""
+
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, Hashable, Iterable, List, NamedTuple, Optional
+
+
+class Turn(NamedTuple):
+    """One question and the answer it got."""
+    user: str
+    assistant: str
+
+
+def clip(text: str, limit: int) -> str:
+    """Shorten ``text`` to at most ``limit`` characters, marking the cut."""
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:max(0, limit - 1)] + "…"
+
+
+class Session:
+    """
+    One conversation: the latest turns verbatim, older ones compacted.
+
+    Once the verbatim turns exceed ``max_turns`` or ``max_chars`` the oldest
+    are folded into structured facts: a one-line summary of each question
+    (the last ``max_summaries`` are kept) and the books discussed (the last
+    ``max_books``). The rendered history therefore stays bounded however
+    long the conversation runs.
+    """
+
+    def __init__(self, max_turns: int = 6, max_chars: int = 4000, max_summaries: int = 8, max_books: int = 10):
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.max_books = max_books
+        self.turns: Deque[Turn] = deque()
+        self.summaries: Deque[str] = deque(maxlen=max_summaries)
+        # Most recently discussed last
+        self.books: Dict[str, None] = {}
+        self.chars = 0
+        self.turn_count = 0
+        self.last_used = 0.0
+
+    def add(self, turn: Turn, books: Iterable[str] = ()) -> None:
+        """Append a turn, remember the books it mentions and compact if needed."""
+        # A single turn may use at most the whole budget
+        if len(turn.user) + len(turn.assistant) > self.max_chars:
+            user = clip(turn.user, self.max_chars // 4)
+            turn = Turn(user, clip(turn.assistant, self.max_chars - len(user)))
+        self.turns.append(turn)
+        self.chars += len(turn.user) + len(turn.assistant)
+        self.turn_count += 1
+        for title in books:
+            self.books.pop(title, None)
+            self.books[title] = None
+        while len(self.books) > self.max_books:
+            del self.books[next(iter(self.books))]
+        self.compact()
+
+    def compact(self) -> None:
+        """Fold the oldest turns into summaries until the limits are met."""
+        while len(self.turns) > 1 and (len(self.turns) > self.max_turns or self.chars > self.max_chars):
+            turn = self.turns.popleft()
+            self.chars -= len(turn.user) + len(turn.assistant)
+            self.summaries.append(clip(turn.user, 100))
+
+    def render(self) -> str:
+        """The history as prompt text, or "" for a new conversation."""
+        if not self.turns:
+            return ""
+        lines = ["Conversation so far:"]
+        if self.summaries:
+            lines.append("Earlier questions: " + "; ".join(f'"{summary}"' for summary in self.summaries))
+        if self.books:
+            lines.append("Books discussed: " + ", ".join(reversed(self.books)))
+        for turn in self.turns:
+            lines.append(f"User: {turn.user}")
+            lines.append(f"Assistant: {turn.assistant}")
+        return "\n".join(lines)
+
+
+class SessionStore:
+    """
+    Thread-safe conversations keyed by session ID.
+
+    At most ``max_sessions`` are kept, evicting the least recently used, and
+    a session idle for ``ttl`` seconds is forgotten. ``extract_books(text)``
+    returns the catalog titles a turn mentions, which are kept as facts when
+    the turn itself is compacted away.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 10000,
+        ttl: float = 1800.0,
+        max_turns: int = 6,
+        max_chars: int = 4000,
+        extract_books: Optional[Callable[[str], List[str]]] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.max_chars = max_chars
+        self.extract_books = extract_books
+        self.clock = clock
+        self._sessions: "OrderedDict[Hashable, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def _live(self, key: Hashable) -> Optional[Session]:
+        """The session for ``key`` if it has not expired; call with the lock held."""
+        session = self._sessions.get(key)
+        if session is None:
+            return None
+        if self.clock() - session.last_used >= self.ttl:
+            del self._sessions[key]
+            self.expirations += 1
+            return None
+        return session
+
+    def record(self, key: Hashable, user_input: str, response: str) -> None:
+        """Add a turn to the conversation ``key``, starting one if needed."""
+        books = self.extract_books(f"{user_input}\n{response}") if self.extract_books else ()
+        with self._lock:
+            session = self._live(key)
+            if session is None:
+                session = self._sessions[key] = Session(self.max_turns, self.max_chars)
+            session.add(Turn(user_input, response), books)
+            session.last_used = self.clock()
+            self._sessions.move_to_end(key)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self.evictions += 1
+
+    def has_history(self, key: Optional[Hashable]) -> bool:
+        """Whether ``key`` names a conversation with at least one turn."""
+        if key is None or not self._sessions:
+            return False
+        with self._lock:
+            return self._live(key) is not None
+
+    def history(self, key: Hashable) -> str:
+        """The conversation as prompt text, or "" if there is none."""
+        with self._lock:
+            session = self._live(key)
+            return session.render() if session is not None else ""
+
+    def books(self, key: Hashable) -> List[str]:
+        """Books discussed in the conversation, most recent first."""
+        with self._lock:
+            session = self._live(key)
+            return list(reversed(session.books)) if session is not None else []
+
+    def end(self, key: Hashable) -> None:
+        """Forget a conversation."""
+        with self._lock:
+            self._sessions.pop(key, None)
+
+    def clear(self) -> None:
+        """Forget every conversation, keeping the statistics."""
+        with self._lock:
+            self._sessions.clear()
+
+    def stats(self) -> dict:
+        """Return session counts as a plain dict."""
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "max_sessions": self.max_sessions,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,656 @@
+"""Memory-mapped book catalog shared by worker processes.
+
+A parent process writes the catalog and its lookup indexes once into a
+single file with build_shared_catalog(); every worker maps that file with
+SharedCatalog and reads it in place, so the operating system keeps one
+copy in the page cache however many workers attach. Available counts are
+the only mutable part: they are updated in the mapping under a byte-range
+lock on the row, so checkouts in any worker are atomic and seen by all.
+The recommender's feature matrix is written into the file as well, so
+workers score recommendations from the mapping rather than each indexing
+every title again.
+Loan records live in a SQLite file beside the catalog (see loans_path), so
+a copy borrowed through one worker can be returned through another.
+
+Usage:
+    python shared_catalog.py --out /dev/shm/library.cat              # from the configured catalog
+    python shared_catalog.py books.csv --out /dev/shm/library.cat    # from a CSV or JSONL file
+    LIBRARY_SHARED_CATALOG=/dev/shm/library.cat python server.py
+"""
+
+import argparse
+import mmap
+import os
+import string
+import struct
+import tempfile
+import threading
+import zlib
+from array import array
+from collections.abc import Mapping, Sequence
+from typing import Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from catalog_index import normalize_title
+from fuzzy_index import FuzzyIndex
+import recommender
+
+try:
+    import fcntl
+except ImportError:
+    # No byte-range locks (Windows): counts are only atomic within a process
+    fcntl = None
+
+MAGIC = b"LIBCAT02"
+
+# Sections in file order: (name, array typecode or "" for UTF-8 bytes)
+SECTIONS = (
+    ("available", "i"),        # copies on the shelf, per row (mutable)
+    ("author_codes", "i"),     # author of each row
+    ("title_offsets", "q"),    # row -> span of titles
+    ("key_offsets", "q"),      # row -> span of keys (normalized titles)
+    ("author_offsets", "q"),   # author code -> span of authors
+    ("title_table", "i"),      # hash of key -> row, linear probing
+    ("author_table", "i"),     # hash of normalized author -> author code
+    ("author_row_offsets", "q"),
+    ("author_rows", "i"),      # rows of each author, in catalog order
+    ("sorted_rows", "i"),      # rows in key order, for prefix lookups
+    ("word_offsets", "q"),     # vocabulary word -> span of words
+    ("posting_offsets", "q"),  # vocabulary word -> span of postings
+    ("postings", "i"),         # rows holding each word, in catalog order
+    ("feature_indptr", "q"),   # row -> span of recommender features
+    ("feature_indices", "i"),  # recommender feature ids of each row
+    ("feature_df", "i"),       # rows holding each feature
+    ("feature_is_author", "B"),
+    ("feature_offsets", "q"),  # feature -> span of feature rows
+    ("feature_rows", "i"),     # rows holding each feature, in catalog order
+    ("titles", ""),
+    ("keys", ""),
+    ("authors", ""),
+    ("words", ""),
+)
+
+# magic, catalog version, rows, authors, words, words in the longest title,
+# then (offset, length) per section; sections are in native byte order, like
+# the arrays they are read as
+HEADER = struct.Struct("<8sqqqqq" + "qq" * len(SECTIONS))
+
+_EMPTY = -1
+
+
+def loans_path(path: str) -> str:
+    """The SQLite file holding loans of the catalog at ``path`` (storage.SQLiteLoans)."""
+    return path + ".loans"
+
+
+def stable_hash(key: str) -> int:
+    """CRC32 of a key: the same in every process, unlike ``hash()``."""
+    return zlib.crc32(key.encode("utf-8"))
+
+
+def _table(keys: List[str]) -> List[int]:
+    """Open-addressing table mapping stable_hash(keys[i]) to i, at most half full."""
+    size = 16
+    while size < 2 * len(keys):
+        size *= 2
+    mask = size - 1
+    table = [_EMPTY] * size
+    for position, key in enumerate(keys):
+        slot = stable_hash(key) & mask
+        while table[slot] != _EMPTY:
+            slot = (slot + 1) & mask
+        table[slot] = position
+    return table
+
+
+def _strings(values: List[str]) -> Tuple[bytes, List[int]]:
+    """Concatenated UTF-8 values and the offsets delimiting them."""
+    encoded = [value.encode("utf-8") for value in values]
+    offsets = [0]
+    for value in encoded:
+        offsets.append(offsets[-1] + len(value))
+    return b"".join(encoded), offsets
+
+
+def build_shared_catalog(catalog, path: str) -> int:
+    """
+    Write a catalog and its indexes to ``path`` for SharedCatalog.
+
+    The file is written next to ``path`` and renamed over it, so workers
+    attaching meanwhile map either the old or the new file, never a
+    partial one. Workers already attached keep the file they mapped.
+
+    Args:
+        catalog: Any mapping of title -> {"author": ..., "available": ...}
+        path: The file to write, preferably on a tmpfs such as /dev/shm
+
+    Returns:
+        int: Number of titles written
+    """
+    titles: List[str] = []
+    keys: List[str] = []
+    available: List[int] = []
+    author_codes: List[int] = []
+    authors: List[str] = []
+    author_lookup: Dict[str, int] = {}
+    seen = set()
+    for title in list(catalog):
+        info = catalog.get(title)
+        key = normalize_title(title)
+        if info is None or key in seen:
+            continue
+        seen.add(key)
+        code = author_lookup.get(info["author"])
+        if code is None:
+            code = author_lookup[info["author"]] = len(authors)
+            authors.append(info["author"])
+        titles.append(title)
+        keys.append(key)
+        available.append(info["available"])
+        author_codes.append(code)
+
+    # Authors differing only in case or spacing share a table entry
+    author_keys = [normalize_title(author) for author in authors]
+    canonical: Dict[str, int] = {}
+    for code, author_key in enumerate(author_keys):
+        canonical.setdefault(author_key, code)
+    author_rows: List[List[int]] = [[] for _ in authors]
+    for row, code in enumerate(author_codes):
+        author_rows[canonical[author_keys[code]]].append(row)
+    author_table_keys = [author_key if canonical[author_key] == code else "\0" for code, author_key in enumerate(author_keys)]
+
+    sorted_rows = sorted(range(len(keys)), key=keys.__getitem__)
+    word_postings: Dict[str, List[int]] = {}
+    for row, key in enumerate(keys):
+        for word in set(key.split()):
+            word_postings.setdefault(word, []).append(row)
+    vocabulary = sorted(word_postings)
+    posting_offsets = [0]
+    postings: List[int] = []
+    for word in vocabulary:
+        postings.extend(word_postings[word])
+        posting_offsets.append(len(postings))
+    author_row_offsets = [0]
+    for rows in author_rows:
+        author_row_offsets.append(author_row_offsets[-1] + len(rows))
+
+    # The recommender's rows: the author, then the title's subject words,
+    # numbered the way recommender.Recommender numbers them
+    features: Dict[str, int] = {}
+    feature_rows: List[List[int]] = []
+    feature_indptr = [0]
+    feature_indices: List[int] = []
+    for row, title in enumerate(titles):
+        names = ["a:" + recommender.author_key(authors[author_codes[row]])]
+        names += ["w:" + word for word in recommender.subject_words(title)]
+        for name in names:
+            feature = features.get(name)
+            if feature is None:
+                feature = features[name] = len(feature_rows)
+                feature_rows.append([])
+            feature_rows[feature].append(row)
+            feature_indices.append(feature)
+        feature_indptr.append(len(feature_indices))
+    feature_offsets = [0]
+    for rows in feature_rows:
+        feature_offsets.append(feature_offsets[-1] + len(rows))
+
+    title_blob, title_offsets = _strings(titles)
+    key_blob, key_offsets = _strings(keys)
+    author_blob, author_offsets = _strings(authors)
+    word_blob, word_offsets = _strings(vocabulary)
+    columns = {
+        "available": available,
+        "author_codes": author_codes,
+        "title_offsets": title_offsets,
+        "key_offsets": key_offsets,
+        "author_offsets": author_offsets,
+        "title_table": _table(keys),
+        "author_table": _table(author_table_keys),
+        "author_row_offsets": author_row_offsets,
+        "author_rows": [row for rows in author_rows for row in rows],
+        "sorted_rows": sorted_rows,
+        "word_offsets": word_offsets,
+        "posting_offsets": posting_offsets,
+        "postings": postings,
+        "feature_indptr": feature_indptr,
+        "feature_indices": feature_indices,
+        "feature_df": [len(rows) for rows in feature_rows],
+        "feature_is_author": [name.startswith("a:") for name in features],
+        "feature_offsets": feature_offsets,
+        "feature_rows": [row for rows in feature_rows for row in rows],
+        "titles": title_blob,
+        "keys": key_blob,
+        "authors": author_blob,
+        "words": word_blob,
+    }
+
+    spans = []
+    parts = []
+    position = HEADER.size
+    for name, typecode in SECTIONS:
+        data = array(typecode, columns[name]).tobytes() if typecode else columns[name]
+        # Sections start 8-byte aligned so they can be cast in place
+        padding = -position % 8
+        parts.append(b"\0" * padding + data)
+        position += padding
+        spans.extend((position, len(data)))
+        position += len(data)
+    longest = max((len(key.split()) for key in keys), default=0)
+    header = HEADER.pack(
+        MAGIC, getattr(catalog, "version", 0), len(titles), len(authors), len(vocabulary), longest, *spans
+    )
+
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary = tempfile.mkstemp(prefix=".catalog-", dir=directory)
+    try:
+        with os.fdopen(handle, "wb") as out:
+            out.write(header)
+            for part in parts:
+                out.write(part)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    return len(titles)
+
+
+class _Keys(Sequence):
+    """Lazily decoded keys of some rows, for FuzzyIndex postings."""
+
+    def __init__(self, catalog: "SharedCatalog", rows):
+        self._catalog = catalog
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def __getitem__(self, position: int) -> str:
+        return self._catalog._key(self._rows[position])
+
+
+class _Titles(Sequence):
+    """Row -> title, decoded on access."""
+
+    def __init__(self, catalog: "SharedCatalog"):
+        self._catalog = catalog
+
+    def __len__(self) -> int:
+        return self._catalog._count
+
+    def __getitem__(self, row: int) -> str:
+        if not 0 <= row < self._catalog._count:
+            raise IndexError(row)
+        return self._catalog._title(row)
+
+
+class _Rows(Mapping):
+    """Title -> row, through the mapped title table."""
+
+    def __init__(self, catalog: "SharedCatalog"):
+        self._catalog = catalog
+
+    def __getitem__(self, title: str) -> int:
+        row = self._catalog._row(title)
+        if row < 0 or self._catalog._title(row) != title:
+            raise KeyError(title)
+        return row
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._catalog)
+
+    def __len__(self) -> int:
+        return self._catalog._count
+
+
+class _FeatureRows(Sequence):
+    """Feature -> rows holding it, sliced from the mapping."""
+
+    def __init__(self, offsets, rows):
+        self._offsets = offsets
+        self._rows = rows
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, feature: int):
+        return self._rows[self._offsets[feature]:self._offsets[feature + 1]]
+
+
+class FeatureMatrix(NamedTuple):
+    """A shared catalog's recommender features, read in place by recommender.Recommender."""
+    # Row offsets and feature ids (compressed sparse rows)
+    indptr: memoryview
+    indices: memoryview
+    # Rows per feature, and whether each feature is an author
+    df: memoryview
+    is_author: memoryview
+    # Feature -> rows, title -> row and row -> title
+    postings: Sequence
+    rows: Mapping
+    titles: Sequence
+    # Every author's name
+    authors: Sequence
+
+
+class SharedCatalog(Mapping):
+    """
+    Read-only catalog over a file written by build_shared_catalog().
+
+    The mapping matches SQLiteCatalog: ``catalog[title]`` returns a
+    ``{"author": ..., "available": ...}`` snapshot and counts change only
+    through adjust_available(). Exact, author, prefix and word lookups, and
+    find_titles, read the mapped indexes directly. The SymSpell vocabularies behind the
+    fuzzy_* methods are the exception: each process builds them from the
+    mapped word list on its first misspelled query, since they are hash
+    tables of Python strings.
+
+    Titles and authors cannot be changed through the mapping; rebuild the
+    file and restart the workers instead.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        self._view = view = memoryview(self._map)
+        fields = HEADER.unpack_from(view, 0)
+        if fields[0] != MAGIC:
+            raise ValueError(f"{path}: not a shared catalog file")
+        self.version, self._count, self._author_count, self._word_count, self._longest = fields[1:6]
+        spans = fields[6:]
+        self._available_offset = spans[0]
+        for index, (name, typecode) in enumerate(SECTIONS):
+            offset, length = spans[2 * index], spans[2 * index + 1]
+            section = view[offset:offset + length]
+            setattr(self, "_" + name, section.cast(typecode) if typecode else section)
+        self._lock = threading.Lock()
+        self._fuzzy_titles: Optional[FuzzyIndex] = None
+        self._fuzzy_authors: Optional[FuzzyIndex] = None
+        self._author_words: Dict[str, List[str]] = {}
+
+    def close(self) -> None:
+        """Unmap the file; the catalog cannot be used afterwards."""
+        for name, _ in SECTIONS:
+            getattr(self, "_" + name).release()
+        self._view.release()
+        self._map.close()
+        self._file.close()
+
+    # Rows and strings
+
+    def _title(self, row: int) -> str:
+        return bytes(self._titles[self._title_offsets[row]:self._title_offsets[row + 1]]).decode("utf-8")
+
+    def _key(self, row: int) -> str:
+        return bytes(self._keys[self._key_offsets[row]:self._key_offsets[row + 1]]).decode("utf-8")
+
+    def _author(self, code: int) -> str:
+        return bytes(self._authors[self._author_offsets[code]:self._author_offsets[code + 1]]).decode("utf-8")
+
+    def _word(self, position: int) -> str:
+        return bytes(self._words[self._word_offsets[position]:self._word_offsets[position + 1]]).decode("utf-8")
+
+    def _record(self, row: int) -> dict:
+        return {"author": self._author(self._author_codes[row]), "available": self._available[row]}
+
+    def _probe(self, table, key: str, matches) -> int:
+        """Position stored under ``key`` in an open-addressing table, or -1."""
+        mask = len(table) - 1
+        slot = stable_hash(key) & mask
+        while True:
+            position = table[slot]
+            if position == _EMPTY or matches(position, key):
+                return position
+            slot = (slot + 1) & mask
+
+    def _row(self, title: str) -> int:
+        """Row of a case-insensitive title, or -1."""
+        return self._probe(self._title_table, normalize_title(title), lambda row, key: self._key(row) == key)
+
+    # Mapping
+
+    def __getitem__(self, title: str) -> dict:
+        row = self._row(title)
+        if row < 0 or self._title(row) != title:
+            raise KeyError(title)
+        return self._record(row)
+
+    def __contains__(self, title) -> bool:
+        if not isinstance(title, str):
+            return False
+        row = self._row(title)
+        return row >= 0 and self._title(row) == title
+
+    def __iter__(self) -> Iterator[str]:
+        for row in range(self._count):
+            yield self._title(row)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __repr__(self) -> str:
+        return f"SharedCatalog({self.path!r}, {self._count} titles)"
+
+    def __setitem__(self, title: str, info) -> None:
+        raise TypeError("The shared catalog is read-only; rebuild it with shared_catalog.py")
+
+    def __delitem__(self, title: str) -> None:
+        raise TypeError("The shared catalog is read-only; rebuild it with shared_catalog.py")
+
+    def update(self, *args, **kwargs) -> None:
+        raise TypeError("The shared catalog is read-only; rebuild it with shared_catalog.py")
+
+    # Counts
+
+    def adjust_available(self, title: str, delta: int) -> Optional[int]:
+        """
+        Atomically add ``delta`` to a title's available copies.
+
+        The row's count is locked against other processes (fcntl byte-range
+        lock) and other threads while it is read and written. The update is
+        refused if it would leave a negative count.
+
+        Returns:
+            Optional[int]: The new count, or None if the update was refused
+            or the title is unknown
+        """
+        row = self._row(title)
+        if row < 0:
+            return None
+        with self._lock:
+            start = self._available_offset + 4 * row
+            if fcntl is not None:
+                fcntl.lockf(self._file.fileno(), fcntl.LOCK_EX, 4, start, os.SEEK_SET)
+            try:
+                available = self._available[row] + delta
+                if available < 0:
+                    return None
+                self._available[row] = available
+                return available
+            finally:
+                if fcntl is not None:
+                    fcntl.lockf(self._file.fileno(), fcntl.LOCK_UN, 4, start, os.SEEK_SET)
+
+    # Lookups
+
+    def lookup(self, title: str) -> Optional[Tuple[str, dict]]:
+        """Return ``(title, info)`` for a case-insensitive title, or None."""
+        row = self._row(title)
+        if row < 0:
+            return None
+        return self._title(row), self._record(row)
+
+    def by_author(self, author: str) -> List[str]:
+        """Return every title written by ``author``."""
+        code = self._probe(
+            self._author_table, normalize_title(author),
+            lambda code, key: normalize_title(self._author(code)) == key,
+        )
+        if code < 0:
+            return []
+        start, end = self._author_row_offsets[code], self._author_row_offsets[code + 1]
+        return [self._title(row) for row in self._author_rows[start:end]]
+
+    def find_titles(self, text: str) -> List[str]:
+        """
+        Return catalog titles mentioned in ``text``, in order of appearance.
+
+        Like SQLiteCatalog.find_titles, every run of words up to the longest
+        title's length is probed in the title table, so matching costs no
+        memory per title. Punctuation around a run ("'Dune'?") is ignored.
+        """
+        words = text.lower().split()
+        rows: Dict[int, None] = {}
+        for start in range(len(words)):
+            for end in range(start + 1, min(start + self._longest, len(words)) + 1):
+                span = " ".join(words[start:end])
+                for key in dict.fromkeys((span, span.strip(string.punctuation))):
+                    row = self._row(key) if key else -1
+                    if row >= 0:
+                        rows.setdefault(row)
+        return [self._title(row) for row in rows]
+
+    def features(self) -> FeatureMatrix:
+        """The recommender's feature matrix, as views of the mapping."""
+        return FeatureMatrix(
+            self._feature_indptr, self._feature_indices, self._feature_df, self._feature_is_author,
+            _FeatureRows(self._feature_offsets, self._feature_rows), _Rows(self), _Titles(self),
+            [self._author(code) for code in range(self._author_count)],
+        )
+
+    def _bisect(self, count: int, value, key: str) -> int:
+        """First position in ``range(count)`` whose ``value(position)`` is not below ``key``."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if value(middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def titles_with_prefix(self, prefix: str, limit: Optional[int] = None) -> List[str]:
+        """Return titles starting with ``prefix`` in alphabetical order."""
+        key = normalize_title(prefix)
+        sorted_key = lambda position: self._key(self._sorted_rows[position])
+        start = self._bisect(self._count, sorted_key, key)
+        titles = []
+        for position in range(start, self._count):
+            if (limit is not None and len(titles) >= limit) or not sorted_key(position).startswith(key):
+                break
+            titles.append(self._title(self._sorted_rows[position]))
+        return titles
+
+    def _word_rows(self, position: int):
+        return self._postings[self._posting_offsets[position]:self._posting_offsets[position + 1]]
+
+    def _word_position(self, word: str) -> int:
+        position = self._bisect(self._word_count, self._word, word)
+        return position if position < self._word_count and self._word(position) == word else -1
+
+    def search_titles(self, text: str, limit: Optional[int] = None) -> List[str]:
+        """Return titles containing ``text`` at a word boundary (see CatalogIndex.search)."""
+        key = normalize_title(text)
+        if not key:
+            return []
+        words = key.split()
+        if len(words) == 1:
+            # A lone word may be cut short: every word with that prefix matches
+            position = self._bisect(self._word_count, self._word, key)
+            matches: Dict[int, None] = {}
+            while position < self._word_count and self._word(position).startswith(key):
+                for row in self._word_rows(position):
+                    matches[row] = None
+                    if limit is not None and len(matches) >= limit:
+                        break
+                if limit is not None and len(matches) >= limit:
+                    break
+                position += 1
+            rows = sorted(matches, key=self._key)
+            return [self._title(row) for row in rows[:limit]]
+
+        # Every word but the last is complete; its postings bound the result
+        complete = []
+        for word in words[:-1]:
+            position = self._word_position(word)
+            if position < 0:
+                return []
+            complete.append(self._word_rows(position))
+        results = []
+        for candidate, row in sorted((self._key(row), row) for row in min(complete, key=len)):
+            position = candidate.find(key)
+            while position != -1:
+                if position == 0 or candidate[position - 1] == " ":
+                    results.append(self._title(row))
+                    break
+                position = candidate.find(key, position + 1)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def fuzzy_titles(self, text: str, max_distance: int = 2, limit: int = 5) -> List[str]:
+        """Return titles mentioned in ``text`` despite up to ``max_distance`` typos, closest first."""
+        with self._lock:
+            if self._fuzzy_titles is None:
+                fuzzy = FuzzyIndex(self._word_keys)
+                fuzzy.add_words(self._word(position) for position in range(self._word_count))
+                self._fuzzy_titles = fuzzy
+        return [self.lookup(key)[0] for key, _ in self._fuzzy_titles.search(text, max_distance, limit)]
+
+    def _word_keys(self, word: str) -> Sequence:
+        position = self._word_position(word)
+        return _Keys(self, self._word_rows(position)) if position >= 0 else ()
+
+    def fuzzy_lookup(self, title: str, max_distance: int = 2) -> Optional[Tuple[str, dict]]:
+        """Like lookup(), but falls back to the closest title within ``max_distance`` typos."""
+        match = self.lookup(title)
+        if match is None:
+            titles = self.fuzzy_titles(title, max_distance, limit=1)
+            if titles:
+                match = self.lookup(titles[0])
+        return match
+
+    def fuzzy_by_author(self, author: str, max_distance: int = 2) -> List[str]:
+        """
+        Like by_author(), but falls back to the closest author within
+        ``max_distance`` typos, or to every author with that surname.
+        """
+        titles = self.by_author(author)
+        if titles:
+            return titles
+        with self._lock:
+            if self._fuzzy_authors is None:
+                fuzzy = FuzzyIndex(lambda word: self._author_words.get(word, ()))
+                for code in range(self._author_count):
+                    author_key = normalize_title(self._author(code))
+                    for word in set(author_key.split()):
+                        self._author_words.setdefault(word, []).append(author_key)
+                fuzzy.add_words(self._author_words)
+                self._fuzzy_authors = fuzzy
+        titles = []
+        for author_key in self._fuzzy_authors.find(author, max_distance):
+            titles.extend(self.by_author(author_key))
+        return titles
+
+
+def main():
+    """Command-line entry point: build a shared catalog file."""
+    parser = argparse.ArgumentParser(description="Build a memory-mapped catalog for worker processes.")
+    parser.add_argument("source", nargs="?", help="CSV or JSONL file with title, author, available "
+                                                 "(default: the catalog configured for database.py)")
+    parser.add_argument("--out", required=True, help="file to write, e.g. /dev/shm/library.cat")
+    args = parser.parse_args()
+
+    if args.source:
+        from storage import read_books
+        catalog = {title: {"author": author, "available": int(available)}
+                   for title, author, available in read_books(args.source)}
+    else:
+        from database import BOOK_DATABASE
+        catalog = BOOK_DATABASE.snapshot()
+    count = build_shared_catalog(catalog, args.out)
+    print(f"Wrote {count} books to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""The catalog backends answer lookups the same way."""
+
+import os
+import tempfile
+import unittest
+
+from catalog_index import Catalog
+from shared_catalog import SharedCatalog, build_shared_catalog
+from storage import SQLiteCatalog
+
+BOOKS = {
+    "The Hobbit": {"author": "J.R.R. Tolkien", "available": 3},
+    "The Fellowship of the Ring": {"author": "J.R.R. Tolkien", "available": 1},
+    "1984": {"author": "George Orwell", "available": 5},
+    "Animal Farm": {"author": "George Orwell", "available": 0},
+    "The Great Gatsby": {"author": "F. Scott Fitzgerald", "available": 2},
+    "To Kill a Mockingbird": {"author": "Harper Lee", "available": 2},
+    "Pride and Prejudice": {"author": "Jane Austen", "available": 4},
+    "Emma": {"author": "Jane Austen", "available": 1},
+    "Gone Girl": {"author": "Gillian Flynn", "available": 1},
+    "Sharp Objects": {"author": "Gillian Flynn", "available": 2},
+    "Gone with the Wind": {"author": "Margaret Mitchell", "available": 1},
+}
+
+LOOKUPS = ["The Hobbit", "the hobbit", "  THE   HOBBIT ", "1984", "emma", "Dune", ""]
+AUTHORS = ["George Orwell", "george orwell", "Jane Austen", "Orwell", "Nobody"]
+FUZZY_TITLES = ["Teh Great Gatsby", "Pride and Prejudise", "Animal Frm", "The Hobit", "Gone Gril", "Dune"]
+FUZZY_AUTHORS = ["Orwell", "orwel", "Geroge Orwel", "tolkien", "Jane Austin", "flynn", "Lee", "Nobody"]
+
+
+def entry(match):
+    """A lookup result as plain data, whatever record type the backend returns."""
+    if match is None:
+        return None
+    title, info = match
+    return title, {"author": info["author"], "available": info["available"]}
+
+
+class CatalogParityTest(unittest.TestCase):
+    """Catalog is the reference; SQLiteCatalog and SharedCatalog must agree with it."""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.reference = Catalog()
+        cls.reference.update({title: dict(info) for title, info in BOOKS.items()})
+        sqlite = SQLiteCatalog(os.path.join(cls.directory.name, "books.db"))
+        sqlite.update({title: dict(info) for title, info in BOOKS.items()})
+        path = os.path.join(cls.directory.name, "books.cat")
+        build_shared_catalog(BOOKS, path)
+        cls.shared = SharedCatalog(path)
+        cls.backends = {"sqlite": sqlite, "shared": cls.shared}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.shared.close()
+        cls.directory.cleanup()
+
+    def assertAgree(self, method: str, queries, convert=lambda result: result):
+        for name, catalog in self.backends.items():
+            for query in queries:
+                with self.subTest(backend=name, query=query):
+                    expected = convert(getattr(self.reference, method)(query))
+                    self.assertEqual(convert(getattr(catalog, method)(query)), expected)
+
+    def test_mapping(self):
+        for name, catalog in self.backends.items():
+            with self.subTest(backend=name):
+                self.assertEqual(list(catalog), list(self.reference))
+                self.assertEqual(len(catalog), len(BOOKS))
+                self.assertEqual(dict(catalog["Emma"]), BOOKS["Emma"])
+                self.assertNotIn("emma", catalog)
+
+    def test_lookup(self):
+        self.assertEqual(entry(self.reference.lookup("the hobbit")), ("The Hobbit", BOOKS["The Hobbit"]))
+        self.assertAgree("lookup", LOOKUPS, entry)
+
+    def test_by_author(self):
+        self.assertEqual(self.reference.by_author("george orwell"), ["1984", "Animal Farm"])
+        self.assertAgree("by_author", AUTHORS)
+
+    def test_fuzzy_lookup(self):
+        self.assertEqual(entry(self.reference.fuzzy_lookup("Teh Great Gatsby"))[0], "The Great Gatsby")
+        self.assertAgree("fuzzy_lookup", LOOKUPS + FUZZY_TITLES, entry)
+
+    def test_fuzzy_by_author(self):
+        self.assertEqual(self.reference.fuzzy_by_author("orwel"), ["1984", "Animal Farm"])
+        self.assertAgree("fuzzy_by_author", AUTHORS + FUZZY_AUTHORS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+"""Circuit breaker state transitions."""
+
+import unittest
+
+from circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+class Clock:
+    """A clock the test moves by hand."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(failure_threshold=3, slow_call_seconds=1.0, reset_timeout=10.0, clock=self.clock)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, CLOSED)
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertFalse(self.breaker.allow())
+        self.assertTrue(self.breaker.is_open())
+
+    def test_success_resets_the_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success(0.1)
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.stats(), {"state": CLOSED, "failures": 2})
+
+    def test_slow_calls_count_as_failures(self):
+        for _ in range(3):
+            self.breaker.record_success(2.0)
+        self.assertEqual(self.breaker.state, OPEN)
+
+    def test_half_open_admits_one_probe(self):
+        self.open_breaker()
+        self.clock.now = 9.9
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 10.0
+        self.assertFalse(self.breaker.is_open())
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+        # Only the probe goes through until it reports back
+        self.assertFalse(self.breaker.allow())
+        self.assertTrue(self.breaker.is_open())
+
+    def test_probe_success_closes(self):
+        self.open_breaker()
+        self.clock.now = 10.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_success(0.1)
+        self.assertEqual(self.breaker.stats(), {"state": CLOSED, "failures": 0})
+        self.assertTrue(self.breaker.allow())
+
+    def test_probe_failure_reopens(self):
+        self.open_breaker()
+        self.clock.now = 10.0
+        self.assertTrue(self.breaker.allow())
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, OPEN)
+        self.clock.now = 19.9
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 20.0
+        self.assertTrue(self.breaker.allow())
+
+    def test_lost_probe_is_replaced(self):
+        self.open_breaker()
+        self.clock.now = 10.0
+        self.assertTrue(self.breaker.allow())
+        self.clock.now = 19.9
+        self.assertFalse(self.breaker.allow())
+        self.clock.now = 20.0
+        self.assertTrue(self.breaker.allow())
+        self.assertEqual(self.breaker.state, HALF_OPEN)
+
+    def test_is_open_never_admits_a_probe(self):
+        self.open_breaker()
+        self.clock.now = 10.0
+        self.assertFalse(self.breaker.is_open())
+        self.assertFalse(self.breaker.is_open())
+        self.assertEqual(self.breaker.state, OPEN)
+        self.assertTrue(self.breaker.allow())
+
+
+if __name__ == "__main__":
+    unittest.main()
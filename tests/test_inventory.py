@@ -0,0 +1,96 @@
+"""Checkouts and returns under concurrency."""
+
+import os
+import tempfile
+import threading
+import unittest
+
+from catalog_index import Catalog
+from inventory import Inventory, NoCopiesAvailable, NotOnLoan
+from live_catalog import LiveCatalog
+from shared_catalog import SharedCatalog, build_shared_catalog
+from storage import SQLiteCatalog, SQLiteLoans
+
+BOOKS = {
+    "The Hobbit": {"author": "J.R.R. Tolkien", "available": 1},
+    "1984": {"author": "George Orwell", "available": 3},
+}
+
+THREADS = 16
+
+
+class InventoryTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.directory.name, name)
+
+    def catalogs(self):
+        """One fresh catalog per backend, each holding BOOKS."""
+        memory = Catalog()
+        memory.update({title: dict(info) for title, info in BOOKS.items()})
+        sqlite = SQLiteCatalog(self.path("books.db"))
+        sqlite.update({title: dict(info) for title, info in BOOKS.items()})
+        build_shared_catalog(BOOKS, self.path("books.cat"))
+        shared = SharedCatalog(self.path("books.cat"))
+        self.addCleanup(shared.close)
+        return {"memory": memory, "sqlite": sqlite, "shared": shared}
+
+    def race(self, inventory: Inventory, title: str) -> list:
+        """Have THREADS members try to borrow ``title`` at once; returns their outcomes."""
+        barrier = threading.Barrier(THREADS)
+        outcomes = [None] * THREADS
+
+        def borrow(i):
+            barrier.wait()
+            try:
+                outcomes[i] = inventory.checkout(title, f"M{i:03d}")
+            except NoCopiesAvailable:
+                outcomes[i] = "none left"
+
+        threads = [threading.Thread(target=borrow, args=(i,)) for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return outcomes
+
+    def test_last_copy_goes_to_one_member(self):
+        for name, catalog in self.catalogs().items():
+            for loans in (None, SQLiteLoans(self.path(f"{name}.loans"))):
+                with self.subTest(backend=name, shared_loans=loans is not None):
+                    inventory = Inventory(LiveCatalog(catalog, "9-5"), loans=loans)
+                    outcomes = self.race(inventory, "the hobbit")
+                    winners = [i for i, outcome in enumerate(outcomes) if outcome != "none left"]
+                    self.assertEqual(len(winners), 1)
+                    self.assertEqual(outcomes[winners[0]], ("The Hobbit", 0))
+                    self.assertEqual(inventory.available("The Hobbit"), 0)
+                    member = f"M{winners[0]:03d}"
+                    self.assertEqual(inventory.loans(member), {"The Hobbit": 1})
+                    # Put the copy back for the next round
+                    self.assertEqual(inventory.return_book("The Hobbit", member), ("The Hobbit", 1))
+
+    def test_concurrent_checkouts_never_oversell(self):
+        for name, catalog in self.catalogs().items():
+            with self.subTest(backend=name):
+                inventory = Inventory(LiveCatalog(catalog, "9-5"))
+                outcomes = self.race(inventory, "1984")
+                borrowed = [outcome for outcome in outcomes if outcome != "none left"]
+                self.assertEqual(len(borrowed), 3)
+                self.assertEqual(sorted(remaining for _, remaining in borrowed), [0, 1, 2])
+                self.assertEqual(inventory.available("1984"), 0)
+
+    def test_return_requires_a_loan(self):
+        inventory = Inventory(LiveCatalog(self.catalogs()["memory"], "9-5"))
+        with self.assertRaises(NotOnLoan):
+            inventory.return_book("1984", "M001")
+        inventory.checkout("1984", "M001")
+        self.assertEqual(inventory.return_book("1984", "M001"), ("1984", 3))
+        with self.assertRaises(NotOnLoan):
+            inventory.return_book("1984", "M001")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+"""Reloading the library while other threads read it."""
+
+import json
+import os
+import tempfile
+import threading
+import unittest
+
+from catalog_index import Catalog
+from inventory import Inventory
+from live_catalog import CatalogReloader, LiveCatalog
+
+BASE = {f"Book {i}": {"author": f"Author {i % 7}", "available": 2} for i in range(200)}
+# The edited file: a tenth of the titles gone, new ones added, some re-attributed
+EDITED = {title: dict(info) for title, info in BASE.items() if not title.endswith("0")}
+EDITED.update({f"New Book {i}": {"author": "Author New", "available": 1} for i in range(30)})
+for i in range(1, 200, 9):
+    if f"Book {i}" in EDITED:
+        EDITED[f"Book {i}"]["author"] = "Author Moved"
+
+
+def versions():
+    """Every (title -> author) mapping a reader may observe."""
+    return [
+        {title: info["author"] for title, info in books.items()}
+        for books in (BASE, EDITED)
+    ]
+
+
+class ReloadWhileReadingTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "library.json")
+        self.write(BASE)
+        self.live = LiveCatalog(Catalog(), "9-5")
+        self.reloader = CatalogReloader(self.live, self.path)
+        self.reloader.load()
+
+    def write(self, books: dict) -> None:
+        with open(self.path, "w", encoding="utf-8") as handle:
+            json.dump({"books": books, "timings": "9-5"}, handle)
+
+    def test_readers_see_whole_snapshots(self):
+        expected = versions()
+        stop = threading.Event()
+        errors = []
+
+        def read():
+            while not stop.is_set():
+                try:
+                    catalog = self.live.snapshot()
+                    seen = {title: catalog[title]["author"] for title in catalog}
+                    if seen not in expected:
+                        errors.append(f"partial snapshot of {len(seen)} titles")
+                    for title in ("Book 3", "Book 10", "New Book 5"):
+                        match = catalog.lookup(title)
+                        if (match is not None) != (title in seen):
+                            errors.append(f"lookup of {title!r} disagrees with iteration")
+                    if self.live.fuzzy_lookup("Bok 12") is None:
+                        errors.append("fuzzy lookup failed")
+                except Exception as error:
+                    errors.append(repr(error))
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            for round in range(20):
+                self.write(EDITED if round % 2 == 0 else BASE)
+                self.reloader.load()
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.reloader.reloads, 21)
+        self.assertEqual({title: self.live[title]["author"] for title in self.live}, expected[0])
+
+    def test_counts_survive_reloads(self):
+        Inventory(self.live).checkout("Book 1", "M001")
+        self.write(EDITED)
+        self.reloader.load()
+        # A copy on loan stays on loan across the swap
+        self.assertEqual(self.live["Book 1"]["available"], 1)
+        self.assertEqual(self.live["New Book 0"]["available"], 1)
+        self.assertNotIn("Book 10", self.live)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+"""Tests for the memory-mapped catalog shared by worker processes."""
+
+import os
+import tempfile
+import tracemalloc
+import unittest
+
+from catalog_index import Catalog
+from live_catalog import LiveCatalog
+from matcher import QueryMatcher
+from recommender import Recommender
+from shared_catalog import SharedCatalog, build_shared_catalog
+
+WORDS = ["war", "peace", "dragon", "night", "river", "stone", "king", "garden", "shadow", "empire"]
+
+
+def library(size: int) -> dict:
+    """``size`` titles over a fixed vocabulary and a fixed set of authors."""
+    books = {}
+    for i in range(size):
+        title = f"{WORDS[i % 10].title()} {WORDS[i // 10 % 10].title()} {i}"
+        books[title] = {"author": f"Author {i % 20}", "available": 1}
+    books["The Hobbit"] = {"author": "J.R.R. Tolkien", "available": 2}
+    return books
+
+
+class SharedCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def shared(self, books: dict) -> SharedCatalog:
+        path = os.path.join(self.directory.name, f"{len(books)}.cat")
+        build_shared_catalog(books, path)
+        catalog = SharedCatalog(path)
+        self.addCleanup(catalog.close)
+        return catalog
+
+    def test_find_titles(self):
+        catalog = self.shared(library(50))
+        self.assertEqual(
+            catalog.find_titles("Is 'The Hobbit'? in, or War War 0 and peace war 1"),
+            ["The Hobbit", "War War 0", "Peace War 1"],
+        )
+        self.assertEqual(catalog.find_titles("nothing here"), [])
+
+    def test_recommendations_match_in_memory_catalog(self):
+        books = library(500)
+        memory = Catalog()
+        memory.update({title: dict(info) for title, info in books.items()})
+        expected, actual = Recommender(memory), Recommender(self.shared(books))
+        for title in list(books)[::25]:
+            self.assertEqual(actual.similar(title, 8), expected.similar(title, 8))
+        self.assertEqual(actual.find_author("anything by tolkien"), "J.R.R. Tolkien")
+
+    def worker_bytes(self, size: int) -> int:
+        """Memory a worker allocates to match queries and recommend over ``size`` titles."""
+        shared = self.shared(library(size))
+        tracemalloc.start()
+        try:
+            catalog = LiveCatalog(shared, "9-5")
+            matcher = QueryMatcher(catalog, ["recommend", "similar"])
+            recommender = Recommender(catalog)
+            matcher.match("recommend something similar to War War 0")
+            recommender.similar("War War 0")
+            recommender.find_author("books by author 3")
+            return tracemalloc.get_traced_memory()[0]
+        finally:
+            tracemalloc.stop()
+
+    def test_worker_does_not_grow_per_title(self):
+        # The first run also pays for one-off imports and caches
+        self.worker_bytes(2_000)
+        small, large = self.worker_bytes(2_000), self.worker_bytes(20_000)
+        # Indexing the extra 18,000 titles per worker would take megabytes
+        self.assertLess(large - small, 64 * 1024)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,40 @@
 """Function tools for the Library Assistant."""
 
-from database import BOOK_DATABASE
+from catalog_index import normalize_title
+from database import BOOK_DATABASE, LOAN_STORE, MEMBER_REGISTRY
+from inventory import BookNotFound, Inventory, NoCopiesAvailable, NotOnLoan
+from members import normalize_member_id
+from recommender import Recommender
+
+# Checkouts and returns against BOOK_DATABASE
+INVENTORY = Inventory(BOOK_DATABASE, loans=LOAN_STORE)
+
+# Copies added or withdrawn by catalog reloads take the checkout locks
+BOOK_DATABASE.restock = INVENTORY.restock
+
+# "Books like X" and "more by this author", learning from checkouts
+RECOMMENDER = Recommender(BOOK_DATABASE)
+INVENTORY.subscribe(RECOMMENDER.record_checkout)
+BOOK_DATABASE.subscribe(RECOMMENDER.apply_change)
+
+# Cached member state carries current loans, refreshed after each checkout or
+# return; loans shared with other processes are read afresh instead
+MEMBER_REGISTRY.loans = INVENTORY.loans
+MEMBER_REGISTRY.cache_loans = LOAN_STORE is None
+INVENTORY.subscribe(MEMBER_REGISTRY.forget)
+INVENTORY.subscribe_returns(MEMBER_REGISTRY.forget)
+
+
+def closest_match_note(book_name: str, book: str) -> str:
+    """Tell the user when a misspelled title was matched to a different one."""
+    if normalize_title(book_name) == normalize_title(book):
+        return ""
+    return f" (closest match to '{book_name}')"
+
+
+def not_registered(member_id: str) -> str:
+    """The answer for a member ID that is not on the roster."""
+    return f"🔒 Member ID '{member_id}' is not registered. Please check your member_id or register at the library."
 
 
 def search_book(book_name: str) -> str:
@@ -13,12 +47,12 @@ def search_book(book_name: str) -> str:
     Returns:
         str: Information about the book if found, or message if not found
     """
-    # Normalize book name for search
-    search_name = book_name.strip().lower()
+    # Case-insensitive lookup through the catalog index, tolerating typos
+    match = BOOK_DATABASE.fuzzy_lookup(book_name)
     
-    for book, info in BOOK_DATABASE.items():
-        if search_name == book.lower():
-            return f"✅ Book found: '{book}' by {info['author']}. Available copies: {info['available']}"
+    if match:
+        book, info = match
+        return f"✅ Book found: '{book}' by {info['author']}. Available copies: {info['available']}" + closest_match_note(book_name, book)
     
     return f"❌ Book '{book_name}' not found in our database."
 
@@ -34,20 +68,169 @@ def check_availability(book_name: str, member_id: str) -> str:
     Returns:
         str: Availability information or error message
     """
-    # Check if user is registered
+    # Check if user is registered; loans are recorded under the normalized ID
+    member_id = normalize_member_id(member_id or "")
     if not member_id:
         return "🔒 This tool is only available for registered library members. Please provide your member_id."
     
-    # Normalize book name for search
-    search_name = book_name.strip().lower()
+    # Unknown IDs are rejected by the registry's Bloom filter without a lookup
+    member = MEMBER_REGISTRY.state(member_id)
+    if member is None:
+        return not_registered(member_id)
     
-    for book, info in BOOK_DATABASE.items():
-        if search_name == book.lower():
-            return f"📚 '{book}' by {info['author']}: {info['available']} copies available"
+    # Case-insensitive lookup through the catalog index, tolerating typos
+    match = BOOK_DATABASE.fuzzy_lookup(book_name)
+    
+    if match:
+        book, info = match
+        on_loan = f" (you have {member.loans[book]} on loan)" if book in member.loans else ""
+        return f"📚 '{book}' by {info['author']}: {info['available']} copies available" + on_loan + closest_match_note(book_name, book)
     
     return f"❌ Book '{book_name}' not found in our database."
 
 
+def search_by_author(author_name: str) -> str:
+    """
+    List the books in the library database written by an author.
+    
+    Args:
+        author_name: The author to look up
+    
+    Returns:
+        str: The author's books with available copies, or message if none found
+    """
+    # One snapshot, so a catalog reload cannot remove a title mid-listing
+    catalog = BOOK_DATABASE.snapshot()
+    titles = catalog.fuzzy_by_author(author_name)
+    
+    if not titles:
+        return f"❌ No books by '{author_name}' found in our database."
+    
+    # A surname may name several authors
+    authors = list(dict.fromkeys(catalog[book]['author'] for book in titles))
+    if len(authors) == 1:
+        lines = [f"- '{book}': {catalog[book]['available']} copies available" for book in titles]
+        return f"✍️ Books by {authors[0]}:\n" + "\n".join(lines)
+    lines = [f"- '{book}' by {catalog[book]['author']}: {catalog[book]['available']} copies available" for book in titles]
+    return f"✍️ Books by authors matching '{author_name}':\n" + "\n".join(lines)
+
+
+def recommend_books(book_or_author: str, k: int = 5) -> str:
+    """
+    Recommend books similar to a title, or more books by an author.
+    
+    Args:
+        book_or_author: A book title or an author's name
+        k: How many books to recommend
+    
+    Returns:
+        str: The recommended books with available copies, or message if none found
+    """
+    catalog = BOOK_DATABASE.snapshot()
+    match = catalog.fuzzy_lookup(book_or_author)
+    
+    if match:
+        book = match[0]
+        titles = RECOMMENDER.similar(book, k)
+        heading = f"📚 If you enjoyed '{book}', you might also like:"
+    else:
+        # "books by Orwell" names the author within a phrase
+        author = RECOMMENDER.find_author(book_or_author) or book_or_author
+        titles = RECOMMENDER.by_author(author, k)
+        heading = None
+    
+    # The recommender follows the live catalog, which may be newer than this snapshot
+    titles = [title for title in titles if title in catalog]
+    if not titles:
+        return f"❌ No recommendations found for '{book_or_author}'."
+    if heading is None:
+        heading = f"✍️ More by {catalog[titles[0]]['author']}:"
+    
+    lines = [f"- '{title}' by {catalog[title]['author']}: {catalog[title]['available']} copies available" for title in titles]
+    return heading + "\n" + "\n".join(lines)
+
+
+def checkout_book(book_name: str, member_id: str) -> str:
+    """
+    Borrow a copy of a book (only for registered members).
+    
+    Args:
+        book_name: The name of the book to borrow
+        member_id: The member borrowing the book
+    
+    Returns:
+        str: Confirmation with the copies left, or error message
+    """
+    member_id = normalize_member_id(member_id or "")
+    if not member_id:
+        return "🔒 Borrowing is only available for registered library members. Please provide your member_id."
+    if not MEMBER_REGISTRY.is_member(member_id):
+        return not_registered(member_id)
+    
+    try:
+        book, remaining = INVENTORY.checkout(book_name, member_id)
+    except BookNotFound:
+        return f"❌ Book '{book_name}' not found in our database."
+    except NoCopiesAvailable as error:
+        return f"⏳ All copies of '{error}' are currently on loan."
+    
+    return f"✅ You have borrowed '{book}'. Copies still available: {remaining}"
+
+
+def return_book(book_name: str, member_id: str) -> str:
+    """
+    Return a borrowed copy of a book.
+    
+    Args:
+        book_name: The name of the book being returned
+        member_id: The member returning the book
+    
+    Returns:
+        str: Confirmation with the copies now available, or error message
+    """
+    member_id = normalize_member_id(member_id or "")
+    if not member_id:
+        return "🔒 Returns are only available for registered library members. Please provide your member_id."
+    if not MEMBER_REGISTRY.is_member(member_id):
+        return not_registered(member_id)
+    
+    try:
+        book, available = INVENTORY.return_book(book_name, member_id)
+    except BookNotFound:
+        return f"❌ Book '{book_name}' not found in our database."
+    except NotOnLoan as error:
+        return f"❌ You don't have '{error}' on loan."
+    
+    if available is None:
+        return f"✅ Thank you for returning '{book}'. This title has been withdrawn from the catalog."
+    return f"✅ Thank you for returning '{book}'. Copies now available: {available}"
+
+
+def list_loans(member_id: str) -> str:
+    """
+    List the books a member currently has on loan.
+    
+    Args:
+        member_id: The member whose loans to list
+    
+    Returns:
+        str: The titles on loan with copy counts, or error message
+    """
+    member_id = normalize_member_id(member_id or "")
+    if not member_id:
+        return "🔒 Loans are only available for registered library members. Please provide your member_id."
+    
+    member = MEMBER_REGISTRY.state(member_id)
+    if member is None:
+        return not_registered(member_id)
+    
+    if not member.loans:
+        return f"📖 {member.name or member.member_id}, you have no books on loan."
+    
+    lines = [f"- '{book}': {copies} {'copy' if copies == 1 else 'copies'}" for book, copies in member.loans.items()]
+    return f"📖 Books on loan to {member.name or member.member_id}:\n" + "\n".join(lines)
+
+
 def get_library_timings() -> str:
     """
     Get the library timings.
@@ -55,5 +238,4 @@ def get_library_timings() -> str:
     Returns:
         str: Library timing information
     """
-    from database import LIBRARY_TIMINGS
-    return f"📅 Library Timings:\n{LIBRARY_TIMINGS}"
+    return f"📅 Library Timings:\n{BOOK_DATABASE.timings}"
@@ -0,0 +1,299 @@
+"""Statistical topic classifier for the Library Assistant's guardrail.
+
+Queries are turned into hashed word, word-pair and character n-gram
+features and scored by a logistic regression model trained offline on the
+bundled corpus (topic_corpus.tsv). The trained weights ship as
+topic_model.npz. Requires NumPy.
+
+Retraining first fits a model without a held-out share of the corpus and
+reports its accuracy on that share, then fits the shipped model on all of it.
+
+Usage:
+    python topic_classifier.py                          # retrain topic_model.npz
+    python topic_classifier.py "Is Dune available?"     # classify queries
+"""
+
+import argparse
+import math
+import os
+import re
+import zlib
+from itertools import chain
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CORPUS_PATH = os.path.join(HERE, "topic_corpus.tsv")
+MODEL_PATH = os.path.join(HERE, "topic_model.npz")
+
+# Hashed feature space size; collisions are rare at this corpus size
+N_FEATURES = 2 ** 14
+
+# Character n-gram lengths, taken over the lowercased words
+CHAR_NGRAMS = (3, 4)
+
+# Share of the corpus held out to evaluate a retrained model
+HOLDOUT = 0.2
+
+LIBRARY_LABEL = "library"
+
+WORD_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+class FeatureHasher:
+    """
+    Maps queries to hashed feature ids.
+
+    A query's tokens are its words and each pair of adjacent words; a word
+    contributes itself plus the character n-grams of the space-padded word.
+    Ids use CRC32 rather than ``hash()`` so they are stable across processes
+    and match the ids the model was trained on. The ids of each token are
+    memoized.
+    """
+
+    def __init__(self, n_features: int = N_FEATURES, cache_size: int = 100_000):
+        self.n_features = n_features
+        self.cache_size = cache_size
+        self._cache: Dict[str, Tuple[int, ...]] = {}
+
+    @staticmethod
+    def tokens(text: str) -> List[str]:
+        """The words and adjacent word pairs of a query."""
+        words = WORD_PATTERN.findall(text.lower())
+        return words + [f"{first} {second}" for first, second in zip(words, words[1:])]
+
+    def token_ids(self, token: str) -> Tuple[int, ...]:
+        """Feature ids of one token, with repeats."""
+        ids = self._cache.get(token)
+        if ids is None:
+            if " " in token:
+                grams = ["b " + token]
+            else:
+                padded = f" {token} "
+                grams = ["w " + token]
+                for n in CHAR_NGRAMS:
+                    grams.extend(padded[i:i + n] for i in range(len(padded) - n + 1))
+            ids = tuple(zlib.crc32(gram.encode("utf-8")) % self.n_features for gram in grams)
+            if len(self._cache) >= self.cache_size:
+                self._cache.clear()
+            self._cache[token] = ids
+        return ids
+
+    def matrix(self, texts: Sequence[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Sparse feature matrix of many queries in coordinate form.
+
+        Features are counts scaled by ``1 / sqrt(total count)`` of the query;
+        repeated (row, col) entries are meant to be summed.
+
+        Returns:
+            tuple: (rows, cols, values) arrays of the non-zero entries
+        """
+        per_text = [
+            [feature for token in self.tokens(text) for feature in self.token_ids(token)]
+            for text in texts
+        ]
+        lengths = np.fromiter((len(ids) for ids in per_text), dtype=np.int64, count=len(per_text))
+        rows = np.repeat(np.arange(len(per_text)), lengths)
+        cols = np.fromiter(
+            (feature for ids in per_text for feature in ids), dtype=np.int64, count=int(lengths.sum())
+        )
+        scale = 1.0 / np.sqrt(np.maximum(lengths, 1))
+        return rows, cols, scale[rows]
+
+
+def read_corpus(path: str = CORPUS_PATH) -> Tuple[List[str], np.ndarray]:
+    """
+    Read a ``label<TAB>text`` corpus; lines starting with ``#`` are comments.
+
+    Returns:
+        tuple: (texts, labels) with labels 1.0 for library queries, else 0.0
+    """
+    texts, labels = [], []
+    with open(path, encoding="utf-8") as handle:
+        for line in handle:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            label, _, text = line.partition("\t")
+            texts.append(text)
+            labels.append(1.0 if label == LIBRARY_LABEL else 0.0)
+    return texts, np.array(labels)
+
+
+def split_corpus(
+    texts: Sequence[str], labels: np.ndarray, holdout: float = HOLDOUT,
+) -> Tuple[List[str], np.ndarray, List[str], np.ndarray]:
+    """
+    Split a corpus into training and held-out queries.
+
+    A query is held out by the CRC32 of its text, so the split is the same
+    on every run and a query keeps its side as the corpus grows.
+
+    Returns:
+        tuple: (train_texts, train_labels, held_out_texts, held_out_labels)
+    """
+    held_out = np.array([zlib.crc32(text.encode("utf-8")) % 1000 < holdout * 1000 for text in texts], dtype=bool)
+    texts = np.array(texts, dtype=object)
+    return list(texts[~held_out]), labels[~held_out], list(texts[held_out]), labels[held_out]
+
+
+class TopicClassifier:
+    """
+    Linear model over hashed n-gram features.
+
+    ``score()`` classifies one query; ``predict_proba()`` and ``predict()``
+    score a whole sequence of queries with one vectorized pass over their
+    combined features.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, threshold: float = 0.5):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.threshold = threshold
+        self.hasher = FeatureHasher(len(self.weights))
+        # token -> (sum of its feature weights, feature count), for score()
+        self._token_weights: Dict[str, Tuple[float, int]] = {}
+
+    @classmethod
+    def train(
+        cls,
+        texts: Sequence[str],
+        labels: np.ndarray,
+        n_features: int = N_FEATURES,
+        epochs: int = 800,
+        learning_rate: float = 8.0,
+        l2: float = 1e-4,
+    ) -> "TopicClassifier":
+        """Fit logistic regression by full-batch gradient descent."""
+        rows, cols, values = FeatureHasher(n_features).matrix(texts)
+        labels = np.asarray(labels, dtype=np.float64)
+        count = len(labels)
+        weights = np.zeros(n_features)
+        bias = 0.0
+        for _ in range(epochs):
+            logits = np.bincount(rows, weights=weights[cols] * values, minlength=count) + bias
+            error = 1.0 / (1.0 + np.exp(-logits)) - labels
+            gradient = np.bincount(cols, weights=error[rows] * values, minlength=n_features) / count
+            weights -= learning_rate * (gradient + l2 * weights)
+            bias -= learning_rate * error.mean()
+        return cls(weights, bias)
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "TopicClassifier":
+        with np.load(path) as data:
+            return cls(data["weights"], float(data["bias"]), float(data["threshold"]))
+
+    def save(self, path: str = MODEL_PATH) -> None:
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float32),
+            bias=np.float64(self.bias),
+            threshold=np.float64(self.threshold),
+        )
+
+    def score(self, text: str) -> float:
+        """
+        Probability that a single query is library-related.
+
+        The weights of each token are summed once and cached, so scoring is
+        a few dict probes and no NumPy calls.
+        """
+        total = 0.0
+        count = 0
+        cache = self._token_weights
+        for token in self.hasher.tokens(text):
+            token_weight = cache.get(token)
+            if token_weight is None:
+                ids = self.hasher.token_ids(token)
+                token_weight = (float(self.weights[list(ids)].sum()), len(ids))
+                if len(cache) >= self.hasher.cache_size:
+                    cache.clear()
+                cache[token] = token_weight
+            total += token_weight[0]
+            count += token_weight[1]
+        logit = total / math.sqrt(count) + self.bias if count else self.bias
+        return 1.0 / (1.0 + math.exp(-max(logit, -500.0)))
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        Probability that each query is library-related, in one vectorized pass.
+
+        Each distinct token in the batch is weighed once; the per-query sums
+        are then gathered with ``np.bincount``.
+        """
+        positions: Dict[str, int] = {}
+        token_positions: List[int] = []
+        lengths: List[int] = []
+        for text in texts:
+            tokens = self.hasher.tokens(text)
+            lengths.append(len(tokens))
+            for token in tokens:
+                position = positions.get(token)
+                if position is None:
+                    position = positions[token] = len(positions)
+                token_positions.append(position)
+
+        token_ids = [self.hasher.token_ids(token) for token in positions]
+        id_counts = np.fromiter(map(len, token_ids), dtype=np.int64, count=len(token_ids))
+        cols = np.fromiter(chain.from_iterable(token_ids), dtype=np.int64, count=int(id_counts.sum()))
+        token_sums = np.bincount(
+            np.repeat(np.arange(len(token_ids)), id_counts), weights=self.weights[cols], minlength=len(token_ids)
+        )
+
+        rows = np.repeat(np.arange(len(texts)), lengths)
+        token_positions = np.array(token_positions, dtype=np.int64)
+        totals = np.bincount(rows, weights=token_sums[token_positions], minlength=len(texts))
+        counts = np.bincount(rows, weights=id_counts[token_positions], minlength=len(texts))
+        logits = totals / np.sqrt(np.maximum(counts, 1)) + self.bias
+        return 1.0 / (1.0 + np.exp(-logits))
+
+    def predict(self, texts: Sequence[str]) -> np.ndarray:
+        """Boolean array: which queries are library-related."""
+        return self.predict_proba(texts) >= self.threshold
+
+    def is_library_related(self, text: str) -> bool:
+        return self.score(text) >= self.threshold
+
+
+def default_classifier() -> TopicClassifier:
+    """The bundled model, trained from the corpus if the weights file is missing."""
+    if os.path.exists(MODEL_PATH):
+        return TopicClassifier.load(MODEL_PATH)
+    return TopicClassifier.train(*read_corpus(CORPUS_PATH))
+
+
+def main():
+    """Retrain the bundled model, or classify the queries given as arguments."""
+    parser = argparse.ArgumentParser(description="Train or run the library topic classifier.")
+    parser.add_argument("queries", nargs="*", help="queries to classify (default: retrain)")
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--holdout", type=float, default=HOLDOUT,
+                        help="share of the corpus held out for evaluation (0: skip)")
+    args = parser.parse_args()
+
+    if args.queries:
+        classifier = TopicClassifier.load(args.model)
+        for query, probability in zip(args.queries, classifier.predict_proba(args.queries)):
+            print(f"{probability:.3f}  {query}")
+        return
+
+    texts, labels = read_corpus(args.corpus)
+    if args.holdout > 0:
+        train_texts, train_labels, test_texts, test_labels = split_corpus(texts, labels, args.holdout)
+        predicted = TopicClassifier.train(train_texts, train_labels).predict(test_texts)
+        actual = test_labels == 1.0
+        false_accepts = int((predicted & ~actual).sum())
+        false_rejects = int((~predicted & actual).sum())
+        print(f"Held-out accuracy {float((predicted == actual).mean()):.1%} on {len(test_texts)} queries "
+              f"({false_accepts} false accepts, {false_rejects} false rejects; trained on {len(train_texts)})")
+    classifier = TopicClassifier.train(texts, labels)
+    accuracy = float((classifier.predict(texts) == (labels == 1.0)).mean())
+    classifier.save(args.model)
+    print(f"Trained on {len(texts)} queries (training accuracy {accuracy:.1%}); saved {args.model}")
+
+
+if __name__ == "__main__":
+    main()